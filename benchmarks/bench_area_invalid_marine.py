@@ -0,0 +1,79 @@
+'''
+Benchmark of area_invalid_marine on a full-size synthetic polygon table:
+the vectorized binning of GIS_M_AREA / GIS_AREA against the previous
+row-by-row DataFrame.apply implementation.
+
+Run from the repository root:
+python -m benchmarks.bench_area_invalid_marine [n_rows]
+'''
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from wdpa import qa
+
+def area_invalid_marine_apply(wdpa_df, return_pid=False):
+    '''
+    Previous implementation of area_invalid_marine, using DataFrame.apply per row
+    '''
+
+    coast_min = 0.1
+    coast_max = 0.9
+
+    wdpa_df = wdpa_df.copy()
+    wdpa_df['marine_GIS_proportion'] = wdpa_df['GIS_M_AREA'] / wdpa_df['GIS_AREA']
+
+    def assign_marine_gis_value(wdpa_df):
+        if wdpa_df['marine_GIS_proportion'] <= coast_min:
+            return '0'
+        elif coast_min < wdpa_df['marine_GIS_proportion'] < coast_max:
+            return '1'
+        elif wdpa_df['marine_GIS_proportion'] >= coast_max:
+            return '2'
+
+    wdpa_df['marine_GIS_value'] = wdpa_df.apply(assign_marine_gis_value, axis=1)
+
+    return wdpa_df[wdpa_df['marine_GIS_value'] != wdpa_df['MARINE']]['WDPA_PID'].values
+
+def synthetic_areas(n_rows, seed=0):
+    '''
+    Return a DataFrame with WDPA_PID, MARINE, GIS_AREA and GIS_M_AREA
+    '''
+
+    rng = np.random.RandomState(seed)
+    gis_area = rng.lognormal(2, 2, n_rows)
+    proportion = rng.choice([0, 0.05, 0.5, 0.95, 1], n_rows) 
+    gis_m_area = gis_area * proportion
+    gis_area[rng.rand(n_rows) < 0.001] = 0 # a few empty geometries
+    marine = np.where(proportion <= 0.1, '0', np.where(proportion < 0.9, '1', '2')).astype(object)
+    wrong = rng.rand(n_rows) < 0.01
+    marine[wrong] = rng.choice(['0', '1', '2'], wrong.sum())
+
+    return pd.DataFrame({'WDPA_PID': np.arange(n_rows, dtype=float) + 1,
+                         'MARINE': marine,
+                         'GIS_AREA': gis_area,
+                         'GIS_M_AREA': gis_m_area})
+
+def main(n_rows=300000):
+    wdpa_df = synthetic_areas(n_rows)
+    columns = list(wdpa_df.columns)
+
+    start = time.perf_counter()
+    expected = area_invalid_marine_apply(wdpa_df, True)
+    apply_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    invalid_wdpa_pid = qa.area_invalid_marine(wdpa_df, True)
+    vectorized_seconds = time.perf_counter() - start
+
+    assert np.array_equal(invalid_wdpa_pid, expected), 'results differ'
+    assert list(wdpa_df.columns) == columns, 'input DataFrame was modified'
+
+    print(f'area_invalid_marine on {n_rows} rows ({len(expected)} invalid)')
+    print(f'  apply:      {apply_seconds:8.3f} s')
+    print(f'  vectorized: {vectorized_seconds:8.3f} s')
+    print(f'  speedup:    {apply_seconds / vectorized_seconds:8.1f} x')
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,51 @@
+'''
+Benchmark of the start-up time of the QA: the cumulative import time of
+wdpa.qa (and its dependencies), measured with python -X importtime in a
+fresh interpreter. The slowest imports are listed, and the benchmark fails
+if arcpy is imported, or if the import takes longer than the budget.
+
+Run from the repository root:
+python -m benchmarks.bench_import [budget_seconds] [module]
+'''
+
+import subprocess
+import sys
+
+FORBIDDEN_MODULES = ['arcpy']
+
+def import_times(module='wdpa.qa'):
+    '''
+    Import module in a fresh interpreter with -X importtime.
+    Return a dictionary of each imported module and its cumulative import time, in seconds.
+    '''
+
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    # lines read 'import time: self [us] | cumulative | imported package'
+    times = dict()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative_us) / 1e6
+
+    return times
+
+def main(budget_seconds=2.0, module='wdpa.qa'):
+    times = import_times(module)
+    total = times[module]
+
+    print(f'import {module}: {total:.3f} s (budget {budget_seconds:.3f} s)')
+    top_level = {name: seconds for name, seconds in times.items() if '.' not in name and name != module}
+    for name, seconds in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:10]:
+        print(f'  {name:<20} {seconds:8.3f} s')
+
+    forbidden = [name for name in FORBIDDEN_MODULES if name in times]
+    if forbidden:
+        sys.exit(f'FAIL: importing {module} imports {", ".join(forbidden)}')
+    if total > budget_seconds:
+        sys.exit(f'FAIL: importing {module} takes longer than {budget_seconds:.3f} s')
+
+if __name__ == '__main__':
+    main(*[float(arg) for arg in sys.argv[1:2]], *sys.argv[2:3])
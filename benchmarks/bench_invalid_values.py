@@ -0,0 +1,50 @@
+'''
+Benchmark of the invalid_value_in_field checks on a full-size table, built by
+repeating the rows of the test geodatabase: each input function called on its
+own, against all rules evaluated together by invalid_values_batch, on text
+columns as loaded (object) and as categoricals.
+
+Run from the repository root:
+python -m benchmarks.bench_invalid_values [n_rows]
+'''
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from wdpa import qa
+
+TEST_DATA = os.path.join('tests', 'data.gdb', 'test')
+
+def main(n_rows=1000000):
+    test_df = qa.arcgis_table_to_df(TEST_DATA, qa.INPUT_FIELDS_POLY)
+    wdpa_df = pd.concat([test_df] * (n_rows // len(test_df) + 1), ignore_index=True).iloc[:n_rows]
+    wdpa_df = wdpa_df.astype({field: object for field in wdpa_df.columns if wdpa_df[field].dtype.kind not in 'biuf'})
+    check_funcs = [check['batch'][1] for check in qa.poly_checks
+                   if check.get('batch') and check['batch'][0] is qa.invalid_values_masks]
+
+    start = time.perf_counter()
+    expected = {check_func: check_func(wdpa_df, True) for check_func in check_funcs}
+    separate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = qa.invalid_values_batch(wdpa_df, check_funcs)
+    batch_seconds = time.perf_counter() - start
+
+    categorical_df = wdpa_df.astype({field: 'category' for field in wdpa_df.columns if wdpa_df[field].dtype == object})
+    start = time.perf_counter()
+    categorical_batch = qa.invalid_values_batch(categorical_df, check_funcs)
+    categorical_seconds = time.perf_counter() - start
+
+    for check_func in check_funcs:
+        assert np.array_equal(batch[check_func], expected[check_func]), f'{check_func.__name__}: results differ'
+        assert np.array_equal(categorical_batch[check_func], expected[check_func]), f'{check_func.__name__}: results differ'
+
+    print(f'{len(check_funcs)} invalid_value_in_field checks on {n_rows} rows')
+    print(f'  separate:            {separate_seconds:8.3f} s')
+    print(f'  batch:               {batch_seconds:8.3f} s')
+    print(f'  batch (categorical): {categorical_seconds:8.3f} s')
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,208 @@
+'''
+Benchmark suite of the QA: the wall time and peak memory of loading a table,
+of each check of poly_checks (core_checks and area_checks) and of the Excel
+export (on tables of up to 30000 rows by default), on synthetic polygon tables
+of several sizes (see benchmarks/synthetic.py).
+
+Tables are loaded from the column files of wdpa.cache, so that the suite runs
+without arcpy or a geodatabase. The number of rows returned by each check is
+compared with the errors injected in the table, and the suite fails if they
+differ.
+
+Results are written to a JSON file with --output. Given the results of an
+earlier run with --baseline, the suite also fails if a step takes more time
+or memory than in the baseline, beyond the tolerance (0.25: 25% more).
+Baselines are only comparable on the same machine.
+
+Run from the repository root:
+python -m benchmarks.bench_suite --sizes 30000 300000 --output baseline.json
+python -m benchmarks.bench_suite --sizes 30000 300000 --baseline baseline.json --tolerance 0.25
+'''
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import count_differences, synthetic_wdpa
+from wdpa import qa
+from wdpa.cache import read_cached_df, write_cached_df
+from wdpa.export import output_errors_to_excel
+from wdpa.profiling import measure
+from wdpa.runner import check_positions, positions_to_result
+
+RESULTS_FORMAT = 1
+DEFAULT_SIZES = [30000, 300000]
+DEFAULT_TOLERANCE = 0.25
+
+# The Excel export is only timed up to this number of rows, as it takes minutes beyond
+EXPORT_MAX_ROWS = 30000
+
+# Differences below these are measurement noise, whatever the tolerance
+MIN_SECONDS = 0.05
+MIN_MB = 5
+
+FORBIDDEN_MODULES = ['arcpy']
+
+def best_of(repeat, func, *args, memory=True):
+    '''
+    Call func repeat times, and return its last result and a dictionary of
+    the lowest wall time (seconds). If memory is set True, func is called once
+    more to measure its peak memory (peak_mb) with wdpa.profiling.measure:
+    tracing memory allocations slows down Python code, up to five times for
+    the Excel export, so that wall times are measured without it.
+    '''
+
+    seconds = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        seconds.append(time.perf_counter() - start)
+    stats = {'seconds': min(seconds)}
+
+    if memory:
+        result, traced = measure(func, *args)
+        stats['peak_mb'] = traced['peak_mb']
+
+    return result, stats
+
+def bench_size(n_rows, checks, repeat=1, export=True, memory=True, errors_per_check=10, seed=0):
+    '''
+    Run the benchmark on a synthetic polygon table of n_rows rows.
+    Return a dictionary of the wall time (seconds) and peak memory (peak_mb)
+    of each step ('load', each check's name, 'export'), and the checks that
+    did not return the expected number of rows (see count_differences).
+
+    ## Arguments ##
+    n_rows --  number of rows of the table
+    checks --  list of registered checks to time, e.g. poly_checks
+    repeat --  runs of each step, the lowest wall time being kept
+    export --  set False not to time the Excel export
+    memory --  set False not to measure peak memory
+    errors_per_check -- errors injected in the table for each check
+    seed --    seed of the synthetic table
+    '''
+
+    wdpa_df, expected = synthetic_wdpa(n_rows, 'poly', errors_per_check, seed=seed)
+    tmp_dir = tempfile.mkdtemp(prefix='wdpa_bench_')
+
+    try:
+        entry_dir = os.path.join(tmp_dir, 'table')
+        write_cached_df(wdpa_df, entry_dir, {'rows': n_rows})
+        del wdpa_df
+
+        wdpa_df, stats = best_of(repeat, read_cached_df, entry_dir, memory=memory)
+        steps = {'load': stats}
+
+        positions = dict()
+        for check in checks:
+            check_positions_, stats = best_of(repeat, check_positions, wdpa_df, [check], memory=memory)
+            positions.update(check_positions_)
+            stats['rows'] = len(check_positions_[check['name']])
+            steps[check['name']] = stats
+
+        result = positions_to_result(wdpa_df, checks, positions)
+        differences = count_differences(result, {name: expected[name] for name in result})
+
+        if export:
+            steps['export'] = best_of(repeat, output_errors_to_excel, result, tmp_dir, checks, 'poly', memory=memory)[1]
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return steps, differences
+
+def environment():
+    '''
+    Return the versions the benchmark ran with
+    '''
+
+    return {'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpus': os.cpu_count()}
+
+def regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    '''
+    Return a list of the steps of results that take more time or memory than
+    in baseline, by more than the tolerance and than MIN_SECONDS or MIN_MB.
+    Steps or sizes missing from either are not compared.
+
+    ## Arguments ##
+    results --   results of a run of the suite, as written to JSON by main
+    baseline --  results of an earlier run, on the same machine
+    tolerance -- allowed relative increase, e.g. 0.25 for 25%
+
+    ## Example ##
+    regressions(results, json.load(open('baseline.json')), tolerance=0.25)
+    '''
+
+    found = []
+    for size, steps in results['sizes'].items():
+        baseline_steps = baseline['sizes'].get(size, dict())
+        for step, stats in steps.items():
+            if step not in baseline_steps:
+                continue
+            for key, minimum, unit in [('seconds', MIN_SECONDS, 's'), ('peak_mb', MIN_MB, 'MB')]:
+                if key not in stats or key not in baseline_steps[step]:
+                    continue
+                before, after = baseline_steps[step][key], stats[key]
+                if after > before * (1 + tolerance) and after - before > minimum:
+                    found.append(f'{step} ({size} rows): {before:.3f} {unit} -> {after:.3f} {unit}')
+
+    return found
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the steps of the WDPA QA on synthetic tables')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='numbers of rows of the tables')
+    parser.add_argument('--select', nargs='+', help='check names, tags or fields to run (all by default)')
+    parser.add_argument('--errors', type=int, default=10, help='errors injected in the tables for each check')
+    parser.add_argument('--repeat', type=int, default=1, help='runs of each step, the best being kept')
+    parser.add_argument('--export-max-rows', type=int, default=EXPORT_MAX_ROWS, help='largest table to time the Excel export on')
+    parser.add_argument('--no-memory', action='store_true', help='do not measure peak memory')
+    parser.add_argument('--output', help='JSON file to write the results to, e.g. as a baseline')
+    parser.add_argument('--baseline', help='JSON results of an earlier run, to compare with')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='allowed relative increase')
+    args = parser.parse_args(argv)
+
+    checks = qa.select_checks(qa.poly_checks, args.select)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {'format': RESULTS_FORMAT, 'environment': environment(), 'sizes': dict()}
+    failures = []
+    for n_rows in args.sizes:
+        steps, differences = bench_size(n_rows, checks, args.repeat, n_rows <= args.export_max_rows, not args.no_memory, args.errors)
+        results['sizes'][str(n_rows)] = steps
+        failures += [f'{name} ({n_rows} rows): expected {count} rows, found {found}'
+                     for name, (count, found) in differences.items()]
+
+        baseline_steps = baseline['sizes'].get(str(n_rows), dict()) if baseline else dict()
+        print(f'{n_rows} rows')
+        print(f'  {"step":<32} {"seconds":>9} {"peak MB":>9} {"rows":>9} {"baseline":>9}')
+        for step, stats in steps.items():
+            ratio = f'{stats["seconds"] / baseline_steps[step]["seconds"]:8.2f}x' if step in baseline_steps else ''
+            peak_mb = f'{stats["peak_mb"]:9.1f}' if 'peak_mb' in stats else ''
+            print(f'  {step:<32} {stats["seconds"]:9.3f} {peak_mb:>9} {stats.get("rows", ""):>9} {ratio:>9}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        failures += [f'regression: {each}' for each in regressions(results, baseline, args.tolerance)]
+    failures += [f'{name} was imported' for name in FORBIDDEN_MODULES if name in sys.modules]
+
+    if failures:
+        sys.exit('FAIL:\n' + '\n'.join(failures))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,477 @@
+'''
+Synthetic WDPA tables for benchmarks: polygon, point and source tables with
+the fields of INPUT_FIELDS_POLY, INPUT_FIELDS_PT and INPUT_FIELDS_META, and
+the dtypes of tables loaded by wdpa.qa.arcgis_table_to_df.
+
+Values follow the shape of the WDPA: most WDPAIDs have a single part, a few
+countries and sources hold most rows, most sites are terrestrial (MARINE '0')
+and nationally designated, and areas are log-normal, with reported areas within
+a few percent of the GIS areas. The generated rows pass all checks, except
+ivd_status_yr: STATUS_YR is an integer field, while invalid_status_yr compares
+it with strings, so all rows are flagged.
+
+A known number of errors is then injected for each check of poly_checks or
+pt_checks, in rows (or WDPAIDs) of their own, and the number of rows each
+check must return is given, so that benchmarks can also confirm the results.
+Some errors cannot be injected without failing another check (e.g. an invalid
+IUCN_CAT also fails ivd_desig_eng_iucn_cat_other); these are counted too.
+
+Run from the repository root, to generate the tables and verify the counts:
+python -m benchmarks.synthetic [n_rows] [errors_per_check]
+'''
+
+import datetime
+import sys
+import time
+import numpy as np
+import pandas as pd
+from wdpa import qa, reference
+from wdpa.runner import run_checks
+
+SIZES = [300000, 1000000, 10000000]
+
+# Rows per source (METADATAID), as in the WDPA
+ROWS_PER_SOURCE = 125
+
+NATIONAL_DESIGNATIONS = ['Nature Reserve', 'National Park', 'Forest Reserve', 'Protected Landscape',
+                         'Wildlife Sanctuary', 'Game Reserve', 'Natural Monument', 'Marine Reserve',
+                         'Conservation Area', 'Private Reserve', 'Community Forest', 'Hunting Area']
+NOT_APPLICABLE_DESIGNATIONS = ['Indigenous Community Conserved Area', 'Territory of Life']
+RAMSAR = 'Ramsar Site, Wetland of International Importance'
+UNESCO = 'UNESCO-MAB Biosphere Reserve'
+WHS = 'World Heritage Site (natural or mixed)'
+RAMSAR_INT_CRIT = ['(i)', '(ii)', '(i)(ii)', '(ii)(iii)(iv)', '(v)(vi)', '(i)(iii)(viii)', 'Not Reported']
+WHS_INT_CRIT = ['(vii)', '(ix)(x)', '(viii)', '(vii)(viii)(ix)(x)']
+
+PLACES = ['Agoro', 'Ayipe', 'Lopeichubei', 'Kibale', 'Serengeti', 'Doñana', 'Wadden', 'Camargue',
+          'Sundarbans', 'Kakadu', 'Galápagos', 'Okavango', 'Tsingy', 'Białowieża', 'Jasper',
+          'Yellowstone', 'Torres del Paine', 'Lake Malawi', 'Kinabalu', 'Virunga', 'Komodo',
+          'Ngorongoro', 'Manú', 'Tayrona', 'Durmitor', 'Pirin', 'Sarek', 'Vatnajökull', 'Cairngorms',
+          'Snowdonia', 'Białka', 'Teide', 'Etosha', 'Aïr', 'Ténéré', 'Banc d\'Arguin', 'Sian Ka\'an',
+          'Iguazú', 'Canaima', 'Pantanal', 'Fiordland', 'Tongariro', 'Uluru', 'Daintree', 'Ha Long',
+          'Phong Nha', 'Khao Yai', 'Chitwan', 'Sagarmatha', 'Nanda Devi', 'Wolong', 'Shiretoko']
+MANAGEMENT_AUTHORITIES = ['Not Reported', 'Ministry of Environment', 'National Parks Service',
+                          'Forest Department', 'Wildlife Authority', 'Regional Council', 'Local Community']
+
+GIS_AREA_MEDIAN_KM2 = 10
+GIS_AREA_SIGMA = 2.5
+
+######################################
+#### 1. Tables without any errors ####
+######################################
+
+def _allowed_values(check_func):
+    '''
+    Return the values allowed by an invalid_value_in_field input function
+    '''
+
+    return check_func(None)[1]
+
+def _weights(n, exponent=1.0):
+    '''
+    Return Zipf-like probabilities for n values: the first values are the most common
+    '''
+
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+def _draw(rng, values, size, p=None):
+    '''
+    Draw size values at random, as an object array sharing the values
+    '''
+
+    values = np.asarray(values, dtype=object)
+    return values[rng.choice(len(values), size, p=p)]
+
+def _clean_columns(n_rows, n_sources, rng, first_wdpaid=1):
+    '''
+    Return a dictionary of the columns of a table without errors, with the
+    GIS areas of polygons, and the number of parts of the WDPAID of each row
+    '''
+
+    # WDPAIDs of 1 to 4 parts, the rows of a WDPAID being adjacent
+    sizes = rng.choice([1, 2, 3, 4], n_rows, p=[0.94, 0.04, 0.015, 0.005])
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), n_rows) + 1]
+    sizes[-1] -= sizes.sum() - n_rows
+    n_groups = len(sizes)
+    group = np.repeat(np.arange(n_groups), sizes)
+    part = np.arange(n_rows) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+
+    wdpaid = (first_wdpaid + np.cumsum(rng.randint(1, 20, n_groups)) - 1).astype(float)
+
+    # Designations
+    desig_type = _draw(rng, ['National', 'Regional', 'International', 'Not Applicable'], n_groups, [0.86, 0.08, 0.04, 0.02])
+    desig_eng = _draw(rng, NATIONAL_DESIGNATIONS, n_groups, _weights(len(NATIONAL_DESIGNATIONS)))
+    regional = desig_type == 'Regional'
+    desig_eng[regional] = _draw(rng, _allowed_values(qa.invalid_desig_eng_regional), regional.sum())
+    international = desig_type == 'International'
+    desig_eng[international] = _draw(rng, [RAMSAR, UNESCO, WHS], international.sum(), [0.6, 0.25, 0.15])
+    not_applicable = desig_type == 'Not Applicable'
+    desig_eng[not_applicable] = _draw(rng, NOT_APPLICABLE_DESIGNATIONS, not_applicable.sum())
+
+    iucn_values = [value for value in _allowed_values(qa.invalid_iucn_cat) if value != 'Not Applicable']
+    iucn_cat = _draw(rng, iucn_values, n_groups, _weights(len(iucn_values), 0.5)[::-1])
+    iucn_cat[(desig_eng == UNESCO) | (desig_eng == WHS)] = 'Not Applicable'
+
+    int_crit = np.full(n_groups, 'Not Applicable', dtype=object)
+    ramsar = desig_eng == RAMSAR
+    int_crit[ramsar] = _draw(rng, RAMSAR_INT_CRIT, ramsar.sum())
+    whs = desig_eng == WHS
+    int_crit[whs] = _draw(rng, WHS_INT_CRIT, whs.sum())
+
+    # Marine and no take
+    marine = _draw(rng, ['0', '1', '2'], n_groups, [0.8, 0.12, 0.08])
+    no_take = _draw(rng, ['All', 'Part', 'None', 'Not Reported'], n_groups, [0.05, 0.15, 0.3, 0.5])
+    no_take[marine == '0'] = 'Not Applicable'
+
+    status = _draw(rng, _allowed_values(qa.invalid_status), n_groups, [0.02, 0.02, 0.02, 0.9, 0.04])
+    status[not_applicable] = 'Established'
+    status_yr = rng.randint(1900, datetime.date.today().year + 1, n_groups)
+    status_yr[rng.rand(n_groups) < 0.1] = 0
+
+    # Countries and sources: a few of them hold most sites
+    iso3_values = sorted(reference.iso3_codes())
+    iso3 = _draw(rng, rng.permutation(iso3_values), n_groups, _weights(len(iso3_values)))
+    transboundary = np.flatnonzero(rng.rand(n_groups) < 0.002)
+    iso3[transboundary] = [a + ';' + b for a, b in zip(iso3[transboundary], _draw(rng, iso3_values, len(transboundary)))]
+    metadataid = rng.choice(np.arange(1, n_sources + 1), n_groups, p=_weights(n_sources, 0.8))
+
+    names = [place + ' ' + designation for place in PLACES for designation in NATIONAL_DESIGNATIONS]
+    name = _draw(rng, names, n_groups)
+    sub_locs = ['Not Reported'] + [f'{code[:2]}-{i:02d}' for code in iso3_values[:40] for i in range(1, 6)]
+    sub_loc = _draw(rng, sub_locs, n_groups, np.r_[0.6, np.full(len(sub_locs) - 1, 0.4 / (len(sub_locs) - 1))])
+
+    columns = {'WDPAID': wdpaid[group],
+               'WDPA_PID': wdpaid[group] + part / 10,
+               'PA_DEF': np.full(n_rows, '1', dtype=object),
+               'NAME': name[group],
+               'ORIG_NAME': name[group],
+               'DESIG': desig_eng[group],
+               'DESIG_ENG': desig_eng[group],
+               'DESIG_TYPE': desig_type[group],
+               'IUCN_CAT': iucn_cat[group],
+               'INT_CRIT': int_crit[group],
+               'MARINE': marine[group],
+               'NO_TAKE': no_take[group],
+               'STATUS': status[group],
+               'STATUS_YR': status_yr[group].astype(np.int64),
+               'GOV_TYPE': _draw(rng, _allowed_values(qa.invalid_gov_type), n_groups, _weights(12, 1.5))[group],
+               'OWN_TYPE': _draw(rng, _allowed_values(qa.invalid_own_type), n_groups, _weights(9, 1.5))[group],
+               'MANG_AUTH': _draw(rng, MANAGEMENT_AUTHORITIES, n_groups)[group],
+               'MANG_PLAN': _draw(rng, ['Not Reported', 'Management Plan', 'Management Plan (expired)'], n_groups, [0.7, 0.2, 0.1])[group],
+               'VERIF': _draw(rng, _allowed_values(qa.invalid_verif), n_groups, [0.9, 0.05, 0.05])[group],
+               'METADATAID': metadataid[group].astype(np.int64),
+               'SUB_LOC': sub_loc[group],
+               'PARENT_ISO3': iso3[group],
+               'ISO3': iso3[group]}
+
+    # Areas of each part: the marine proportion of the GIS area follows MARINE,
+    # and reported areas are within 3% (at most 45 km²) of the GIS areas
+    marine = columns['MARINE']
+    gis_area = np.clip(rng.lognormal(np.log(GIS_AREA_MEDIAN_KM2), GIS_AREA_SIGMA, n_rows), 0.001, 500000)
+    proportion = np.select([marine == '1', marine == '2'], [rng.uniform(0.15, 0.85, n_rows), rng.uniform(0.92, 1, n_rows)], 0)
+    factor = np.clip(rng.lognormal(0, 0.01, n_rows), 0.97, 1.03)
+    factor[columns['NO_TAKE'] == 'All'] = 1 # NO_TK_AREA is then both REP_M_AREA and GIS_M_AREA
+    rep_area = gis_area + np.clip(gis_area * (factor - 1), -45, 45)
+
+    columns['GIS_AREA'] = gis_area
+    columns['GIS_M_AREA'] = proportion * gis_area
+    columns['REP_AREA'] = rep_area
+    columns['REP_M_AREA'] = proportion * rep_area
+    columns['NO_TK_AREA'] = np.select([columns['NO_TAKE'] == 'All', columns['NO_TAKE'] == 'Part'],
+                                      [columns['REP_M_AREA'], 0.5 * np.minimum(columns['REP_M_AREA'], columns['GIS_M_AREA'])], 0)
+
+    return columns, sizes[group]
+
+def synthetic_source_table(n_sources, seed=0):
+    '''
+    Return a synthetic Source Table of n_sources rows, with the fields of INPUT_FIELDS_META
+
+    ## Arguments ##
+    n_sources -- number of sources (METADATAIDs 1 to n_sources)
+    seed --      seed of the random values
+    '''
+
+    rng = np.random.RandomState(seed)
+    iso3 = _draw(rng, sorted(reference.iso3_codes()), n_sources)
+    year = rng.randint(1990, datetime.date.today().year + 1, n_sources)
+    update_yr = np.minimum(year + rng.randint(0, 10, n_sources), datetime.date.today().year)
+
+    source_df = pd.DataFrame({'METADATAID': np.arange(1, n_sources + 1, dtype=np.int64),
+                              'DATA_TITLE': [f'Protected areas of {code}' for code in iso3],
+                              'RESP_PARTY': _draw(rng, MANAGEMENT_AUTHORITIES[1:], n_sources),
+                              'VERIFIER': _draw(rng, ['Ministry of Environment', 'Not Reported'], n_sources),
+                              'YEAR': year.astype(str).astype(object),
+                              'UPDATE_YR': update_yr.astype(str).astype(object),
+                              'LANGUAGE': _draw(rng, ['English', 'French', 'Spanish'], n_sources, [0.6, 0.2, 0.2]),
+                              'CHAR_SET': np.full(n_sources, 'UTF-8', dtype=object),
+                              'REF_SYSTEM': np.full(n_sources, 'WGS 84', dtype=object),
+                              'SCALE': _draw(rng, ['1:10000', '1:50000', '1:250000', 'Not Reported'], n_sources),
+                              'LINEAGE': np.full(n_sources, 'Digitised from national maps', dtype=object),
+                              'CITATION': [f'Protected areas of {code} ({y})' for code, y in zip(iso3, year)],
+                              'DISCLAIMER': np.full(n_sources, 'Not Reported', dtype=object)},
+                             columns=qa.INPUT_FIELDS_META)
+    source_df.index = pd.RangeIndex(1, n_sources + 1, name='OBJECTID')
+
+    return source_df
+
+############################
+#### 2. Injected errors ####
+############################
+
+# Each error is injected in rows of a pool of its own: single-part WDPAIDs,
+# or the second row of two-part WDPAIDs for the 'inconsistent' checks
+
+def _pools(columns, sizes):
+    '''
+    Return a dictionary of boolean masks of the rows each error can be injected in
+    '''
+
+    single = sizes == 1
+    pair = (sizes == 2) & (np.r_[False, columns['WDPAID'][1:] == columns['WDPAID'][:-1]])
+    national = columns['DESIG_TYPE'] == 'National'
+    small = (columns['GIS_AREA'] >= 1) & (columns['GIS_AREA'] <= 30)
+    no_take_none = np.isin(columns['NO_TAKE'], ['None', 'Not Reported'])
+    marine = columns['MARINE']
+
+    return {'national': single & national,
+            'ramsar': single & (columns['DESIG_ENG'] == RAMSAR),
+            'unesco': single & (columns['DESIG_ENG'] == UNESCO),
+            'marine0': single & (marine == '0') & small,
+            'marine1': single & (marine == '1') & small & no_take_none,
+            'marine1_part': single & (marine == '1') & small & (columns['NO_TAKE'] == 'Part'),
+            'marine1_all': single & (marine == '1') & (columns['NO_TAKE'] == 'All'),
+            'marine2': single & (marine == '2') & small,
+            'marine2_large': single & (marine == '2') & (columns['GIS_M_AREA'] >= 70) & no_take_none,
+            'pair': pair,
+            'pair_national': pair & national,
+            'pair_established': pair & national & (columns['STATUS'] == 'Established'),
+            'pair_ramsar': pair & (columns['DESIG_ENG'] == RAMSAR),
+            'pair_no_take': pair & (marine != '0') & no_take_none}
+
+def _set(field, value):
+    def mutate(columns, rows):
+        columns[field][rows] = value
+    return mutate
+
+def _append(field, suffix):
+    def mutate(columns, rows):
+        columns[field][rows] = [value + suffix for value in columns[field][rows]]
+    return mutate
+
+def _cycle(field, values):
+    '''
+    Replace each value of field by the next of values, another valid value
+    '''
+
+    following = {value: values[(i + 1) % len(values)] for i, value in enumerate(values)}
+    def mutate(columns, rows):
+        columns[field][rows] = [following.get(value, values[0]) for value in columns[field][rows]]
+    return mutate
+
+def _areas(**factors):
+    '''
+    Set area fields to a multiple of another area field of the same row,
+    e.g. _areas(GIS_AREA=('REP_AREA', 49)) sets GIS_AREA to 49 times REP_AREA
+    '''
+
+    def mutate(columns, rows):
+        for field, (other, factor) in factors.items():
+            columns[field][rows] = columns[other][rows] * factor
+    return mutate
+
+def _combine(*mutations):
+    def mutate(columns, rows):
+        for each in mutations:
+            each(columns, rows)
+    return mutate
+
+def _other_status_yr(columns, rows):
+    columns['STATUS_YR'][rows] = np.where(columns['STATUS_YR'][rows] == 1990, 1991, 1990)
+
+def _other_metadataid(columns, rows):
+    columns['METADATAID'][rows] = columns['METADATAID'][rows] % columns['METADATAID'].max() + 1
+
+def _errors():
+    '''
+    Return the errors that can be injected: a list of (check name, pool,
+    mutation, names of the other checks the mutation fails)
+    '''
+
+    errors = [
+    ('tiny_rep_area', 'marine0', _set('REP_AREA', 0.00005), []),
+    ('zero_rep_m_area_marine12', 'marine1', _set('REP_M_AREA', 0), []),
+    ('ivd_rep_m_area_gt_rep_area', 'marine1', _areas(REP_M_AREA=('REP_AREA', 1.5)), []),
+    ('ivd_no_tk_area_gt_rep_m_area', 'marine1_part', _areas(REP_M_AREA=('GIS_M_AREA', 0.5), NO_TK_AREA=('GIS_M_AREA', 1)), []),
+    ('ivd_no_tk_area_rep_m_area', 'marine1_all', _areas(NO_TK_AREA=('REP_M_AREA', 0.5)), []),
+    ('ivd_int_crit_desig_eng_other', 'national', _set('INT_CRIT', '(i)'), []),
+    ('ivd_desig_eng_iucn_cat_other', 'national', _set('IUCN_CAT', 'Not Applicable'), []),
+    ('dif_name_same_id', 'pair', _append('NAME', ' II'), []),
+    ('dif_orig_name_same_id', 'pair', _append('ORIG_NAME', ' II'), []),
+    ('ivd_dif_desig_same_id', 'pair', _append('DESIG', ' II'), []),
+    ('ivd_dif_desig_eng_same_id', 'pair_national', _cycle('DESIG_ENG', NATIONAL_DESIGNATIONS), []),
+    ('dif_desig_type_same_id', 'pair_established', _set('DESIG_TYPE', 'Not Applicable'), []),
+    ('dif_int_crit_same_id', 'pair_ramsar', _cycle('INT_CRIT', RAMSAR_INT_CRIT), []),
+    ('dif_no_take_same_id', 'pair_no_take', _cycle('NO_TAKE', ['None', 'Not Reported']), []),
+    ('dif_status_same_id', 'pair_national', _cycle('STATUS', _allowed_values(qa.invalid_status)), []),
+    ('dif_status_yr_same_id', 'pair', _other_status_yr, []),
+    ('dif_gov_type_same_id', 'pair', _cycle('GOV_TYPE', _allowed_values(qa.invalid_gov_type)), []),
+    ('dif_own_type_same_id', 'pair', _cycle('OWN_TYPE', _allowed_values(qa.invalid_own_type)), []),
+    ('dif_mang_auth_same_id', 'pair', _append('MANG_AUTH', ' II'), []),
+    ('dif_mang_plan_same_id', 'pair', _append('MANG_PLAN', ' II'), []),
+    ('ivd_dif_verif_same_id', 'pair', _cycle('VERIF', _allowed_values(qa.invalid_verif)), []),
+    ('ivd_dif_metadataid_same_id', 'pair', _other_metadataid, []),
+    ('ivd_dif_sub_loc_same_id', 'pair', _append('SUB_LOC', ' II'), []),
+    ('ivd_dif_parent_iso3_same_id', 'pair', _cycle('PARENT_ISO3', sorted(reference.iso3_codes())), []),
+    ('ivd_dif_iso3_same_id', 'pair', _cycle('ISO3', sorted(reference.iso3_codes())), []),
+    ('ivd_pa_def', 'national', _set('PA_DEF', '0'), []),
+    ('ivd_desig_eng_international', 'national', _set('DESIG_TYPE', 'International'), []),
+    ('ivd_desig_type_international', 'national', _combine(_set('DESIG_ENG', UNESCO), _set('IUCN_CAT', 'Not Applicable')), []),
+    ('ivd_desig_eng_regional', 'national', _set('DESIG_TYPE', 'Regional'), []),
+    ('ivd_desig_type_regional', 'national', _set('DESIG_ENG', 'Marine Protected Area (OSPAR)'), []),
+    ('ivd_int_crit', 'ramsar', _set('INT_CRIT', '(xi)'), []),
+    ('ivd_desig_type', 'national', _set('DESIG_TYPE', 'Local'), []),
+    ('ivd_iucn_cat', 'national', _set('IUCN_CAT', 'VII'), ['ivd_desig_eng_iucn_cat_other']),
+    ('ivd_iucn_cat_unesco_whs', 'unesco', _set('IUCN_CAT', 'II'), []),
+    ('ivd_marine', 'marine0', _set('MARINE', '3'), ['ivd_marine_designation']),
+    ('check_no_take_marine0', 'marine0', _set('NO_TAKE', 'None'), []),
+    ('ivd_no_take_marine12', 'marine1', _set('NO_TAKE', 'Not Applicable'), []),
+    ('check_no_tk_area_marine0', 'marine0', _set('NO_TK_AREA', 1),
+     ['ivd_no_tk_area_no_take', 'ivd_no_tk_area_gt_rep_m_area', 'no_tk_area_gt_gis_m_area']),
+    ('ivd_no_tk_area_no_take', 'marine1', _combine(_set('NO_TAKE', 'Not Applicable'), _areas(NO_TK_AREA=('GIS_M_AREA', 0.5))),
+     ['ivd_no_take_marine12']),
+    ('ivd_status', 'national', _set('STATUS', 'Abandoned'), []),
+    ('ivd_gov_type', 'national', _set('GOV_TYPE', 'Unknown'), []),
+    ('ivd_own_type', 'national', _set('OWN_TYPE', 'Unknown'), []),
+    ('ivd_verif', 'national', _set('VERIF', 'Unknown'), []),
+    ('check_parent_iso3', 'national', _set('PARENT_ISO3', 'XXX'), []),
+    ('check_iso3', 'national', _set('ISO3', 'XXX'), []),
+    ('ivd_status_desig_type', 'national', _combine(_set('DESIG_TYPE', 'Not Applicable'), _set('STATUS', 'Designated')), []),
+    # polygons only
+    ('gis_area_gt_rep_area', 'marine0', _areas(GIS_AREA=('REP_AREA', 49)), []),
+    ('rep_area_gt_gis_area', 'marine0', _areas(REP_AREA=('GIS_AREA', 49)), []),
+    ('gis_m_area_gt_rep_m_area', 'marine2_large', _areas(REP_M_AREA=('GIS_M_AREA', 1 / 49)), []),
+    ('rep_m_area_gt_gis_m_area', 'marine2_large', _areas(GIS_M_AREA=('REP_M_AREA', 1 / 49)), ['ivd_marine_designation']),
+    ('tiny_gis_area', 'marine0', _set('GIS_AREA', 0.00005), []),
+    ('ivd_gis_m_area_gt_gis_area', 'marine2', _areas(GIS_M_AREA=('GIS_AREA', 1.5)), []),
+    ('zero_gis_m_area_marine12', 'marine1', _set('GIS_M_AREA', 0), ['ivd_marine_designation']),
+    ('ivd_marine_designation', 'marine2', _set('MARINE', '1'), []),]
+
+    for field in ['NAME', 'ORIG_NAME', 'DESIG', 'DESIG_ENG', 'MANG_AUTH', 'MANG_PLAN', 'SUB_LOC']:
+        errors.append((f'ivd_character_{field.lower()}', 'national', _append(field, '*'), []))
+        errors.append((f'nan_present_{field.lower()}', 'national', _set(field, np.nan), []))
+
+    return errors
+
+def synthetic_wdpa(n_rows, datatype='poly', errors_per_check=10, n_sources=None, seed=0):
+    '''
+    Return a synthetic WDPA table of n_rows rows, with errors_per_check errors
+    injected for each check of poly_checks (or pt_checks), and a dictionary of
+    the number of rows each check returns, e.g. in the result of run_checks.
+
+    ## Arguments ##
+    n_rows --           number of rows of the table
+    datatype --         'poly' for a polygon table (INPUT_FIELDS_POLY), or 'point' (INPUT_FIELDS_PT)
+    errors_per_check -- number of errors injected for each check: rows, WDPAIDs
+                        with two parts (inconsistent checks) or pairs of rows (duplicate_wdpa_pid)
+    n_sources --        number of METADATAIDs, by default one per ROWS_PER_SOURCE rows
+    seed --             seed of the random values
+
+    ## Example ##
+    wdpa_df, expected = synthetic_wdpa(1000000, 'poly', errors_per_check=10)
+    result = run_checks(wdpa_df, poly_checks)
+    assert all(len(result[name]) == count for name, count in expected.items())
+    '''
+
+    if datatype == 'poly':
+        checks, input_fields, first_wdpaid = qa.poly_checks, qa.INPUT_FIELDS_POLY, 1
+    elif datatype == 'point':
+        checks, input_fields, first_wdpaid = qa.pt_checks, qa.INPUT_FIELDS_PT, 500000000
+    else:
+        raise ValueError(f'ERROR: datatype must be "poly" or "point", not {datatype}')
+
+    n_sources = n_sources or max(2, n_rows // ROWS_PER_SOURCE)
+    rng = np.random.RandomState(seed)
+    columns, sizes = _clean_columns(n_rows, n_sources, rng, first_wdpaid)
+    pools = _pools(columns, sizes)
+    used = np.zeros(n_rows, dtype=bool)
+    names = {check['name'] for check in checks}
+
+    def take(pool, n):
+        available = np.flatnonzero(pools[pool] & ~used)
+        if len(available) < n:
+            raise ValueError(f'ERROR: {n_rows} rows are too few to inject {errors_per_check} errors per check in {pool} rows')
+        rows = np.sort(rng.choice(available, n, replace=False))
+        used[rows] = True
+        if pool.startswith('pair'):
+            used[rows - 1] = True
+        return rows
+
+    expected = {name: 0 for name in names}
+
+    # duplicate_wdpa_pid: the second row of each pair takes the WDPA_PID of the first
+    rows = take('national', 2 * errors_per_check)
+    first, second = rows[:errors_per_check], rows[errors_per_check:]
+    columns['WDPA_PID'][second] = columns['WDPA_PID'][first]
+    expected['duplicate_wdpa_pid'] = 2 * errors_per_check
+
+    for name, pool, mutate, also in _errors():
+        if name not in names:
+            continue
+        mutate(columns, take(pool, errors_per_check))
+        for each in [name] + also:
+            if each in names:
+                expected[each] += errors_per_check * (2 if pool.startswith('pair') else 1)
+
+    expected['ivd_status_yr'] = n_rows
+
+    wdpa_df = pd.DataFrame({field: columns[field] for field in input_fields}, columns=input_fields)
+    wdpa_df.index = pd.RangeIndex(1, n_rows + 1, name='OBJECTID')
+
+    return wdpa_df, expected
+
+def synthetic_tables(n_rows, errors_per_check=10, seed=0):
+    '''
+    Return a synthetic polygon table of n_rows rows, a point table of n_rows // 10 rows
+    (as in the WDPA; at least 10000), the Source Table of their METADATAIDs, and the number of rows
+    each check returns for the polygon and point tables
+    '''
+
+    n_sources = max(2, n_rows // ROWS_PER_SOURCE)
+    poly_df, poly_expected = synthetic_wdpa(n_rows, 'poly', errors_per_check, n_sources, seed)
+    point_df, point_expected = synthetic_wdpa(max(n_rows // 10, 10000), 'point', errors_per_check, n_sources, seed + 1)
+
+    return poly_df, point_df, synthetic_source_table(n_sources, seed), poly_expected, point_expected
+
+def count_differences(result, expected):
+    '''
+    Return a dictionary of the checks whose number of rows in result differs
+    from expected, with the (expected, found) number of rows
+    '''
+
+    return {name: (count, len(result[name])) for name, count in expected.items()
+            if len(result[name]) != count}
+
+def main(n_rows=300000, errors_per_check=10):
+    start = time.perf_counter()
+    poly_df, point_df, source_df, poly_expected, point_expected = synthetic_tables(n_rows, errors_per_check)
+    print(f'generated {len(poly_df)} polygons, {len(point_df)} points and {len(source_df)} sources '
+          f'in {time.perf_counter() - start:.3f} s '
+          f'({(poly_df.memory_usage(deep=True).sum() + point_df.memory_usage(deep=True).sum()) / 1e6:.0f} MB)')
+
+    failed = False
+    for datatype, wdpa_df, checks, expected in [('poly', poly_df, qa.poly_checks, poly_expected),
+                                                ('point', point_df, qa.pt_checks, point_expected)]:
+        start = time.perf_counter()
+        differences = count_differences(run_checks(wdpa_df, checks), expected)
+        print(f'{datatype}: {len(checks)} checks in {time.perf_counter() - start:.3f} s, '
+              f'{len(differences)} with an unexpected number of rows')
+        for name, (count, found) in differences.items():
+            print(f'  {name}: expected {count}, found {found}')
+        failed = failed or bool(differences)
+
+    if failed:
+        sys.exit('FAIL: the checks did not find the injected errors')
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -1,7 +1,8 @@
-import sys, arcpy
+import sys
 import numpy as np
-from wdpa.qa import arcgis_table_to_df, find_wdpa_rows, poly_checks, INPUT_FIELDS_META
+from wdpa.qa import find_wdpa_rows, poly_checks, INPUT_FIELDS_META
 from wdpa.export import output_errors_to_excel
+from wdpa.cache import cached_table_to_df
 
 # input
 input_poly = sys.argv[1]
@@ -18,9 +19,9 @@ output_path = sys.argv[4]
 INPUT_FIELDS = ['WDPAID', 'WDPA_PID', 'METADATAID', 'NAME', 'ISO3', 'DESIG']
 
 # make dfs
-df_poly = arcgis_table_to_df(input_poly, INPUT_FIELDS)
-df_pt = arcgis_table_to_df(input_pt, INPUT_FIELDS)
-df_meta = arcgis_table_to_df(input_meta, INPUT_FIELDS_META)
+df_poly = cached_table_to_df(input_poly, INPUT_FIELDS)
+df_pt = cached_table_to_df(input_pt, INPUT_FIELDS)
+df_meta = cached_table_to_df(input_meta, INPUT_FIELDS_META)
 
 result = dict()
 # check duplicate WDPAID and WDPA_PID across point and polygon
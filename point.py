@@ -1,32 +1,41 @@
 # Load packages and modules
-import sys, arcpy
-from wdpa.qa import arcgis_table_to_df, find_wdpa_rows, pt_checks, INPUT_FIELDS_PT
-from wdpa.export import output_errors_to_excel
+import sys
+from wdpa.qa import add_message, pt_checks, INPUT_FIELDS_PT
+from wdpa.chunked import default_memory_mb, load_and_run_chunked
+from wdpa.export import check_formats, export_results
+from wdpa.incremental import load_and_run_incremental, state_file
+from wdpa.profiling import log_phase, measure_step, new_run_log, run_log_file, write_run_log
 
-# Load input
-input_pt = sys.argv[1]
-output_path = sys.argv[2]
+# Guarded, so that the worker processes of a parallel run (WDPA_QA_WORKERS) do not run the script again
+if __name__ == '__main__':
+    # Load input
+    input_pt = sys.argv[1]
+    output_path = sys.argv[2]
+    # Optional: comma-separated check names, tags or fields to run, e.g. 'ISO3,duplicate'
+    selection = sys.argv[3].split(',') if len(sys.argv) > 3 and sys.argv[3] else None
+    # Optional: QA state file (.npz) saved by the run on the previous release, to only check what changed
+    previous_state = sys.argv[4] if len(sys.argv) > 4 and sys.argv[4] else None
+    # Optional: comma-separated formats to export the results to, e.g. 'excel,parquet' (see wdpa.export.EXPORTERS)
+    formats = sys.argv[5].split(',') if len(sys.argv) > 5 and sys.argv[5] else ['excel']
+    check_formats(formats)
+    # Time and memory of each check and phase, shown in the Summary sheet and saved next to the output
+    run_log = new_run_log('point', input_pt)
 
-# Let us welcome our guest of honour
-arcpy.AddMessage('\nAll hail the WDPA\n')
+    # Let us welcome our guest of honour
+    add_message('\nAll hail the WDPA\n')
 
-# Convert Point table to pandas DataFrame
-arcpy.AddMessage('Converting to pandas DataFrame')
-pt_df = arcgis_table_to_df(input_pt, INPUT_FIELDS_PT)
-result = dict()
+    # Convert the fields of the Point table needed by the checks to pandas DataFrame, and run the checks
+    add_message('--- Running QA checks on Points ---')
+    # Or read it in chunks, to bound the memory used, if WDPA_QA_MEMORY_MB is set: the QA state is then not used nor saved
+    if default_memory_mb():
+        checks, result = load_and_run_chunked(input_pt, pt_checks, INPUT_FIELDS_PT, selection, run_log=run_log)
+    else:
+        checks, result = load_and_run_incremental(input_pt, pt_checks, INPUT_FIELDS_PT, previous_state, 
+                                                  state_file(output_path, 'point'), selection, run_log)
 
-# Run the checks
-arcpy.AddMessage('--- Running QA checks on Points ---')
-for pt_check in pt_checks: # pt_checks is a dictionary with checks' descriptive names and function names
-    arcpy.AddMessage('Running:' + pt_check['name'])
-    # checks are not currently optimised, thus return all pids regardless
-    wdpa_pid = pt_check['func'](pt_df, True)
-
-    # For each check, obtain the rows that contain errors
-    if wdpa_pid.size > 0:
-        result[pt_check['name']] = find_wdpa_rows(pt_df, wdpa_pid)
-
-# Write output to file
-arcpy.AddMessage('Writing output to Excel')
-output_errors_to_excel(result, output_path, pt_checks, 'point')
-arcpy.AddMessage('\nThe QA checks on POINTS have finished. \n\nWritten by Stijn den Haan and Yichuan Shi\nAugust 2019')
\ No newline at end of file
+    # Write output to file
+    add_message(f'Writing output to {", ".join(formats)}')
+    _, stats = measure_step(export_results, result, output_path, checks, 'point', formats, run_log, trace_memory=False)
+    log_phase(run_log, 'export', stats)
+    write_run_log(run_log, run_log_file(output_path, 'point'))
+    add_message('\nThe QA checks on POINTS have finished. \n\nWritten by Stijn den Haan and Yichuan Shi\nAugust 2019')
\ No newline at end of file
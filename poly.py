@@ -1,32 +1,41 @@
 # Load packages and modules
-import sys, arcpy
-from wdpa.qa import arcgis_table_to_df, find_wdpa_rows, poly_checks, INPUT_FIELDS_POLY
-from wdpa.export import output_errors_to_excel
+import sys
+from wdpa.qa import add_message, poly_checks, INPUT_FIELDS_POLY
+from wdpa.chunked import default_memory_mb, load_and_run_chunked
+from wdpa.export import check_formats, export_results
+from wdpa.incremental import load_and_run_incremental, state_file
+from wdpa.profiling import log_phase, measure_step, new_run_log, run_log_file, write_run_log
 
-# Load input
-input_poly = sys.argv[1]
-output_path = sys.argv[2]
+# Guarded, so that the worker processes of a parallel run (WDPA_QA_WORKERS) do not run the script again
+if __name__ == '__main__':
+    # Load input
+    input_poly = sys.argv[1]
+    output_path = sys.argv[2]
+    # Optional: comma-separated check names, tags or fields to run, e.g. 'ISO3,duplicate'
+    selection = sys.argv[3].split(',') if len(sys.argv) > 3 and sys.argv[3] else None
+    # Optional: QA state file (.npz) saved by the run on the previous release, to only check what changed
+    previous_state = sys.argv[4] if len(sys.argv) > 4 and sys.argv[4] else None
+    # Optional: comma-separated formats to export the results to, e.g. 'excel,parquet' (see wdpa.export.EXPORTERS)
+    formats = sys.argv[5].split(',') if len(sys.argv) > 5 and sys.argv[5] else ['excel']
+    check_formats(formats)
+    # Time and memory of each check and phase, shown in the Summary sheet and saved next to the output
+    run_log = new_run_log('poly', input_poly)
 
-# Let us welcome our guest of honour
-arcpy.AddMessage('\nAll hail the WDPA\n')
+    # Let us welcome our guest of honour
+    add_message('\nAll hail the WDPA\n')
 
-# Convert Polygon table to pandas DataFrame
-arcpy.AddMessage('Converting to pandas DataFrame')
-poly_df = arcgis_table_to_df(input_poly, INPUT_FIELDS_POLY)
-result = dict()
+    # Convert the fields of the Polygon table needed by the checks to pandas DataFrame, and run the checks
+    add_message('--- Running QA checks on Polygons ---')
+    # Or read it in chunks, to bound the memory used, if WDPA_QA_MEMORY_MB is set: the QA state is then not used nor saved
+    if default_memory_mb():
+        checks, result = load_and_run_chunked(input_poly, poly_checks, INPUT_FIELDS_POLY, selection, run_log=run_log)
+    else:
+        checks, result = load_and_run_incremental(input_poly, poly_checks, INPUT_FIELDS_POLY, previous_state, 
+                                                  state_file(output_path, 'poly'), selection, run_log)
 
-# Run the checks
-arcpy.AddMessage('--- Running QA checks on Polygons ---')
-for poly_check in poly_checks: # poly_checks is a dictionary with checks' descriptive names and function names
-    arcpy.AddMessage('Running:' + poly_check['name'])
-    # checks are not currently optimised, thus return all pids regardless
-    wdpa_pid = poly_check['func'](poly_df, True)
-
-    # For each check, obtain the rows that contain errors
-    if wdpa_pid.size > 0:
-        result[poly_check['name']] = find_wdpa_rows(poly_df, wdpa_pid)
-
-# Write output to file
-arcpy.AddMessage('Writing output to Excel')
-output_errors_to_excel(result, output_path, poly_checks, 'poly')
-arcpy.AddMessage('\nThe QA checks on POLYGONS have finished. \n\nWritten by Stijn den Haan and Yichuan Shi\nAugust 2019')
\ No newline at end of file
+    # Write output to file
+    add_message(f'Writing output to {", ".join(formats)}')
+    _, stats = measure_step(export_results, result, output_path, checks, 'poly', formats, run_log, trace_memory=False)
+    log_phase(run_log, 'export', stats)
+    write_run_log(run_log, run_log_file(output_path, 'poly'))
+    add_message('\nThe QA checks on POLYGONS have finished. \n\nWritten by Stijn den Haan and Yichuan Shi\nAugust 2019')
\ No newline at end of file
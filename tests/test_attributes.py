@@ -1,4 +1,5 @@
 import unittest as unittest
+from unittest import mock
 from wdpa import qa
 import pandas as pd
 import numpy as np
@@ -6,7 +7,7 @@ import os
 
 # run test in root 
 # python -m unittest
-test_data = os.getcwd() + os.sep + 'tests' + os.sep + r'data.gdb\test'
+test_data = os.path.join(os.getcwd(), 'tests', 'data.gdb', 'test')
 
 wdpa_df = qa.arcgis_table_to_df(test_data, qa.INPUT_FIELDS_POLY)
 
@@ -31,5 +32,160 @@ class TestISO3(unittest.TestCase):
     def test_invalid_parent_iso3(self):
         self.assertListEqual(list(qa.invalid_parent_iso3(wdpa_df, True)), [40597., 64669., 40642.])
 
+    def test_invalid_country_codes_null(self):
+        df = pd.DataFrame({'WDPA_PID': [1., 2., 3., 4.],
+                           'ISO3': ['UGA', np.nan, 'UGA;XXX', 'UGA;CHN']})
+        self.assertListEqual(list(qa.invalid_iso3(df, True)), [2., 3.])
+
+class TestAreaInvalidMarine(unittest.TestCase):
+    def test_input_unchanged(self):
+        df = wdpa_df.copy()
+        qa.area_invalid_marine(df, True)
+        self.assertListEqual(list(df.columns), qa.INPUT_FIELDS_POLY)
+
+    def test_binning(self):
+        df = pd.DataFrame({'WDPA_PID': [1., 2., 3., 4., 5., 6.],
+                           'MARINE': ['0', '1', '2', '0', '2', np.nan],
+                           'GIS_AREA': [10., 10., 10., 0., 10., 10.],
+                           'GIS_M_AREA': [1., 5., 9., 0., 5., 0.]})
+        self.assertListEqual(list(qa.area_invalid_marine(df, True)), [4., 5., 6.])
+
+class TestInconsistent(unittest.TestCase):
+    def test_batch_matches_groupby(self):
+        df = pd.DataFrame({'WDPAID': [1, 1, 2, 3, 3, 3, np.nan, np.nan],
+                           'WDPA_PID': [1., 1.1, 2., 3., 3.1, 3.2, 4., 5.],
+                           'NAME': ['A', 'B', 'C', 'D', 'D', np.nan, 'E', 'F'],
+                           'ISO3': ['NLD', 'NLD', 'GBR', 'UGA', 'CHN', 'UGA', 'NLD', 'GBR']})
+        batch = qa.inconsistent_fields_same_wdpaid_batch(df, ['NAME', 'ISO3'])
+        for field in ['NAME', 'ISO3']:
+            groups = df.groupby('WDPAID')[field].nunique()
+            expected = df[df['WDPAID'].isin(groups[groups > 1].index)]['WDPA_PID'].values
+            self.assertListEqual(list(batch[field]), list(expected))
+
+class TestInvalidValues(unittest.TestCase):
+    def test_batch_matches_functions(self):
+        df = wdpa_df.copy()
+        df.loc[df.index[:3], 'MARINE'] = ['0', '7', np.nan]
+        df.loc[df.index[:3], 'NO_TAKE'] = ['All', np.nan, 'Not Applicable']
+        df.loc[df.index[:2], 'NO_TK_AREA'] = [np.nan, 3.5]
+        df.loc[df.index[:2], 'DESIG_TYPE'] = ['Not Applicable', 'Not Applicable']
+        df.loc[df.index[:2], 'STATUS'] = ['Designated', 'Established']
+        check_funcs = [check['batch'][1] for check in qa.poly_checks
+                       if check.get('batch') and check['batch'][0] is qa.invalid_values_masks]
+        # every rule of invalid_value_in_field is evaluated in the batch
+        self.assertEqual(len(check_funcs), 20)
+        self.assertIn(qa.invalid_status_desig_type, check_funcs)
+        self.assertListEqual(list(qa.invalid_status_desig_type(df, True)), [df['WDPA_PID'].iloc[0]])
+        batch = qa.invalid_values_batch(df, check_funcs)
+        for check_func in check_funcs:
+            self.assertListEqual(list(batch[check_func]), list(check_func(df, True)))
+
+class TestAreaRatios(unittest.TestCase):
+    def test_zero_compared_area(self):
+        df = pd.DataFrame({'WDPA_PID': [1., 2., 3., 4., 5., 6., 7., 8.],
+                           'REP_AREA': [10., 20., 30., 40., 50., 0., 0., np.nan],
+                           'GIS_AREA': [10., 20., 31., 40., 500., 100., 0., 10.]})
+        stats = qa.area_ratio_stats(df, ['GIS_AREA', 'REP_AREA'])['GIS_AREA']
+        # REP_AREA is 0 for rows 6 (infinite relative size) and 7 (undefined, both areas 0)
+        self.assertEqual(stats['zero_compared_area'], 1)
+        self.assertEqual(stats['undefined'], 2)
+        self.assertEqual(stats['outliers'], 1)
+        self.assertEqual(stats['rows_in_stats'], 5)
+        self.assertAlmostEqual(stats['mean'], np.mean([2., 2., 61 / 30, 2., 11.]))
+        self.assertListEqual(list(qa.area_invalid_too_large_gis(df, True)), [6.])
+        self.assertListEqual(list(qa.area_invalid_too_large_rep(df, True)), [])
+        self.assertListEqual(sorted(qa.area_ratio_diagnostics(df, [('REP_AREA', ())])[('REP_AREA', ())]),
+                             sorted(['mean', 'std', 'max_relative_size', 'rows_in_stats', 'outliers', 'zero_compared_area', 'undefined']))
+
+    def test_group_thresholds(self):
+        # Country A reports areas twice the GIS areas, country B the same areas; C has too few rows
+        rng = np.random.RandomState(0)
+        n = 40
+        gis_area = np.full(3 * n + 5, 1000.)
+        rep_area = np.concatenate([1000. / (2 + rng.uniform(-0.1, 0.1, n)), 1000. / (1 + rng.uniform(-0.05, 0.05, n)),
+                                   1000. / (1 + rng.uniform(-0.05, 0.05, n)), np.full(5, 1000.)])
+        df = pd.DataFrame({'WDPA_PID': np.arange(len(gis_area), dtype=float),
+                           'ISO3': ['A'] * n + ['B'] * 2 * n + [np.nan] * 5,
+                           'GIS_AREA': gis_area, 'REP_AREA': rep_area})
+        # Row 50 of country B is 1.5 times its reported area: an outlier of B, but not of the table
+        df.loc[50, 'REP_AREA'] = 1000. / 1.5
+
+        table = qa.area_ratio_stats(df, ['GIS_AREA'])['GIS_AREA']
+        self.assertFalse(table['invalid'].any())
+
+        stats = qa.area_ratio_stats(df, ['GIS_AREA'], ('ISO3',))['GIS_AREA']
+        self.assertListEqual(list(df['WDPA_PID'][stats['invalid']]), [50.])
+        thresholds = stats['group_thresholds']
+        self.assertListEqual(list(thresholds.columns), ['ISO3', 'ROWS', 'MEDIAN', 'MAD', 'THRESHOLD', 'FALLBACK'])
+        self.assertListEqual(list(thresholds['ISO3']), ['', 'A', 'B'])
+        self.assertListEqual(list(thresholds['ROWS']), [5, n, 2 * n])
+        # The nulls form a group of 5 rows, using the threshold of the whole table
+        self.assertListEqual(list(thresholds['FALLBACK']), [True, False, False])
+        self.assertEqual(thresholds['THRESHOLD'][0], stats['max_relative_size'])
+        self.assertAlmostEqual(thresholds['MEDIAN'][2], np.median(stats['relative_size'][n:3 * n]))
+        self.assertTrue(np.array_equal(stats['threshold'][n:3 * n], np.full(2 * n, thresholds['THRESHOLD'][2])))
+
+        argument = ('GIS_AREA', ('ISO3',))
+        self.assertListEqual(list(qa.area_too_large_masks(df, [argument])[argument].nonzero()[0]), [50])
+        diagnostics = qa.area_ratio_diagnostics(df, [argument])[argument]
+        self.assertEqual(diagnostics['group_by'], 'ISO3')
+        self.assertEqual(diagnostics['fallback_groups'], 1)
+        self.assertEqual(diagnostics['group_thresholds'][1]['ISO3'], 'A')
+
+        # The grouping set in the environment is read when the checks are run
+        with mock.patch.dict(os.environ, {qa.AREA_GROUPS_ENV_VARIABLE: 'ISO3'}):
+            self.assertListEqual(list(qa.area_invalid_too_large_gis(df, True)), [50.])
+        with mock.patch.dict(os.environ, {qa.AREA_GROUPS_ENV_VARIABLE: 'bogus'}):
+            with self.assertRaises(ValueError):
+                qa.area_too_large_masks(df, ['GIS_AREA'])
+
+    def test_accumulator(self):
+        rng = np.random.RandomState(0)
+        gis_area = rng.lognormal(3, 2, 1000)
+        rep_area = gis_area * rng.uniform(0.5, 2, 1000)
+        gis_area[::97] = 0
+        rep_area[::89] = np.nan
+        gis_area[::53] *= 1000
+        df = pd.DataFrame({'WDPA_PID': np.arange(1000, dtype=float), 'GIS_AREA': gis_area, 'REP_AREA': rep_area,
+                           'GIS_M_AREA': gis_area / 10, 'REP_M_AREA': rep_area / 10})
+        stats = qa.area_ratio_stats(df, list(qa.AREA_RATIO_FIELDS))
+
+        # Two shards, read in chunks of 128 rows
+        accumulators = []
+        for shard in [df.iloc[:300], df.iloc[300:]]:
+            accumulator = qa.area_ratio_accumulator()
+            for start in range(0, len(shard), 128):
+                qa.accumulate_area_ratios(accumulator, shard.iloc[start:start + 128])
+            accumulators.append(accumulator)
+        thresholds = qa.area_ratio_thresholds(qa.merge_area_ratio_accumulators(accumulators))
+
+        for large_field, field_stats in stats.items():
+            for key in ['mean', 'std', 'max_relative_size']:
+                self.assertAlmostEqual(thresholds[large_field][key], field_stats[key], places=12)
+            for key in ['rows_in_stats', 'outliers', 'zero_compared_area', 'undefined']:
+                self.assertEqual(thresholds[large_field][key], field_stats[key])
+            values = field_stats['relative_size'][(field_stats['relative_size'] >= 0) & (field_stats['relative_size'] <= qa.MAX_RELATIVE_SIZE)]
+            self.assertLessEqual(abs(thresholds[large_field]['median'] - np.median(values)), qa.MAX_RELATIVE_SIZE / qa.AREA_SKETCH_BINS)
+
+        masks = [qa.area_too_large_chunk_masks(df.iloc[start:start + 128], thresholds) for start in range(0, len(df), 128)]
+        pids = {large_field: df['WDPA_PID'].values[np.concatenate([each[large_field] for each in masks])] for large_field in thresholds}
+        self.assertListEqual(list(pids['GIS_AREA']), list(qa.area_invalid_too_large_gis(df, True)))
+        self.assertListEqual(list(pids['REP_AREA']), list(qa.area_invalid_too_large_rep(df, True)))
+        self.assertListEqual(list(pids['GIS_M_AREA']), list(qa.area_invalid_too_large_gis_m(df, True)))
+        self.assertListEqual(list(pids['REP_M_AREA']), list(qa.area_invalid_too_large_rep_m(df, True)))
+        self.assertTrue(len(pids['GIS_AREA']) > 0)
+
+class TestForbiddenCharacter(unittest.TestCase):
+    def test_batch(self):
+        df = pd.DataFrame({'WDPA_PID': [1., 2., 3., 4., 5.],
+                           'NAME': ['A<B', 'A', np.nan, 'Why?', 'A\nB'],
+                           'SUB_LOC': [np.nan, 'NL-*', 'NL-NH', 'NL-NH', np.nan]})
+        batch = qa.forbidden_character_batch(df, ['NAME', 'SUB_LOC'])
+        # a null in another field does not hide the forbidden characters of a row
+        self.assertListEqual(list(batch['NAME']), [1., 4., 5.])
+        self.assertListEqual(list(batch['SUB_LOC']), [2.])
+        self.assertListEqual(list(qa.forbidden_character_sub_loc(df, True)), [2.])
+        self.assertFalse(qa.forbidden_character_name(wdpa_df))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,22 @@
+import unittest as unittest
+from benchmarks import bench_suite
+from wdpa import qa
+
+
+class TestBenchSuite(unittest.TestCase):
+    def test_bench_size(self):
+        checks = qa.select_checks(qa.poly_checks, ['ISO3', 'duplicate'])
+        steps, differences = bench_suite.bench_size(20000, checks, export=False, memory=False, errors_per_check=2)
+        self.assertListEqual(list(steps), ['load'] + [check['name'] for check in checks])
+        self.assertEqual(steps['check_iso3']['rows'], 2)
+        self.assertDictEqual(differences, {})
+
+    def test_regressions(self):
+        baseline = {'sizes': {'1000': {'load': {'seconds': 1.0, 'peak_mb': 100},
+                                       'check_iso3': {'seconds': 0.01, 'peak_mb': 1}}}}
+        results = {'sizes': {'1000': {'load': {'seconds': 1.5, 'peak_mb': 100},
+                                      'check_iso3': {'seconds': 0.03, 'peak_mb': 3},
+                                      'export': {'seconds': 10.0}}}}
+        # check_iso3 is three times slower, but by less than MIN_SECONDS; export has no baseline
+        self.assertListEqual(bench_suite.regressions(results, baseline, 0.25), ['load (1000 rows): 1.000 s -> 1.500 s'])
+        self.assertListEqual(bench_suite.regressions(results, baseline, 0.5), [])
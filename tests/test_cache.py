@@ -0,0 +1,61 @@
+import unittest as unittest
+from wdpa import cache, qa
+import datetime
+import glob
+import numpy as np
+import pandas as pd
+import os
+import shutil
+import tempfile
+
+# run test in root
+# python -m unittest
+test_data = os.path.join(os.getcwd(), 'tests', 'data.gdb', 'test')
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_roundtrip(self):
+        loaded = cache.cached_table_to_df(test_data, qa.INPUT_FIELDS_POLY, cache_dir=self.cache_dir)
+        cached = cache.cached_table_to_df(test_data, qa.INPUT_FIELDS_POLY, cache_dir=self.cache_dir)
+        self.assertTrue(loaded.equals(cached))
+        self.assertEqual(len(cache.cache_entries(self.cache_dir)), 1)
+
+    def test_no_pickle(self):
+        wdpa_df = pd.DataFrame({'NAME': ['a', None, 'b', 'a'],
+                                'STATUS_YR': [2000, 0, 2010, 2000],
+                                'METADATAID': [1.5, np.nan, 2.5, 3.5],
+                                'DATE': [datetime.date(2019, 6, 1), None, datetime.date(2020, 1, 2), None]})
+        entry_dir = os.path.join(self.cache_dir, 'entry')
+        cache.write_cached_df(wdpa_df, entry_dir, {})
+        for path in glob.glob(os.path.join(entry_dir, '*.npy')):
+            np.load(path, allow_pickle=False)
+
+        cached = cache.read_cached_df(entry_dir)
+        self.assertListEqual(cached['NAME'].tolist()[::2], ['a', 'b'])
+        self.assertTrue(pd.isna(cached['NAME'][1]))
+        self.assertListEqual(cached['STATUS_YR'].tolist(), wdpa_df['STATUS_YR'].tolist())
+        self.assertListEqual(cached['DATE'].tolist()[::2], [datetime.date(2019, 6, 1), datetime.date(2020, 1, 2)])
+
+        with self.assertRaises(ValueError):
+            cache.write_cached_df(pd.DataFrame({'NAME': [b'a', 1]}), os.path.join(self.cache_dir, 'other'), {})
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, 'other')))
+
+    def test_key_depends_on_fields(self):
+        self.assertNotEqual(cache.cache_key(test_data, ['WDPAID']),
+                            cache.cache_key(test_data, ['WDPAID', 'NAME']))
+
+    def test_invalidate_and_evict(self):
+        cache.cached_table_to_df(test_data, ['WDPAID'], cache_dir=self.cache_dir)
+        cache.cached_table_to_df(test_data, ['NAME'], cache_dir=self.cache_dir)
+        self.assertEqual(cache.evict(self.cache_dir, keep=1), 1)
+        self.assertEqual(cache.invalidate(test_data, self.cache_dir), 1)
+        self.assertListEqual(cache.cache_entries(self.cache_dir), [])
+
+if __name__ == '__main__':
+    unittest.main()
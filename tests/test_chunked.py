@@ -0,0 +1,79 @@
+import unittest as unittest
+from benchmarks.synthetic import synthetic_wdpa
+from unittest import mock
+from wdpa import chunked, profiling, qa, runner
+import numpy as np
+import os
+
+# run test in root
+# python -m unittest
+test_data = os.path.join(os.getcwd(), 'tests', 'data.gdb', 'test')
+
+wdpa_df = qa.arcgis_table_to_df(test_data, qa.INPUT_FIELDS_POLY)
+
+
+def chunks_of(df, chunk_rows):
+    return lambda: (df.iloc[start:start + chunk_rows] for start in range(0, len(df), chunk_rows))
+
+class TestChunked(unittest.TestCase):
+    def assertSameResult(self, result, expected):
+        self.assertListEqual(list(result), list(expected))
+        for name in expected:
+            self.assertTrue(result[name].equals(expected[name]), name)
+
+    def test_table_chunks(self):
+        chunks = list(qa.arcgis_table_chunks(test_data, qa.INPUT_FIELDS_POLY, 10))
+        self.assertListEqual([len(chunk_df) for chunk_df in chunks], [10, 10, 3])
+        self.assertListEqual(list(chunks[1].index), list(wdpa_df.index[10:20]))
+        self.assertTrue(chunks[2].equals(wdpa_df.iloc[20:]))
+
+    def test_same_result_as_full_run(self):
+        run_log = profiling.new_run_log('poly', test_data)
+        checks, result = chunked.load_and_run_chunked(test_data, qa.poly_checks, qa.INPUT_FIELDS_POLY, chunk_rows=5, run_log=run_log)
+        self.assertSameResult(result, runner.run_checks(wdpa_df, qa.poly_checks))
+        self.assertEqual(run_log['phases']['checks']['chunks'], 5)
+        self.assertEqual(run_log['checks']['ivd_status_yr']['rows'], len(wdpa_df))
+        self.assertIn('diagnostics', run_log['checks']['gis_area_gt_rep_area'])
+
+    def test_side_checks(self):
+        # without ivd_status_yr, which flags all rows, the rows of group and table checks are read again
+        checks = [check for check in qa.poly_checks if check['name'] != 'ivd_status_yr']
+        synthetic_df = synthetic_wdpa(5000, 'poly', 3)[0]
+        synthetic_df.iloc[4900, synthetic_df.columns.get_loc('WDPA_PID')] = synthetic_df['WDPA_PID'].iloc[3]
+        result, info = chunked.run_checks_chunked(chunks_of(synthetic_df, 1200), checks)
+        self.assertSameResult(result, runner.run_checks(synthetic_df, checks))
+        self.assertTrue(info['second_pass'])
+        self.assertEqual(info['chunks'], 5)
+        self.assertEqual(info['rows_kept'], len(set().union(*[df.index for df in result.values()])))
+        self.assertIn(synthetic_df.index[4900], result['duplicate_wdpa_pid'].index)
+
+    def test_area_checks(self):
+        # unless the area ratios are grouped, the area checks flag the rows against statistics accumulated over the chunks
+        checks = qa.select_checks(qa.poly_checks, ['area'])
+        synthetic_df = synthetic_wdpa(5000, 'poly', 3)[0]
+        run_log = profiling.new_run_log('poly', 'synthetic')
+        full_run_log = profiling.new_run_log('poly', 'synthetic')
+        result, info = chunked.run_checks_chunked(chunks_of(synthetic_df, 1200), checks, run_log)
+        self.assertSameResult(result, runner.run_checks(synthetic_df, checks, full_run_log))
+        self.assertIn('gis_area_gt_rep_area', result)
+        self.assertTrue(info['second_pass'])
+        self.assertEqual(len(chunked.streamed_area_checks(checks)), 4)
+        for name in ['gis_area_gt_rep_area', 'rep_m_area_gt_gis_m_area']:
+            diagnostics = run_log['checks'][name]['diagnostics']
+            for key, value in full_run_log['checks'][name]['diagnostics'].items():
+                self.assertAlmostEqual(diagnostics[key], value, msg=key)
+
+        with mock.patch.dict(os.environ, {qa.AREA_GROUPS_ENV_VARIABLE: 'ISO3'}):
+            checks = qa.select_checks(qa.poly_checks, ['area'])
+            self.assertListEqual(chunked.streamed_area_checks(checks), [])
+            result, info = chunked.run_checks_chunked(chunks_of(synthetic_df, 1200), checks)
+            self.assertSameResult(result, runner.run_checks(synthetic_df, checks))
+
+    def test_text_keys(self):
+        keys = chunked.text_keys(np.array(['A', np.nan, 'B', 'A'], dtype=object))
+        self.assertEqual(keys[0], keys[3])
+        self.assertNotEqual(keys[0], keys[2])
+        self.assertTrue(np.isnan(keys[1]))
+
+if __name__ == '__main__':
+    unittest.main()
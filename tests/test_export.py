@@ -0,0 +1,174 @@
+import unittest as unittest
+from wdpa import export, qa, runner
+from openpyxl import load_workbook
+import glob
+import json
+import pandas as pd
+import os
+import shutil
+import tempfile
+
+# run test in root
+# python -m unittest
+test_data = os.path.join(os.getcwd(), 'tests', 'data.gdb', 'test')
+
+wdpa_df = qa.arcgis_table_to_df(test_data, qa.INPUT_FIELDS_POLY)
+
+
+class TestExcelExport(unittest.TestCase):
+    def setUp(self):
+        self.output_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_path)
+
+    def test_layout(self):
+        result = runner.run_checks(wdpa_df, qa.poly_checks)
+        export.output_errors_to_excel(result, self.output_path, qa.poly_checks, 'poly')
+        wb = load_workbook(glob.glob(os.path.join(self.output_path, '*_WDPA_QA_checks_poly.xlsx'))[0])
+        self.assertListEqual(wb.sheetnames, ['Summary'] + [check['name'] for check in qa.poly_checks if check['name'] in result])
+
+        summary = wb['Summary']
+        self.assertEqual(summary.freeze_panes, 'A2')
+        self.assertEqual(summary.sheet_properties.tabColor.rgb, '00000000')
+        self.assertEqual(summary.column_dimensions['A'].width, 31)
+        self.assertListEqual([str(each.sqref) for each in summary.conditional_formatting], [f'A2:C{len(qa.poly_checks) + 1}'])
+        for row in summary.iter_rows(min_row=2):
+            name, outcome, count = [cell.value for cell in row]
+            if name in result:
+                self.assertEqual(count, len(result[name]))
+                self.assertEqual(row[0].hyperlink.target, f'#{name}!A1')
+                self.assertEqual(row[0].style, 'Hyperlink')
+            else:
+                self.assertEqual(outcome, 'Pass')
+                self.assertIsNone(row[0].hyperlink)
+
+        ws = wb['check_parent_iso3']
+        self.assertEqual(ws['A1'].value, 'To Summary')
+        self.assertEqual(ws['A1'].hyperlink.target, '#Summary!A1')
+        self.assertEqual(ws.freeze_panes, 'B2')
+        self.assertEqual(ws.sheet_properties.tabColor.rgb, '00' + export.ORANGE)
+        rows = list(ws.iter_rows(values_only=True))
+        self.assertListEqual(list(rows[0][1:]), list(result['check_parent_iso3'].columns))
+        self.assertEqual(len(rows) - 1, len(result['check_parent_iso3']))
+        self.assertTrue(all(row[0] is None for row in rows[1:]))
+
+    def test_continuation_sheets(self):
+        result = runner.run_checks(wdpa_df, qa.poly_checks)
+        export.output_errors_to_excel(result, self.output_path, qa.poly_checks, 'poly', max_rows=10, spill=False)
+        wb = load_workbook(glob.glob(os.path.join(self.output_path, '*.xlsx'))[0])
+        # ivd_status_yr flags the 23 rows of the test table
+        names = ['ivd_status_yr', 'ivd_status_yr (2)', 'ivd_status_yr (3)']
+        self.assertListEqual(wb.sheetnames[1:4], names)
+        self.assertListEqual([wb[name].max_row - 1 for name in names], [10, 10, 3])
+        self.assertEqual(wb['ivd_status_yr (3)']['A1'].hyperlink.target, '#Summary!A1')
+        self.assertListEqual([cell.value for cell in wb['ivd_status_yr (2)'][1][1:]], list(result['ivd_status_yr'].columns))
+        self.assertListEqual([wb[name]['B2'].value for name in names], list(result['ivd_status_yr'].iloc[[0, 10, 20], 0]))
+
+        summary = wb['Summary']
+        self.assertEqual(summary['D1'].value, export.CONTINUED_COLUMN)
+        row = next(row for row in summary.iter_rows(min_row=2) if row[0].value == 'ivd_status_yr')
+        self.assertListEqual([cell.hyperlink.target for cell in row if cell.hyperlink],
+                             ['#ivd_status_yr!A1', "#'ivd_status_yr (2)'!A1", "#'ivd_status_yr (3)'!A1"])
+
+    def test_spill(self):
+        result = runner.run_checks(wdpa_df, qa.poly_checks)
+        export.output_errors_to_excel(result, self.output_path, qa.poly_checks, 'poly', max_rows=10, spill=True)
+        wb = load_workbook(glob.glob(os.path.join(self.output_path, '*.xlsx'))[0])
+        self.assertNotIn('ivd_status_yr', wb.sheetnames)
+        spilled = export.spill_file(self.output_path, 'poly', 'ivd_status_yr')
+        spilled_df = pd.read_csv(spilled)
+        self.assertListEqual(list(spilled_df.columns), list(result['ivd_status_yr'].columns))
+        self.assertListEqual(list(spilled_df['WDPAID']), list(result['ivd_status_yr']['WDPAID']))
+        row = next(row for row in wb['Summary'].iter_rows(min_row=2) if row[0].value == 'ivd_status_yr')
+        self.assertEqual(row[0].hyperlink.target, os.path.basename(spilled))
+        self.assertEqual(row[2].value, 23)
+
+    def test_sheet_names(self):
+        self.assertListEqual(export.sheet_names('ivd_desig_type_international', 25, 10),
+                             ['ivd_desig_type_international', 'ivd_desig_type_internationa (2)', 'ivd_desig_type_internationa (3)'])
+        self.assertListEqual(export.sheet_names('ivd_iso3', 10, 10), ['ivd_iso3'])
+
+class TestExporters(unittest.TestCase):
+    def setUp(self):
+        self.output_path = tempfile.mkdtemp()
+        self.result = runner.run_checks(wdpa_df, qa.poly_checks)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_path)
+
+    def test_manifest(self):
+        path = export.export_results(self.result, self.output_path, qa.poly_checks, 'poly', ['csv', 'jsonl'])
+        with open(path) as f:
+            manifest = json.load(f)
+        self.assertListEqual(manifest['exports'], ['csv', 'jsonl'])
+        self.assertListEqual([each['name'] for each in manifest['checks']], [check['name'] for check in qa.poly_checks])
+        entries = {each['name']: each for each in manifest['checks']}
+        self.assertDictEqual(entries['duplicate_wdpa_pid'], {'name': 'duplicate_wdpa_pid', 'result': 'Pass', 'count': 0, 'files': {}})
+        self.assertEqual(entries['ivd_status_yr']['result'], 'Fail')
+        self.assertEqual(entries['check_parent_iso3']['result'], 'Check')
+        self.assertEqual(entries['check_parent_iso3']['count'], len(self.result['check_parent_iso3']))
+        # no workbook, and one file per format for each check that failed
+        self.assertListEqual(glob.glob(os.path.join(self.output_path, '*.xlsx')), [])
+        for name in self.result:
+            files = entries[name]['files']
+            self.assertListEqual(sorted(files), ['csv', 'jsonl'])
+            self.assertEqual(len(pd.read_csv(os.path.join(self.output_path, files['csv']))), len(self.result[name]))
+            jsonl_df = pd.read_json(os.path.join(self.output_path, files['jsonl']), lines=True)
+            self.assertListEqual(list(jsonl_df['WDPAID']), list(self.result[name]['WDPAID']))
+
+    @unittest.skipIf(export.parquet_engine() is None, 'requires pyarrow or fastparquet')
+    def test_parquet(self):
+        files = export.output_errors_to_parquet(self.result, self.output_path, qa.poly_checks, 'poly')
+        for name, path in files.items():
+            self.assertTrue(pd.read_parquet(path).equals(self.result[name].reset_index(drop=True)), name)
+
+    def test_error_matrix(self):
+        matrix = export.error_matrix(self.result, qa.poly_checks)
+        # ivd_status_yr flags each row of the test table, once in the matrix
+        self.assertEqual(len(matrix), len(wdpa_df))
+        self.assertListEqual(list(matrix.columns), list(wdpa_df.columns) + list(self.result))
+        for name, df in self.result.items():
+            self.assertListEqual(list(matrix.index[matrix[name] == True]), list(df.index))
+            self.assertEqual(matrix[name].isnull().sum(), len(wdpa_df) - len(df))
+
+        errors = export.error_list(self.result, qa.poly_checks)
+        self.assertListEqual(list(errors.columns), export.ID_FIELDS + ['CHECK'])
+        self.assertDictEqual(errors['CHECK'].value_counts().to_dict(), {name: len(df) for name, df in self.result.items()})
+
+    def test_matrix_layout(self):
+        path = export.export_results(self.result, self.output_path, qa.poly_checks, 'poly', ['excel', 'csv'], layout='matrix')
+        with open(path) as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest['layout'], 'matrix')
+        self.assertListEqual([each['name'] for each in manifest['tables']], ['error_matrix'])
+        matrix = pd.read_csv(os.path.join(self.output_path, manifest['tables'][0]['files']['csv']))
+        self.assertEqual(len(matrix), len(wdpa_df))
+
+        # the sheet of a check only holds the fields identifying the rows, and the fields it reads
+        wb = load_workbook(glob.glob(os.path.join(self.output_path, '*.xlsx'))[0])
+        self.assertListEqual(wb.sheetnames[-1:], ['error_matrix'])
+        self.assertListEqual([cell.value for cell in wb['check_iso3'][1]], ['To Summary', 'WDPAID', 'WDPA_PID', 'ISO3'])
+        summary = list(wb['Summary'].iter_rows(values_only=True))
+        self.assertListEqual(list(summary[-1][:3]), ['error_matrix', None, len(wdpa_df)])
+
+    def test_area_thresholds(self):
+        argument = ('GIS_AREA', ('ISO3',))
+        diagnostics = qa.area_ratio_diagnostics(wdpa_df, [argument])[argument]
+        run_log = {'checks': {'gis_area_gt_rep_area': {'diagnostics': diagnostics}, 'check_iso3': {}}}
+        path = export.export_results(self.result, self.output_path, qa.poly_checks, 'poly', ['csv'], run_log=run_log)
+        with open(path) as f:
+            manifest = json.load(f)
+        self.assertListEqual([each['name'] for each in manifest['tables']], ['area_thresholds'])
+        thresholds = pd.read_csv(os.path.join(self.output_path, manifest['tables'][0]['files']['csv']))
+        self.assertListEqual(list(thresholds.columns), ['CHECK', 'ISO3', 'ROWS', 'MEDIAN', 'MAD', 'THRESHOLD', 'FALLBACK'])
+        self.assertEqual(len(thresholds), wdpa_df['ISO3'].nunique())
+        self.assertNotIn('group_thresholds', export.format_diagnostics(diagnostics))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            export.export_results(self.result, self.output_path, qa.poly_checks, 'poly', ['xml'])
+        self.assertListEqual(os.listdir(self.output_path), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest as unittest
+from wdpa import gdb, qa
+import numpy as np
+import datetime
+import os
+import struct
+
+# run test in root
+# python -m unittest
+test_data = os.path.join(os.getcwd(), 'tests', 'data.gdb', 'test')
+
+
+class TestGdbTable(unittest.TestCase):
+    def test_split_table_path(self):
+        self.assertEqual(gdb.split_table_path(r'E:\WDPA\WDPA_Jun2019.gdb\WDPA_poly_Jun2019'),
+                         (os.sep.join(['E:', 'WDPA', 'WDPA_Jun2019.gdb']), 'WDPA_poly_Jun2019'))
+
+    def test_fields(self):
+        table = gdb.open_table(test_data)
+        field_types = {field.name: field.type for field in table.fields}
+        self.assertEqual(table.oid_field_name, 'OBJECTID')
+        self.assertEqual(field_types['WDPAID'], 'Double')
+        self.assertEqual(field_types['STATUS_YR'], 'Integer')
+        self.assertEqual(field_types['ISO3'], 'String')
+
+    def test_rows(self):
+        table = gdb.open_table(test_data)
+        rows = list(table.iter_rows(['OBJECTID', 'WDPA_PID', 'ISO3']))
+        self.assertEqual(len(rows), table.valid_rows)
+        self.assertEqual(rows[1], (2, 40463., 'UGA'))
+
+    def test_skipped_fields(self):
+        # reading a late field alone skips the fields before it, with the same values
+        table = gdb.open_table(test_data)
+        names = [field.name for field in table.fields]
+        all_rows = list(table.iter_rows(names))
+        last_rows = list(table.iter_rows([names[-1], 'ISO3']))
+        self.assertListEqual(last_rows, [(row[-1], row[names.index('ISO3')]) for row in all_rows])
+
+    def test_fixed_values(self):
+        self.assertEqual(gdb.fixed_value(14, (1.,)), gdb.DATE_ORIGIN.date() + datetime.timedelta(days=1))
+        self.assertEqual(gdb.fixed_value(15, (0.5,)), datetime.time(12))
+        self.assertEqual(gdb.fixed_value(16, (1., 60)).utcoffset(), datetime.timedelta(hours=1))
+
+    def test_big_integer(self):
+        # 64-bit integers are read as int64, without going through float64
+        fields = [gdb.GdbField('BIG_ID', 'BIG_ID', 13, True)]
+        value = 2**60 + 1
+        row = bytes([0]) + struct.pack('<q', value)
+        values = [gdb.GdbTable._read_row(row, 0, 1, fields, 1, [True])[0],
+                  gdb.GdbTable._read_row(bytes([1]), 0, 2, fields, 1, [True])[0]]
+        self.assertListEqual(values, [value, None])
+
+        column = qa.values_to_column(values[:1], fields[0].type)
+        self.assertEqual(column.dtype, np.int64)
+        self.assertEqual(column[0], value)
+        self.assertEqual(qa.values_to_column(values, fields[0].type).dtype, np.float64)
+
+    def test_missing_table(self):
+        with self.assertRaises(ValueError):
+            gdb.open_table(os.path.join(os.getcwd(), 'tests', 'data.gdb', 'missing'))
+
+class TestGdbTableToDf(unittest.TestCase):
+    def test_dataframe(self):
+        wdpa_df = qa.gdb_table_to_df(test_data, qa.INPUT_FIELDS_POLY)
+        self.assertListEqual(list(wdpa_df.columns), qa.INPUT_FIELDS_POLY)
+        self.assertEqual(wdpa_df.index.name, 'OBJECTID')
+        self.assertEqual(wdpa_df['STATUS_YR'].dtype, np.int64)
+        self.assertTrue(np.isnan(wdpa_df.loc[1, 'NAME'])) # '' is read as np.nan
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest as unittest
+from wdpa import incremental, qa, runner
+import numpy as np
+import pandas as pd
+import os
+import shutil
+import tempfile
+
+# run test in root
+# python -m unittest
+test_data = os.path.join(os.getcwd(), 'tests', 'data.gdb', 'test')
+
+wdpa_df = qa.arcgis_table_to_df(test_data, qa.INPUT_FIELDS_POLY)
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        self.state = incremental.qa_state(wdpa_df, qa.poly_checks, runner.run_checks(wdpa_df, qa.poly_checks))
+
+        # next release: one row changed, one row removed, and one row added to an existing WDPAID
+        next_df = wdpa_df.drop(wdpa_df.index[3])
+        next_df.loc[next_df.index[1], 'ISO3'] = 'XXX'
+        added = next_df.iloc[[5]].copy()
+        added['WDPA_PID'] = added['WDPA_PID'] + 0.5
+        added['NAME'] = 'Another name'
+        added.index = [next_df.index.max() + 1]
+        self.next_df = pd.concat([next_df, added])
+
+    def assertSameResult(self, result, expected):
+        self.assertListEqual(list(result), list(expected))
+        for name in expected:
+            self.assertTrue(result[name].equals(expected[name]), name)
+
+    def test_changed_rows(self):
+        current_changed, previous_changed = incremental.changed_rows(self.next_df, self.state)
+        self.assertListEqual(list(np.flatnonzero(current_changed)), [1, len(self.next_df) - 1])
+        self.assertListEqual(list(np.flatnonzero(previous_changed)), [1, 3])
+
+    def test_same_result_as_full_run(self):
+        self.assertSameResult(incremental.run_incremental(self.next_df, qa.poly_checks, self.state),
+                              runner.run_checks(self.next_df, qa.poly_checks))
+
+    def test_saved_state(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'state.npz')
+            incremental.save_state(self.state, path)
+            state = incremental.load_state(path)
+            self.assertListEqual(list(state['checks']), list(self.state['checks']))
+            self.assertSameResult(incremental.run_incremental(self.next_df, qa.poly_checks, state),
+                                  runner.run_checks(self.next_df, qa.poly_checks))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_text_state(self):
+        # text WDPA_PIDs and groups are saved as strings, loaded without pickle
+        text_df = wdpa_df.copy()
+        text_df['WDPA_PID'] = text_df['WDPA_PID'].astype(int).astype(str).astype(object)
+        text_df['WDPAID'] = text_df['WDPAID'].astype(int).astype(str).astype(object)
+        text_df.loc[text_df.index[2], 'WDPAID'] = np.nan
+        state = incremental.qa_state(text_df, qa.poly_checks, runner.run_checks(text_df, qa.poly_checks))
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'state.npz')
+            incremental.save_state(state, path)
+            loaded = incremental.load_state(path)
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertListEqual(list(loaded['wdpa_pid']), list(text_df['WDPA_PID']))
+        self.assertTrue(pd.isnull(loaded['groups']['WDPAID'][2]))
+        self.assertListEqual(list(loaded['groups']['WDPAID'][3:]), list(text_df['WDPAID'][3:]))
+
+    def test_changed_definition(self):
+        # a check defined differently in the state is run on all rows
+        checks = [dict(check, fields=check['fields'] + ['NAME']) if check['name'] == 'ivd_status_yr' else check
+                  for check in qa.poly_checks]
+        self.state['checks']['ivd_status_yr']['wdpa_pid'] = np.array([], dtype=float)
+        self.state['checks']['check_iso3']['wdpa_pid'] = np.array([], dtype=float)
+        expected = runner.run_checks(self.next_df, checks)
+        result = incremental.run_incremental(self.next_df, checks, self.state)
+        self.assertTrue(result['ivd_status_yr'].equals(expected['ivd_status_yr']))
+        # the result of unchanged checks is still taken from the state
+        self.assertLess(len(result.get('check_iso3', [])), len(expected['check_iso3']))
+
+if __name__ == '__main__':
+    unittest.main()
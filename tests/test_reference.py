@@ -0,0 +1,44 @@
+import unittest as unittest
+from wdpa import reference
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# run test in root
+# python -m unittest
+
+
+class TestIso3Reference(unittest.TestCase):
+    def test_bundled_codes(self):
+        codes = reference.iso3_codes()
+        self.assertIn('UGA', codes)
+        self.assertIn('ABNJ', codes)
+        self.assertNotIn('XXX', codes)
+        self.assertTrue(reference.iso3_version().isdigit())
+
+    def test_refresh(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            csv_path = os.path.join(tmp_dir, 'all.csv')
+            output = os.path.join(tmp_dir, 'iso3.csv')
+            with open(csv_path, 'w', encoding='utf-8') as f:
+                f.write('name,alpha-2,alpha-3\nUganda,UG,UGA\nNetherlands,NL,NLD\n')
+            self.assertEqual(reference.refresh_iso3(csv_path, output=output), '1')
+            self.assertEqual(reference.refresh_iso3(csv_path, output=output), '2')
+            version, rows = reference.read_iso3_file(output)
+            self.assertEqual(version, '2')
+            self.assertListEqual([row['alpha-3'] for row in rows], ['NLD', 'UGA', 'ABNJ'])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+class TestLazyImport(unittest.TestCase):
+    def test_import_qa(self):
+        # importing wdpa.qa neither imports arcpy nor reads the reference data
+        code = 'import sys, wdpa.qa; print("arcpy" in sys.modules, wdpa.reference._iso3 is None)'
+        output = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+        self.assertEqual(output.split(), ['False', 'True'])
+
+if __name__ == '__main__':
+    unittest.main()
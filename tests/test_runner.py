@@ -0,0 +1,178 @@
+import unittest as unittest
+from wdpa import cache, export, profiling, qa, runner
+from openpyxl import load_workbook
+from unittest import mock
+import glob
+import json
+import numpy as np
+import os
+import pandas as pd
+import shutil
+import tempfile
+import tracemalloc
+
+# run test in root
+# python -m unittest
+test_data = os.path.join(os.getcwd(), 'tests', 'data.gdb', 'test')
+
+wdpa_df = qa.arcgis_table_to_df(test_data, qa.INPUT_FIELDS_POLY)
+
+
+class TestRegistry(unittest.TestCase):
+    def test_select_iso3(self):
+        checks = qa.select_checks(qa.poly_checks, ['ISO3'])
+        self.assertListEqual([check['name'] for check in checks], ['ivd_dif_iso3_same_id', 'check_iso3'])
+        self.assertListEqual(qa.required_fields(checks, qa.INPUT_FIELDS_POLY), ['WDPAID', 'WDPA_PID', 'ISO3'])
+
+    def test_select_unknown(self):
+        with self.assertRaises(ValueError):
+            qa.select_checks(qa.poly_checks, ['not_a_check'])
+
+    def test_select_area_groups(self):
+        # the fields the area ratios are grouped by are resolved, and checked, when the checks are selected
+        with mock.patch.dict(os.environ, {qa.AREA_GROUPS_ENV_VARIABLE: 'ISO3'}):
+            checks = qa.select_checks(qa.poly_checks, ['gis_area_gt_rep_area'])
+            self.assertListEqual(qa.required_fields(checks, qa.INPUT_FIELDS_POLY), ['WDPA_PID', 'REP_AREA', 'GIS_AREA', 'ISO3'])
+        with mock.patch.dict(os.environ, {qa.AREA_GROUPS_ENV_VARIABLE: 'bogus'}):
+            with self.assertRaises(ValueError):
+                runner.load_and_run(test_data, qa.poly_checks, qa.INPUT_FIELDS_POLY, ['area'])
+
+    def test_severity(self):
+        severities = {check['name']: check['severity'] for check in qa.poly_checks}
+        self.assertEqual(severities['ivd_pa_def'], 'Fail')
+        self.assertEqual(severities['dif_name_same_id'], 'Check')
+
+    def test_declared_fields(self):
+        # each check must run on the fields it declares, with the same result as on the full table
+        for check in qa.poly_checks:
+            projected_df = wdpa_df[qa.with_extra_fields(check)['fields']].copy()
+            self.assertListEqual(list(check['func'](projected_df, True)),
+                                 list(check['func'](wdpa_df.copy(), True)), check['name'])
+
+class TestRunner(unittest.TestCase):
+    def test_load_and_run(self):
+        checks, result = runner.load_and_run(test_data, qa.poly_checks, qa.INPUT_FIELDS_POLY, ['check_parent_iso3'])
+        self.assertListEqual(list(result['check_parent_iso3']['WDPA_PID']), [40597., 64669., 40642.])
+        self.assertListEqual(list(result['check_parent_iso3'].columns), ['WDPA_PID', 'PARENT_ISO3'])
+
+    def test_masks_match_wdpa_pid(self):
+        # the rows selected from masks must be those find_wdpa_rows selects from WDPA_PIDs,
+        # also when WDPA_PID holds duplicates
+        duplicated_df = pd.concat([wdpa_df, wdpa_df.iloc[:2]])
+        for df in [wdpa_df, duplicated_df]:
+            result = runner.run_checks(df, qa.poly_checks)
+            for check in qa.poly_checks:
+                wdpa_pid = check['func'](df, True)
+                if wdpa_pid.size > 0:
+                    self.assertTrue(result[check['name']].equals(qa.find_wdpa_rows(df, wdpa_pid)), check['name'])
+                else:
+                    self.assertNotIn(check['name'], result)
+
+    def test_parallel(self):
+        expected = runner.run_checks(wdpa_df, qa.poly_checks)
+        for pool in ['thread', 'process']:
+            result = runner.run_checks_parallel(wdpa_df, qa.poly_checks, workers=2, pool=pool)
+            self.assertListEqual(list(result), list(expected))
+            for name in expected:
+                self.assertTrue(result[name].equals(expected[name]), name)
+
+    def test_worker_frame(self):
+        # a worker process reads, and decodes, only the columns its tasks read
+        shared_dir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(shared_dir, 'table')
+            cache.write_cached_df(wdpa_df, source, {})
+            frame = runner.worker_frame(source, ['WDPA_PID', 'ISO3'])
+            self.assertTrue(frame.equals(wdpa_df[['WDPA_PID', 'ISO3']]))
+            self.assertListEqual(sorted(runner._worker_columns[source][1]), ['ISO3', 'WDPA_PID'])
+            self.assertTrue(runner.worker_frame(source, ['NAME', 'ISO3']).equals(wdpa_df[['NAME', 'ISO3']]))
+            self.assertListEqual(sorted(runner._worker_columns[source][1]), ['ISO3', 'NAME', 'WDPA_PID'])
+        finally:
+            runner._worker_columns.clear()
+            shutil.rmtree(shared_dir)
+
+class TestRunLog(unittest.TestCase):
+    def setUp(self):
+        self.output_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_path)
+
+    def test_run_log(self):
+        run_log = profiling.new_run_log('poly', test_data)
+        checks, result = runner.load_and_run(test_data, qa.poly_checks, qa.INPUT_FIELDS_POLY, run_log=run_log)
+        self.assertListEqual(sorted(run_log['phases']), ['checks', 'load'])
+        self.assertEqual(run_log['phases']['load']['rows'], len(wdpa_df))
+        # checks are logged in the order of their tasks (see runner.check_tasks)
+        self.assertCountEqual(list(run_log['checks']), [check['name'] for check in checks])
+        for check in checks:
+            stats = run_log['checks'][check['name']]
+            self.assertEqual(stats['rows'], len(result.get(check['name'], [])), check['name'])
+            self.assertGreaterEqual(stats['seconds'], 0)
+        self.assertEqual(run_log['checks']['ivd_pa_def']['checks_timed_together'], 20)
+        self.assertEqual(run_log['checks']['gis_area_gt_rep_area']['checks_timed_together'], 4)
+        self.assertEqual(run_log['checks']['gis_area_gt_rep_area']['diagnostics']['rows_in_stats'], len(wdpa_df))
+        self.assertNotIn('diagnostics', run_log['checks']['ivd_pa_def'])
+
+        export.output_errors_to_excel(result, self.output_path, checks, 'poly', run_log)
+        summary = load_workbook(glob.glob(os.path.join(self.output_path, '*.xlsx'))[0])['Summary']
+        rows = list(summary.iter_rows(values_only=True))
+        self.assertListEqual(list(rows[0]), ['CHECK', 'RESULT', 'COUNT'] + export.RUN_LOG_COLUMNS)
+        self.assertEqual(rows[-2][0], '(load)')
+        self.assertEqual(rows[-2][2], len(wdpa_df))
+        diagnostics = {row[0]: row[len(export.RUN_LOG_COLUMNS) + 2] for row in rows[1:]}
+        self.assertTrue(diagnostics['rep_area_gt_gis_area'].startswith('mean '))
+        self.assertIsNone(diagnostics['ivd_pa_def'])
+
+        profiling.write_run_log(run_log, profiling.run_log_file(self.output_path, 'poly'))
+        run_log_files = glob.glob(os.path.join(self.output_path, '*_WDPA_QA_run_log_poly.json'))
+        self.assertEqual(len(run_log_files), 1)
+        # the statistics of the marine areas, all null in the test data, are NaN: written as null
+        with open(run_log_files[0]) as f:
+            written = json.load(f, parse_constant=lambda constant: self.fail(constant))
+        self.assertIsNone(written['checks']['gis_m_area_gt_rep_m_area']['diagnostics']['mean'])
+
+    def test_step_peak_memory(self):
+        # each step reports its own peak, and a step includes the peak of the steps it runs
+        def allocate(n_mb):
+            return np.ones(n_mb * 1024**2 // 8).sum()
+
+        def outer():
+            allocate(8)
+            return profiling.measure_step(allocate, 2, trace_memory=True)[1]
+
+        inner_stats, stats = profiling.measure_step(outer, trace_memory=True)
+        self.assertGreater(stats['peak_mb'], 7.5)
+        self.assertGreater(inner_stats['peak_mb'], 1.5)
+        self.assertLess(inner_stats['peak_mb'], 4)
+
+    def test_step_untraced(self):
+        # steps are traced only if asked for; otherwise peak_mb is the peak memory of the process
+        with mock.patch.dict(os.environ, {profiling.TRACE_ENV_VARIABLE: ''}):
+            traced, stats = profiling.measure_step(tracemalloc.is_tracing)
+        self.assertFalse(traced)
+        self.assertGreater(stats['peak_mb'], 0)
+        self.assertLessEqual(stats['peak_mb'], profiling.peak_memory_mb())
+        with mock.patch.dict(os.environ, {profiling.TRACE_ENV_VARIABLE: '1'}):
+            self.assertTrue(profiling.measure_step(tracemalloc.is_tracing)[0])
+
+        # threads share the peak of the process: their checks have no peak of their own
+        run_log = profiling.new_run_log('poly', test_data)
+        runner.load_and_run(test_data, qa.poly_checks, qa.INPUT_FIELDS_POLY, ['ISO3'], 2, 'thread', run_log)
+        self.assertTrue(run_log['checks'])
+        for stats in run_log['checks'].values():
+            self.assertIsNone(stats['peak_mb'])
+        self.assertIsNotNone(run_log['phases']['checks']['peak_mb'])
+
+    def test_diagnostics_from_batch(self):
+        # the diagnostics of the area checks are built from the statistics of their batch, not computed again
+        for workers in [1, 2]:
+            run_log = profiling.new_run_log('poly', test_data)
+            with mock.patch.object(qa, 'area_ratio_stats', wraps=qa.area_ratio_stats) as area_ratio_stats:
+                runner.load_and_run(test_data, qa.poly_checks, qa.INPUT_FIELDS_POLY, ['area'], workers, 'thread', run_log)
+            self.assertEqual(area_ratio_stats.call_count, 1)
+            self.assertEqual(run_log['checks']['rep_area_gt_gis_area']['diagnostics'],
+                             qa.area_ratio_diagnostics(wdpa_df, ['REP_AREA'])['REP_AREA'])
+
+if __name__ == '__main__':
+    unittest.main()
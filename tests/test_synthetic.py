@@ -0,0 +1,34 @@
+import unittest as unittest
+from benchmarks import synthetic
+from wdpa import qa, runner
+import os
+
+# run test in root
+# python -m unittest
+test_data = os.path.join(os.getcwd(), 'tests', 'data.gdb', 'test')
+
+wdpa_df = qa.arcgis_table_to_df(test_data, qa.INPUT_FIELDS_POLY)
+
+
+class TestSynthetic(unittest.TestCase):
+    def setUp(self):
+        self.poly_df, self.point_df, self.source_df, self.poly_expected, self.point_expected = synthetic.synthetic_tables(20000, 3)
+
+    def test_schema(self):
+        self.assertListEqual(list(self.poly_df.columns), qa.INPUT_FIELDS_POLY)
+        self.assertListEqual(list(self.point_df.columns), qa.INPUT_FIELDS_PT)
+        self.assertListEqual(list(self.source_df.columns), qa.INPUT_FIELDS_META)
+        self.assertDictEqual(self.poly_df.dtypes.to_dict(), wdpa_df.dtypes.to_dict())
+        self.assertTrue(self.poly_df['METADATAID'].isin(self.source_df['METADATAID']).all())
+
+    def test_injected_errors(self):
+        for wdpa_df, checks, expected in [(self.poly_df, qa.poly_checks, self.poly_expected),
+                                          (self.point_df, qa.pt_checks, self.point_expected)]:
+            self.assertSetEqual(set(expected), {check['name'] for check in checks})
+            self.assertDictEqual(synthetic.count_differences(runner.run_checks(wdpa_df, checks), expected), {})
+            self.assertEqual(expected['ivd_pa_def'], 3)
+            self.assertEqual(expected['dif_name_same_id'], 6)
+
+    def test_same_seed(self):
+        wdpa_df, expected = synthetic.synthetic_wdpa(20000, 'poly', 3)
+        self.assertTrue(wdpa_df.equals(self.poly_df))
@@ -0,0 +1,310 @@
+###################################################################################
+#### RAMBO: a Quality Assurance Tool for the World Database on Protected Areas ####
+#### Python script to cache converted WDPA tables on disk                     ####
+###################################################################################
+
+'''
+This Python script keeps the DataFrames produced by arcgis_table_to_df on disk,
+so that running poly.py, point.py and integrity.py again on the same release
+does not convert the feature class attribute table again.
+
+Each cached table is a directory holding one NumPy (.npy) file per column.
+Numeric columns are memory-mapped when read back; text columns are stored as
+integer codes plus their distinct values, and rebuilt with a single take. No
+file holds Python objects, so that the cache is read without pickle, which
+could run code written to a shared cache directory.
+
+The cache key combines the table path, the list of fields and the state of the
+geodatabase: its 'timestamps' file and the size and modification time of its files.
+Editing the geodatabase therefore gives a new key, and old entries can be removed
+with invalidate or evict.
+
+The cache is used when a directory is given, or set in the WDPA_QA_CACHE environment variable.
+'''
+
+#######################
+#### Load packages ####
+#######################
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from wdpa import gdb, qa
+
+CACHE_ENV_VARIABLE = 'WDPA_QA_CACHE'
+INDEX_FILE = '__index__.npy'
+META_FILE = 'meta.json'
+
+# Part of the cache key: entries written in an earlier format are not read
+CACHE_FORMAT = 2
+
+#################################
+#### 1. Cache key of a table ####
+#################################
+
+def gdb_state(in_fc):
+    '''
+    Return a string describing the state of the geodatabase holding in_fc:
+    the content of its 'timestamps' file and the size and modification time of each file.
+    Return '' if in_fc is not inside a File Geodatabase directory.
+    '''
+
+    try:
+        gdb_path = gdb.split_table_path(in_fc)[0]
+    except ValueError:
+        return ''
+
+    if not os.path.isdir(gdb_path):
+        return ''
+
+    state = []
+    for name in sorted(os.listdir(gdb_path)):
+        if name.endswith('.lock'): # locks change whenever the geodatabase is opened
+            continue
+        stat = os.stat(os.path.join(gdb_path, name))
+        state.append(f'{name}:{stat.st_size}:{stat.st_mtime_ns}')
+
+    timestamps = os.path.join(gdb_path, 'timestamps')
+    if os.path.isfile(timestamps):
+        with open(timestamps, 'rb') as f:
+            state.append(hashlib.sha1(f.read()).hexdigest())
+
+    return '|'.join(state)
+
+def cache_key(in_fc, input_fields, query=''):
+    '''
+    Return the cache key of a table: a hash of the cache format, its path, the
+    fields, the query and the state of its geodatabase
+    '''
+
+    content = json.dumps([CACHE_FORMAT, os.path.abspath(in_fc), list(input_fields), query, gdb_state(in_fc)])
+
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def cache_directory(cache_dir=None):
+    '''
+    Return the cache directory: cache_dir if given, else the directory
+    set in the WDPA_QA_CACHE environment variable, else None (no caching)
+    '''
+
+    return cache_dir or os.environ.get(CACHE_ENV_VARIABLE) or None
+
+#########################################
+#### 2. Write and read cached tables ####
+#########################################
+
+def plain_uniques(uniques, field):
+    '''
+    Return the distinct values of a coded column as an array holding no Python
+    objects: fixed-width strings, or datetimes for date fields. They are turned
+    back into the same values by astype(object).
+    '''
+
+    uniques = np.asarray(uniques, dtype=object)
+    if all(isinstance(value, str) for value in uniques):
+        return uniques.astype(str)
+
+    try:
+        plain = np.array(uniques.tolist(), dtype='datetime64') # days for dates, microseconds for datetimes
+    except (TypeError, ValueError):
+        plain = None
+    if plain is None or plain.astype(object).tolist() != uniques.tolist():
+        raise ValueError(f'ERROR: {field} holds values that are neither text, dates nor numbers, and cannot be cached')
+
+    return plain
+
+def write_cached_df(wdpa_df, entry_dir, meta):
+    '''
+    Write a DataFrame to entry_dir, with one .npy file per column.
+    The directory is written under a temporary name and renamed when complete.
+    Raises ValueError for a column whose values cannot be stored without pickle.
+    '''
+
+    parent = os.path.dirname(entry_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp_')
+
+    try:
+        np.save(os.path.join(tmp_dir, INDEX_FILE), wdpa_df.index.values)
+        columns = []
+        for i, field in enumerate(wdpa_df.columns):
+            values = wdpa_df[field].values
+            if values.dtype.kind in 'biuf':
+                np.save(os.path.join(tmp_dir, f'{i}.npy'), values)
+                columns.append({'name': field, 'kind': 'numeric'})
+            else:
+                # store text as codes and distinct values; nulls get code -1
+                codes, uniques = pd.factorize(values)
+                np.save(os.path.join(tmp_dir, f'{i}.npy'), codes.astype(np.int32))
+                np.save(os.path.join(tmp_dir, f'{i}.uniques.npy'), plain_uniques(uniques, field))
+                columns.append({'name': field, 'kind': 'coded'})
+
+        meta = dict(meta, format=CACHE_FORMAT, columns=columns, index_name=wdpa_df.index.name, created=time.time())
+        with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+        if os.path.isdir(entry_dir): # written meanwhile by another process
+            shutil.rmtree(tmp_dir)
+        else:
+            os.rename(tmp_dir, entry_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+def read_cached_columns(entry_dir, fields=None):
+    '''
+    Read the index and a dictionary of the columns of a DataFrame written by
+    write_cached_df, or only of the given fields, in the order they were written.
+    Numeric columns are memory-mapped; text columns are decoded from their codes.
+    '''
+
+    with open(os.path.join(entry_dir, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get('format') != CACHE_FORMAT:
+        raise ValueError(f'ERROR: {entry_dir} is a cached table of format {meta.get("format")}, expected {CACHE_FORMAT}')
+
+    index = pd.Index(np.load(os.path.join(entry_dir, INDEX_FILE), allow_pickle=False), name=meta['index_name'])
+    columns = dict()
+    for i, column in enumerate(meta['columns']):
+        if fields is not None and column['name'] not in fields:
+            continue
+        values = np.load(os.path.join(entry_dir, f'{i}.npy'), mmap_mode='r', allow_pickle=False)
+        if column['kind'] == 'coded':
+            uniques = np.load(os.path.join(entry_dir, f'{i}.uniques.npy'), allow_pickle=False)
+            # append np.nan so that code -1 (null) takes the last position
+            values = np.append(uniques.astype(object), np.nan).take(values)
+        columns[column['name']] = values
+
+    os.utime(os.path.join(entry_dir, META_FILE)) # record last use, for evict
+
+    return index, columns
+
+def read_cached_df(entry_dir, fields=None):
+    '''
+    Read a DataFrame written by write_cached_df, or only the given fields of it
+    (see read_cached_columns). Numeric columns are memory-mapped.
+    '''
+
+    index, columns = read_cached_columns(entry_dir, fields)
+
+    return pd.DataFrame(columns, index=index, columns=list(columns), copy=False)
+
+###########################################
+#### 3. Load a table through the cache ####
+###########################################
+
+def cached_table_to_df(in_fc, input_fields, query='', cache_dir=None, loader=None):
+    '''
+    Return the DataFrame of arcgis_table_to_df(in_fc, input_fields, query),
+    read from the cache if the geodatabase has not changed since it was cached,
+    or converted and added to the cache otherwise.
+    Without a cache directory, the table is converted as usual.
+
+    ## Arguments ##
+    in_fc --        feature class attribute table - inside geodatabase - to import
+    input_fields -- list of all fields that must be imported from the dataset
+    query --        optional where_clause, passed on to the loader
+    cache_dir --    cache directory; defaults to the WDPA_QA_CACHE environment variable
+    loader --       function converting the table; defaults to qa.arcgis_table_to_df
+
+    ## Example ##
+    cached_table_to_df(in_fc='WDPA_Jun2019_Public.gdb/WDPA_poly_Jun2019',
+                       input_fields=INPUT_FIELDS_POLY,
+                       cache_dir='D:/wdpa_cache')
+    '''
+
+    loader = loader or qa.arcgis_table_to_df
+    cache_dir = cache_directory(cache_dir)
+    if cache_dir is None:
+        return loader(in_fc, input_fields, query)
+
+    entry_dir = os.path.join(cache_dir, cache_key(in_fc, input_fields, query))
+    if os.path.isfile(os.path.join(entry_dir, META_FILE)):
+        return read_cached_df(entry_dir)
+
+    wdpa_df = loader(in_fc, input_fields, query)
+    try:
+        write_cached_df(wdpa_df, entry_dir, {'table': os.path.abspath(in_fc),
+                                             'fields': list(input_fields),
+                                             'query': query})
+    except ValueError as error:
+        qa.add_message(f'{error}; the table is not cached')
+
+    return wdpa_df
+
+#########################################
+#### 4. Invalidate and evict entries ####
+#########################################
+
+def cache_entries(cache_dir=None):
+    '''
+    Return a list of dictionaries describing the cached tables:
+    their directory, table path, fields, creation and last use time
+    '''
+
+    cache_dir = cache_directory(cache_dir)
+    if cache_dir is None or not os.path.isdir(cache_dir):
+        return []
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        meta_file = os.path.join(cache_dir, name, META_FILE)
+        if name.startswith('.') or not os.path.isfile(meta_file):
+            continue
+        with open(meta_file) as f:
+            meta = json.load(f)
+        entries.append({'path': os.path.join(cache_dir, name),
+                        'table': meta['table'],
+                        'fields': meta['fields'],
+                        'created': meta['created'],
+                        'last_used': os.path.getmtime(meta_file)})
+
+    return sorted(entries, key=lambda entry: entry['last_used'], reverse=True)
+
+def invalidate(in_fc=None, cache_dir=None):
+    '''
+    Remove the cached tables of in_fc, or all cached tables if in_fc is None.
+    Return the number of entries removed.
+    '''
+
+    removed = 0
+    for entry in cache_entries(cache_dir):
+        if in_fc is None or entry['table'] == os.path.abspath(in_fc):
+            shutil.rmtree(entry['path'], ignore_errors=True)
+            removed += 1
+
+    return removed
+
+def evict(cache_dir=None, keep=None, max_age_days=None):
+    '''
+    Remove old cached tables, e.g. of previous releases.
+    Return the number of entries removed.
+
+    ## Arguments ##
+    cache_dir --    cache directory; defaults to the WDPA_QA_CACHE environment variable
+    keep --         number of most recently used entries to keep
+    max_age_days -- remove entries not used for more than this number of days
+
+    ## Example ##
+    evict(cache_dir='D:/wdpa_cache', keep=6)
+    '''
+
+    removed = 0
+    now = time.time()
+    for rank, entry in enumerate(cache_entries(cache_dir)):
+        too_many = keep is not None and rank >= keep
+        too_old = max_age_days is not None and now - entry['last_used'] > max_age_days * 86400
+        if too_many or too_old:
+            shutil.rmtree(entry['path'], ignore_errors=True)
+            removed += 1
+
+    return removed
+
+#######################
+#### END OF SCRIPT ####
+#######################
@@ -0,0 +1,408 @@
+###################################################################################
+#### RAMBO: a Quality Assurance Tool for the World Database on Protected Areas ####
+#### Python script to run the QA checks on a table read in chunks             ####
+###################################################################################
+
+'''
+This Python script runs the QA checks on a WDPA table read in chunks of rows
+(in OBJECTID order), rather than loaded at once, so that its memory use is
+bounded by the size of a chunk on machines that cannot hold the whole table
+and the temporaries of the checks. It returns the same result as a full run.
+
+The table is read once, and each chunk is:
+- checked by the 'row' checks, keeping only the rows that failed any of them;
+- reduced to the fields read by the 'group' and 'table' checks, and by checks
+  declaring diagnostics, in a compact side table: numbers as they are, and text
+  as 64-bit hashes (as floats, NaN where null), as these checks only compare
+  values for equality. Text read by 'table' checks (e.g. the fields grouping
+  the area ratios) is kept, each distinct value once, in a Categorical.
+
+The 'group' and 'table' checks are then run on the side table. The rows they
+flag that no 'row' check flagged are read in a second pass over the table, if
+there are any. The 'too large' area checks, unless their area ratios are grouped
+(WDPA_QA_AREA_GROUPS), do not need the side table: the statistics of the area
+ratios are accumulated over the chunks (see qa.area_ratio_accumulator), and the
+rows are flagged against them in the second pass. The peak memory is set with
+the WDPA_QA_MEMORY_MB environment variable (see chunk_rows_for_memory), and
+recorded in the run log.
+
+The QA state of an incremental run (see wdpa/incremental.py) is not saved, as
+it holds hashes of whole rows.
+'''
+
+#######################
+#### Load packages ####
+#######################
+
+import os
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype, union_categoricals
+from wdpa.qa import (add_message, accumulate_area_ratios, arcgis_table_chunks, area_group_fields, area_ratio_accumulator, 
+                     area_ratio_stats_by_argument, area_ratio_thresholds, area_too_large_chunk_masks, required_fields, select_checks)
+from wdpa.profiling import log_diagnostics, log_phase, log_rows, log_task, measure_step
+from wdpa.runner import check_positions, check_tasks, pid_positions
+
+MEMORY_ENV_VARIABLE = 'WDPA_QA_MEMORY_MB'
+
+# A chunk and the temporaries of the checks run on it take about this many times the memory of the chunk
+CHUNK_MEMORY_FACTOR = 4
+
+# Rows read to estimate the memory of a row, and the smallest chunk
+SAMPLE_ROWS = 1000
+MIN_CHUNK_ROWS = 1000
+
+# Statistics of the area ratios given as diagnostics of the 'too large' area checks, as by qa.area_ratio_diagnostics
+AREA_DIAGNOSTICS = ['mean', 'std', 'max_relative_size', 'rows_in_stats', 'outliers', 'zero_compared_area', 'undefined']
+
+############################
+#### 1. Size of a chunk ####
+############################
+
+def default_memory_mb():
+    '''
+    Return the peak memory (MB) set in the WDPA_QA_MEMORY_MB environment variable,
+    or None (the table is loaded at once) if it is not set
+    '''
+
+    value = os.environ.get(MEMORY_ENV_VARIABLE)
+    return float(value) if value else None
+
+def chunk_rows_for_memory(in_fc, fields, memory_mb):
+    '''
+    Return the number of rows of the chunks of in_fc that, with the temporaries
+    of the checks (see CHUNK_MEMORY_FACTOR), take memory_mb MB, from the memory
+    of its first SAMPLE_ROWS rows. The side table and the rows with errors take
+    memory on top of it.
+
+    ## Arguments ##
+    in_fc --     feature class attribute table - inside geodatabase - to check
+    fields --    list of the fields to load
+    memory_mb -- memory allowed for a chunk and the temporaries of the checks
+    '''
+
+    chunks = arcgis_table_chunks(in_fc, fields, SAMPLE_ROWS)
+    try:
+        sample_df = next(chunks, None)
+    finally:
+        chunks.close()
+
+    if sample_df is None or len(sample_df) == 0:
+        return MIN_CHUNK_ROWS
+    row_bytes = sample_df.memory_usage(deep=True).sum() / len(sample_df)
+
+    return max(MIN_CHUNK_ROWS, int(memory_mb * 1024**2 / (CHUNK_MEMORY_FACTOR * row_bytes)))
+
+###############################
+#### 2. Compact side table ####
+###############################
+
+def side_fields(checks):
+    '''
+    Return the fields read by the checks, WDPA_PID first, in the order of the checks
+    '''
+
+    fields = ['WDPA_PID']
+    for check in checks:
+        fields += [field for field in check['fields'] if field not in fields]
+
+    return fields
+
+def text_keys(values):
+    '''
+    Return a float64 array of 53-bit hashes of the text values, NaN where they are
+    null: equal values have equal keys, and different values almost surely differ
+    '''
+
+    keys = (pd.util.hash_array(np.asarray(values, dtype=object)) >> np.uint64(11)).astype(np.float64)
+    keys[pd.isnull(values)] = np.nan
+
+    return keys
+
+def side_column(values, keep_text=False):
+    '''
+    Return the column of a chunk to keep in the side table: numeric values as they
+    are, text as hashes (see text_keys), or as a Categorical if keep_text is set True
+    '''
+
+    if is_numeric_dtype(values.dtype):
+        return values
+    if keep_text:
+        return pd.Categorical(values)
+
+    return text_keys(values)
+
+def concat_side_column(pieces):
+    '''
+    Return the side column of the whole table, from the side columns of its chunks
+    '''
+
+    if isinstance(pieces[0], pd.Categorical):
+        # an object array of the categories, shared by the rows holding them
+        return np.asarray(union_categoricals(pieces), dtype=object)
+
+    # integer chunks are widened to float64 if any chunk held nulls, as by rows_to_columns
+    return np.concatenate(pieces)
+
+#############################################
+#### 3. Run the checks on chunks of rows ####
+#############################################
+
+def add_stats(total, stats):
+    '''
+    Return the statistics of a task over the chunks so far: the sum of the times,
+    and the largest peak memory, None if it could not be read
+    '''
+
+    if total is None:
+        return dict(stats)
+
+    peaks = [peak for peak in (total['peak_mb'], stats['peak_mb']) if peak is not None]
+    return {'seconds': total['seconds'] + stats['seconds'],
+            'cpu_seconds': total['cpu_seconds'] + stats['cpu_seconds'],
+            'peak_mb': max(peaks) if peaks else None}
+
+def streamed_area_checks(checks):
+    '''
+    Return the 'too large' area checks that are run through the accumulator of
+    the statistics of their area ratios: all of them, unless the area ratios
+    are grouped, as the robust thresholds of the groups need their exact medians
+    '''
+
+    if area_group_fields():
+        return []
+
+    return [check for check in checks if check.get('batch') and check['batch'][0] is area_ratio_stats_by_argument]
+
+def read_rows(read_chunks, positions, flag_chunk=None):
+    '''
+    Read the table again, and return a list of the positions and rows of its
+    chunks at the given positions (sorted). If given, flag_chunk is called on 
+    each chunk and the position of its first row, and returns the positions in
+    the chunk of more rows to read: the whole table is then read.
+    '''
+
+    rows = []
+    start = 0
+    for chunk_df in read_chunks():
+        local = positions[(positions >= start) & (positions < start + len(chunk_df))] - start
+        if flag_chunk is not None:
+            local = np.union1d(local, flag_chunk(chunk_df, start))
+        if local.size > 0:
+            rows.append((local + start, chunk_df.iloc[local]))
+        start += len(chunk_df)
+        if flag_chunk is None and start > positions[-1]:
+            break
+
+    return rows
+
+def run_checks_chunked(read_chunks, checks, run_log=None):
+    '''
+    Run the checks on a table read in chunks, and return the same result dictionary
+    as run_checks on the whole table, and a dictionary describing the run: the
+    numbers of rows, chunks and rows kept with errors, the memory of the side table
+    (side_mb), and whether the table was read a second time (second_pass).
+
+    ## Arguments ##
+    read_chunks -- function returning an iterator over the chunks of the table, as
+                   DataFrames holding at least the fields of the checks; it is called
+                   a second time if rows flagged by side checks must be read, or if 
+                   'too large' area checks are run (see streamed_area_checks)
+    checks --      list of registered checks to be run
+    run_log --     optional run log (see profiling.new_run_log) to record the
+                   time, memory and number of rows of each check in
+
+    ## Example ##
+    run_checks_chunked(lambda: arcgis_table_chunks(in_fc, INPUT_FIELDS_POLY, 50000), poly_checks)
+    '''
+
+    # 'row' checks run on each chunk, the 'too large' area checks on the chunks in two passes, 
+    # the other checks on the side table
+    row_checks = [check for check in checks if check['scope'] == 'row' and not check.get('diagnostics')]
+    area_checks = streamed_area_checks(checks)
+    chunk_names = {check['name'] for check in row_checks + area_checks}
+    other_checks = [check for check in checks if check['name'] not in chunk_names]
+    fields = side_fields(other_checks)
+    text_fields = {field for check in other_checks if check['scope'] == 'table' for field in check['fields']}
+
+    row_tasks = check_tasks(row_checks)
+    task_stats = [None] * len(row_tasks)
+    chunk_positions = {check['name']: [] for check in row_checks}
+    kept = [] # positions and rows of the rows with errors
+    side = {field: [] for field in fields}
+    side_index = []
+    float_fields = set()
+    area_accumulator = area_ratio_accumulator([check['batch'][1] for check in area_checks])
+    area_stats = None
+
+    n_rows = 0
+    n_chunks = 0
+    index_name = None
+    for chunk_df in read_chunks():
+        add_message(f'Chunk {n_chunks + 1}: rows {n_rows + 1} to {n_rows + len(chunk_df)}')
+        flagged = [np.array([], dtype=np.int64)]
+        for i, task in enumerate(row_tasks):
+            task_positions, stats = measure_step(check_positions, chunk_df, task, trace_memory=False)
+            task_stats[i] = add_stats(task_stats[i], stats)
+            for name, positions in task_positions.items():
+                chunk_positions[name].append(positions + n_rows)
+                flagged.append(positions)
+
+        flagged = np.unique(np.concatenate(flagged))
+        if flagged.size > 0:
+            kept.append((flagged + n_rows, chunk_df.iloc[flagged]))
+
+        if area_checks:
+            _, stats = measure_step(accumulate_area_ratios, area_accumulator, chunk_df, trace_memory=False)
+            area_stats = add_stats(area_stats, stats)
+
+        for field in fields:
+            side[field].append(side_column(chunk_df[field].values, field in text_fields))
+        side_index.append(chunk_df.index.values)
+        float_fields.update(chunk_df.columns[chunk_df.dtypes == np.float64])
+
+        index_name = chunk_df.index.name
+        n_rows += len(chunk_df)
+        n_chunks += 1
+
+    for task, stats in zip(row_tasks, task_stats):
+        log_task(run_log, task, stats or {'seconds': 0., 'cpu_seconds': 0., 'peak_mb': None})
+
+    if n_chunks == 0:
+        return dict(), {'rows': 0, 'chunks': 0, 'rows_kept': 0, 'side_mb': 0., 'second_pass': False}
+
+    # the pieces of each column are released as it is built, and the columns are not copied into blocks
+    side_df = pd.DataFrame({field: concat_side_column(side.pop(field)) for field in fields},
+                           index=pd.Index(np.concatenate(side_index), name=index_name), columns=fields, copy=False)
+    del side_index
+    unique_pid = not side_df['WDPA_PID'].duplicated().any()
+
+    positions = dict()
+    for check in row_checks:
+        check_rows = np.concatenate(chunk_positions.pop(check['name']))
+        if not unique_pid and check_rows.size > 0:
+            # rows sharing a WDPA_PID with a flagged row, in any chunk, as run_checks returns them
+            check_rows = pid_positions(side_df, side_df['WDPA_PID'].values[check_rows])
+        positions[check['name']] = check_rows
+
+    diagnostics = dict()
+    for task in check_tasks(other_checks):
+        add_message('Running:' + ', '.join(check['name'] for check in task))
+        task_positions, stats = measure_step(check_positions, side_df, task, unique_pid, diagnostics, trace_memory=False)
+        log_task(run_log, task, stats)
+        positions.update(task_positions)
+    # text kept for table checks is shared with its categories, and not counted for each row
+    side_mb = float(side_df.memory_usage().sum() / 1024**2)
+    side_pid = side_df[['WDPA_PID']] if area_checks and not unique_pid else None
+    del side_df
+
+    if area_checks:
+        thresholds, stats = measure_step(area_ratio_thresholds, area_accumulator, trace_memory=False)
+        area_stats = add_stats(area_stats, stats)
+        for check in area_checks:
+            diagnostics[check['name']] = {key: thresholds[check['batch'][1]][key] for key in AREA_DIAGNOSTICS}
+        area_positions = {check['name']: [] for check in area_checks}
+
+    kept_positions = np.concatenate([np.array([], dtype=np.int64)] + [each[0] for each in kept])
+
+    def flag_chunk(chunk_df, start):
+        # the positions of the rows flagged by the area checks in the chunk, that are not kept yet
+        nonlocal area_stats
+        masks, stats = measure_step(area_too_large_chunk_masks, chunk_df, thresholds, trace_memory=False)
+        area_stats = add_stats(area_stats, stats)
+        for check in area_checks:
+            area_positions[check['name']].append(np.flatnonzero(masks[check['batch'][1]]) + start)
+        flagged = np.flatnonzero(np.logical_or.reduce(list(masks.values())))
+        return np.setdiff1d(flagged + start, kept_positions) - start
+
+    # Read the rows with errors that were not kept in the first pass, and flag those of the area checks
+    missing = np.setdiff1d(np.concatenate([np.array([], dtype=np.int64)] + list(positions.values())), kept_positions)
+    if missing.size > 0 or area_checks:
+        add_message(f'Reading {missing.size} rows with errors of the group and table checks'
+                    + (', and flagging the rows of the area checks' if area_checks else ''))
+        kept += read_rows(read_chunks, missing, flag_chunk if area_checks else None)
+
+    if area_checks:
+        log_task(run_log, area_checks, area_stats)
+        for check in area_checks:
+            check_rows = np.concatenate(area_positions[check['name']])
+            if side_pid is not None and check_rows.size > 0:
+                check_rows = pid_positions(side_pid, side_pid['WDPA_PID'].values[check_rows])
+            positions[check['name']] = check_rows
+
+        # rows sharing a WDPA_PID with a row flagged by an area check, not read yet
+        kept_positions = np.concatenate([each[0] for each in kept]) if kept else np.array([], dtype=np.int64)
+        missing_pid = np.setdiff1d(np.concatenate([positions[check['name']] for check in area_checks]), kept_positions)
+        if missing_pid.size > 0:
+            kept += read_rows(read_chunks, missing_pid)
+
+    info = {'rows': n_rows, 'chunks': n_chunks, 'rows_kept': 0, 'side_mb': side_mb,
+            'second_pass': bool(missing.size) or bool(area_checks)}
+    log_diagnostics(run_log, diagnostics)
+    log_rows(run_log, positions)
+    if not kept:
+        return dict(), info
+
+    kept_positions = np.concatenate([each[0] for each in kept])
+    order = np.argsort(kept_positions, kind='mergesort')
+    kept_positions = kept_positions[order]
+    kept_df = pd.concat([each[1] for each in kept]).iloc[order]
+    info['rows_kept'] = len(kept_df)
+
+    # integer fields are float64 in the whole table if any chunk held nulls
+    for field in float_fields.intersection(kept_df.columns):
+        if kept_df[field].dtype != np.float64:
+            kept_df[field] = kept_df[field].astype(np.float64)
+
+    result = {check['name']: kept_df.iloc[np.searchsorted(kept_positions, positions[check['name']])]
+              for check in checks if positions[check['name']].size > 0}
+
+    return result, info
+
+def load_and_run_chunked(in_fc, checks, input_fields, selection=None, memory_mb=None, chunk_rows=None, run_log=None):
+    '''
+    Select the checks, and run them on the fields they need of in_fc, read in chunks
+    of rows (see run_checks_chunked). Return the selected checks and the result dictionary.
+    The chunk size, number of chunks, memory of the side table and peak memory of
+    the process are recorded in the 'checks' phase of the run log.
+
+    ## Arguments ##
+    in_fc --        feature class attribute table - inside geodatabase - to check
+    checks --       list of registered checks, e.g. poly_checks
+    input_fields -- list of all fields of the table, e.g. INPUT_FIELDS_POLY
+    selection --    optional list of check names, tags and/or fields to run
+    memory_mb --    memory allowed for a chunk and the temporaries of the checks;
+                    defaults to the WDPA_QA_MEMORY_MB environment variable
+    chunk_rows --   optional number of rows of each chunk, instead of memory_mb
+    run_log --      optional run log to record the checks phase, and each check
+                    and its diagnostics, in
+
+    ## Example ##
+    checks, result = load_and_run_chunked(in_fc='WDPA_Jun2019_Public.gdb/WDPA_poly_Jun2019',
+                                          checks=poly_checks,
+                                          input_fields=INPUT_FIELDS_POLY,
+                                          memory_mb=2000)
+    '''
+
+    checks = select_checks(checks, selection)
+    fields = required_fields(checks, input_fields)
+    memory_mb = memory_mb or default_memory_mb()
+
+    if chunk_rows is None:
+        if memory_mb is None:
+            raise ValueError(f'ERROR: give memory_mb, chunk_rows or the {MEMORY_ENV_VARIABLE} environment variable')
+        chunk_rows = chunk_rows_for_memory(in_fc, fields, memory_mb)
+    add_message(f'Reading the table in chunks of {chunk_rows} rows')
+
+    # never traced: tracing slows the streaming pass down more than twice
+    (result, info), stats = measure_step(run_checks_chunked, lambda: arcgis_table_chunks(in_fc, fields, chunk_rows), checks, run_log,
+                                         trace_memory=False)
+    log_phase(run_log, 'checks', stats, checks=len(checks), chunk_rows=chunk_rows, memory_budget_mb=memory_mb, **info)
+    if stats['peak_mb'] is not None:
+        add_message(f'Peak memory: {stats["peak_mb"]:.0f} MB' + (f', for a budget of {memory_mb:.0f} MB per chunk' if memory_mb else ''))
+
+    return checks, result
+
+#######################
+#### END OF SCRIPT ####
+#######################
@@ -17,8 +17,13 @@ This Python script is to export the results of RAQTOW, the WDPA QA tool, to an E
 
 import os
 import datetime
+import itertools
+import json
+import numpy as np
+import pandas as pd
 from openpyxl import Workbook
 from openpyxl import load_workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils.dataframe import dataframe_to_rows    
 from openpyxl.formatting import Rule
 from openpyxl.styles import Font, PatternFill, Border
@@ -28,11 +33,155 @@ RED = 'ff0000'
 ORANGE = 'ffff00'
 GREEN = '00ff00'
 
+# Columns added to the Summary sheet when a run log is given
+RUN_LOG_COLUMNS = ['SECONDS', 'CPU SECONDS', 'PEAK MEMORY (MB)', 'CHECKS TIMED TOGETHER', 'DIAGNOSTICS']
+
+# Rows of errors per sheet: an Excel sheet has at most 1,048,576 rows, the first being the header
+SHEET_MAX_ROWS = 1048575
+
+# Excel sheet names have at most 31 characters
+SHEET_NAME_LENGTH = 31
+
+# Column added to the Summary sheet when a check has more rows than a sheet holds:
+# links to its continuation sheets, or to the compressed file its rows are spilled to
+CONTINUED_COLUMN = 'CONTINUED IN'
+
+# Set (to anything but 0) to spill the checks with more rows than a sheet holds to compressed files
+SPILL_ENV_VARIABLE = 'WDPA_QA_SPILL'
+
+# Version of the manifest written by export_results; increase it when its content changes
+MANIFEST_FORMAT = 1
+
+# Layouts of the exported results: the full rows of each check ('rows'), or each
+# row with errors once in an error matrix ('matrix') or list ('list'), see export_results
+LAYOUTS = ['rows', 'matrix', 'list']
+LAYOUT_ENV_VARIABLE = 'WDPA_QA_LAYOUT'
+
+# Fields identifying the rows, kept in every table of the 'matrix' and 'list' layouts
+ID_FIELDS = ['WDPAID', 'WDPA_PID']
+
+##################################################
+#### Function: check outcomes and diagnostics ####
+##################################################
+
+def check_outcomes(result, checks):
+    '''
+    Return a dictionary of the outcome of each check: 'Pass' if the check's
+    name is not in result, else its severity, 'Fail' or 'Check' (by default 
+    'Fail' for the checks whose name starts with 'ivd')
+
+    ## Arguments ##
+    result -- dictionary of the DataFrames of the checks that failed, by check name
+    checks -- list of registered checks, e.g. poly_checks
+    '''
+
+    outcomes = dict()
+    for each in checks:
+        severity = each.get('severity', 'Fail' if each['name'].startswith('ivd') else 'Check')
+        outcomes[each['name']] = ('Fail' if severity == 'Fail' else 'Check') if each['name'] in result else 'Pass'
+
+    return outcomes
+
+def format_diagnostics(diagnostics):
+    '''
+    Return the diagnostics of a check (see runner.check_diagnostics) as text
+    for the Summary sheet, e.g. 'mean 1.02; std 0.051; outliers 3', 
+    or None if there are none
+    '''
+
+    if not diagnostics:
+        return None
+
+    # Lists, e.g. the thresholds of each group, are exported as tables (see group_thresholds)
+    return '; '.join(f'{key} {value:.4g}' if isinstance(value, float) else f'{key} {value}' 
+                     for key, value in diagnostics.items() if not isinstance(value, (list, dict)))
+
+def group_thresholds(run_log):
+    '''
+    Return a DataFrame of the thresholds of each group of the area checks run
+    with robust thresholds by group (see qa.robust_thresholds), for audit: 
+    a CHECK column and the statistics of each group, or None if there are none
+
+    ## Arguments ##
+    run_log -- run log of the run, with the diagnostics of the checks
+    '''
+
+    if run_log is None:
+        return None
+
+    dfs = []
+    for name, stats in run_log['checks'].items():
+        records = stats.get('diagnostics', dict()).get('group_thresholds')
+        if records:
+            df = pd.DataFrame.from_records(records)
+            df.insert(0, 'CHECK', name)
+            dfs.append(df)
+
+    return pd.concat(dfs, ignore_index=True, sort=False) if dfs else None
+
+#######################################################
+#### Function: continuation sheets and spill files ####
+#######################################################
+
+def default_spill():
+    '''
+    Return True if the WDPA_QA_SPILL environment variable is set (to anything
+    but 0): the checks with more rows than a sheet holds are then written to
+    compressed CSV files rather than to continuation sheets
+    '''
+
+    return os.environ.get(SPILL_ENV_VARIABLE, '0') not in ('', '0')
+
+def sheet_names(function_name, n_rows, max_rows=SHEET_MAX_ROWS):
+    '''
+    Return the names of the sheets holding the n_rows rows of a check:
+    the check's name, followed by numbered continuation sheets when n_rows is
+    more than max_rows, shortened to the 31 characters Excel allows.
+
+    ## Example ##
+    sheet_names('nan_present_sub_loc', 2500000)
+    # ['nan_present_sub_loc', 'nan_present_sub_loc (2)', 'nan_present_sub_loc (3)']
+    '''
+
+    names = [function_name]
+    for part in range(2, -(-n_rows // max_rows) + 1):
+        suffix = f' ({part})'
+        names.append(function_name[:SHEET_NAME_LENGTH - len(suffix)] + suffix)
+
+    return names
+
+def sheet_link(sheetname):
+    '''
+    Return the hyperlink to cell A1 of a sheet of the workbook,
+    the sheet's name being quoted if it contains spaces
+    '''
+
+    return f"#'{sheetname}'!A1" if ' ' in sheetname else f'#{sheetname}!A1'
+
+def check_file(outpath, datatype, function_name, extension):
+    '''
+    Return the path of the file of the rows of a check, next to the Excel
+    output, e.g. 01Jun2019_WDPA_QA_checks_poly_nan_present_sub_loc.parquet
+    '''
+
+    filename = f'{datetime.datetime.now().strftime("%d%b%Y")}_WDPA_QA_checks_{datatype}_{function_name}.{extension}'
+
+    return outpath + os.sep + filename
+
+def spill_file(outpath, datatype, function_name):
+    '''
+    Return the path of the compressed CSV file that the rows of a check are
+    spilled to, next to the Excel output, e.g.
+    01Jun2019_WDPA_QA_checks_poly_nan_present_sub_loc.csv.gz
+    '''
+
+    return check_file(outpath, datatype, function_name, 'csv.gz')
+
 ##########################################
 #### Function: output errors to Excel ####
 ##########################################
 
-def output_errors_to_excel(result, outpath, checks, datatype):
+def output_errors_to_excel(result, outpath, checks, datatype, run_log=None, max_rows=SHEET_MAX_ROWS, spill=None, tables=None):
     '''
     The functions_list is a list that contains all the names of the 
     functions (tests) of the WDPA QA. If the function's name is present
@@ -45,7 +194,17 @@ def output_errors_to_excel(result, outpath, checks, datatype):
     Excel file. In the Excel Summary sheet, the function's name will be 
     added along with string 'Fail'. Else, the test's name will be added to 
     the Excel Summary sheet along with string 'Pass'.
-        
+
+    The workbook is written with write-only sheets, which stream their rows
+    to disk, so that memory stays about the same whatever the number of
+    rows with errors.
+
+    A check with more rows than a sheet holds (max_rows) continues in numbered
+    sheets, e.g. 'nan_present_sub_loc (2)', linked from its Summary row in the
+    CONTINUED IN column. If spill is set, its rows are instead written to a
+    compressed CSV file next to the workbook (see spill_file), linked in the
+    same way, so that the workbook stays small.
+
     ## Arguments ##
     result --         dictionary created by the main function, containing 
                       functions' names and DataFrames for tests that failed. 
@@ -54,75 +213,150 @@ def output_errors_to_excel(result, outpath, checks, datatype):
     
     outpath --        the output directory where the Excel file is to be saved
     
-    checks --         a dictionary containing all the descriptive names 
-                      and function names of the WDPA QA checks
+    checks --         a list of dictionaries containing all the descriptive names 
+                      and function names of the WDPA QA checks, and optionally
+                      their severity ('Fail' or 'Check')
     
     datatype --       a string specifying the input type: e.g. point or poly
                       This will be added to the Excel file's name.
 
+    run_log --        optional run log (see profiling.new_run_log): the time and 
+                      memory of each check, and of the load and checks phases, 
+                      and the diagnostics of the checks declaring them, are then 
+                      added to the Summary sheet.
+
+    max_rows --       rows of errors per sheet, at most SHEET_MAX_ROWS
+
+    spill --          set True to write the checks with more than max_rows rows 
+                      to compressed CSV files; defaults to the WDPA_QA_SPILL 
+                      environment variable
+
+    tables --         optional dictionary of further DataFrames by name, e.g. 
+                      the error matrix (see export_results), each written to 
+                      its own sheet and listed below the checks in the Summary
+
+    Return a dictionary of the file holding the rows of each check that 
+    failed, and of each table: the workbook, or the file the rows were 
+    spilled to.
+
     ## Example ##
     output_errors_to_excel(result=result,
                            outpath='C:\\Users\\paintern\\Desktop\\Stijn\\3. Data\\Test data',
                            checks=poly_checks,
                            datatype='poly'])
     '''
-        
-    # Function to find the row of the function_name
-    # Required to add a hyperlink of the tab to the 
-    # corresponding function_name cell
-    def find_row(function_name):
-        for row in wb['Summary'].iter_rows(min_row=1, max_row=wb['Summary'].max_row, max_col=1):
-            for cell in row: # iterate through the cells in rows 1 through the end
-                if cell.value == function_name: # select the correct cell
-                    return (wb['Summary'].cell(row=cell.row, column=1).row) # return cell's row number
-    
+
     # Set variables - to later add the current day to the filename
     filename = f'{datetime.datetime.now().strftime("%d%b%Y")}_WDPA_QA_checks_{datatype}.xlsx'
     output = outpath + os.sep + filename
     
-    # Create the Excel workbook and the Summary sheet
-    wb = Workbook()
-    wb['Sheet'].title = 'Summary' # change default sheet's title
-    wb["Summary"].append(["CHECK","RESULT", "COUNT"]) # add header for Summary sheet
+    # Create a write-only Excel workbook: rows are written to disk as they are
+    # appended, so that memory does not grow with the number of rows with errors.
+    # Cells cannot be changed once appended, hence the formatting of each sheet
+    # is set before its rows, and hyperlinks are written with the rows.
+    wb = Workbook(write_only=True)
+    summary = wb.create_sheet('Summary')
+    summary.sheet_properties.tabColor = '000000' # black tab 
+    summary.column_dimensions['A'].width = 31 # adjust column A's width
+    summary.freeze_panes = 'A2' # freeze header
+    spill = default_spill() if spill is None else spill
+    tables = tables or dict()
+
+    # Checks and tables with more rows than a sheet holds, linked to their further sheets or spilled file
+    large = [each['name'] for each in checks if len(result.get(each['name'], [])) > max_rows]
+    large += [name for name, df in tables.items() if len(df) > max_rows]
+
+    header = ["CHECK","RESULT", "COUNT"] + (RUN_LOG_COLUMNS if run_log is not None else [])
+    summary.append(header + ([CONTINUED_COLUMN] if large else [])) # add header for Summary sheet
+    summary_rows = 1 # rows appended to the Summary sheet, for the conditional formatting
+
+    # Function to create a cell with a hyperlink, e.g. to a sheet (see sheet_link), with hyperlink style
+    def hyperlink_cell(ws, value, link):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.hyperlink = link
+        cell.style = 'Hyperlink'
+        return cell
+
+    # Function to obtain the run log values of a check or phase, for the Summary sheet
+    def run_log_values(stats):
+        if run_log is None:
+            return []
+        peak_mb = stats.get('peak_mb')
+        return [round(stats['seconds'], 3) if 'seconds' in stats else None,
+                round(stats['cpu_seconds'], 3) if 'cpu_seconds' in stats else None,
+                round(peak_mb, 1) if peak_mb is not None else None,
+                stats.get('checks_timed_together'),
+                format_diagnostics(stats.get('diagnostics'))]
+
+    def check_stats(function_name):
+        return run_log['checks'].get(function_name, dict()) if run_log is not None else dict()
+
+    files = dict()
+
+    # Function to add the rows of a check or table to new sheets, with its Summary row
+    # values following the first cell; return the file holding its rows
+    def add_sheets(function_name, df, values, tab_colour):
+        # too many rows for a sheet: write them to a compressed file next to the workbook, linked from the Summary
+        if spill and function_name in large:
+            path = spill_file(outpath, datatype, function_name)
+            df.to_csv(path, index=False, compression='gzip')
+            link = os.path.basename(path) # relative to the workbook
+            summary.append([hyperlink_cell(summary, function_name, link)] + values + [hyperlink_cell(summary, link, link)])
+            return path
+
+        # add a link to the function_name tab and its continuation sheets to the Summary sheet
+        names = sheet_names(function_name, len(df), max_rows)
+        summary.append([hyperlink_cell(summary, function_name, sheet_link(names[0]))] + values
+                       + [hyperlink_cell(summary, name, sheet_link(name)) for name in names[1:]])
+
+        # export DataFrame rows to Excel, max_rows per sheet, after a first column 
+        # with a hyperlink to return to the Summary with a single click
+        rows = dataframe_to_rows(df, index=False)
+        columns = next(rows)
+        for name in names:
+            ws = wb.create_sheet(name)
+            if tab_colour is not None:
+                ws.sheet_properties.tabColor = tab_colour
+            ws.column_dimensions['A'].width = 14 # adjust width of column A
+            ws.freeze_panes = 'B2'
+            ws.append([hyperlink_cell(ws, 'To Summary', sheet_link('Summary'))] + columns)
+            for row in itertools.islice(rows, max_rows):
+                ws.append([None] + row)
+        return output
 
     # If the function's name - in the functions_list - is present in the 
     # result dictionary, add DataFrame to a new sheet
     function_names = [each['name'] for each in checks] # make a list of all checks' names
+    outcomes = check_outcomes(result, checks) # 'Fail', 'Check' or 'Pass'
 
     for function_name in function_names:
+        # add 'Check' or 'Fail' to Summary sheet, with a fail or check tab
         if function_name in result:
-            ws = wb.create_sheet(function_name)
-        # export DataFrame rows to Excel
-            for row in dataframe_to_rows(result[function_name], index=False): 
-                ws.append(row)
-        # Add a hyperlink to each sheet, to return to the Summary with a single click
-            ws.insert_cols(1) # insert column at first position
-            ws.cell(row=1, column=1).value = 'To Summary'
-            ws.cell(row=1, column=1).hyperlink = (f'#Summary!A1')
-            ws.cell(row=1, column=1).style = 'Hyperlink'
-            ws.column_dimensions['A'].width = 14 # adjust width of column A
-            ws.freeze_panes = 'B2'
-        # add 'Check' or 'Fail' to Summary sheet
-            if function_name.startswith('ivd'):
-                wb['Summary'].append([function_name,'Fail', len(result[function_name])])
-                ws.sheet_properties.tabColor = RED # fail tab
-                link = f'#{function_name}!A1' # as above
-                wb['Summary'].cell(row=find_row(function_name), column=1).hyperlink = link
-                wb['Summary'].cell(row=find_row(function_name), column=1).style = 'Hyperlink'
-            else:
-                wb['Summary'].append([function_name,'Check', len(result[function_name])])
-                ws.sheet_properties.tabColor = ORANGE # check tab
-                link = f'#{function_name}!A1' # create link to cell A1 of function_name tab
-                # add link to the function_name of the Summary sheet, with hyperlink style
-                wb['Summary'].cell(row=find_row(function_name), column=1).hyperlink = link 
-                wb['Summary'].cell(row=find_row(function_name), column=1).style = 'Hyperlink'
- 
+            severity = outcomes[function_name]
+            values = [severity, len(result[function_name])] + run_log_values(check_stats(function_name))
+            files[function_name] = add_sheets(function_name, result[function_name], values, RED if severity == 'Fail' else ORANGE)
+
         # add 'Pass' to Summary sheet as no rows with invalid WDPA_PIDs are present
         else:
-            wb['Summary'].append([function_name,'Pass'])
+            summary.append([function_name,'Pass', None] + run_log_values(check_stats(function_name)))
+        summary_rows += 1
+
+    # add the tables below the checks, e.g. the error matrix
+    if tables:
+        summary.append([])
+        for name, df in tables.items():
+            files[name] = add_sheets(name, df, [None, len(df)] + run_log_values(dict()), None)
+        summary_rows += 1 + len(tables)
+
+    # add the phases of the run below the checks: rows loaded, checks run
+    if run_log is not None and run_log['phases']:
+        summary.append([])
+        for phase, stats in run_log['phases'].items():
+            summary.append([f'({phase})', None, stats.get('rows', stats.get('checks'))] + run_log_values(stats))
+        summary_rows += 1 + len(run_log['phases'])
 
     # Conditional formatting - different colours for Check, Fail, and Pass
-    def add_conditional_formatting(colour, summary_result, sheetname):
+    def add_conditional_formatting(colour, summary_result, ws):
         '''
         Add conditional formatting in the Summary sheet in Excel, for each check performed.
         This will fill cells containing certain values. 
@@ -131,32 +365,276 @@ def output_errors_to_excel(result, outpath, checks, datatype):
         ## Arguments ##
         colour --         A string specifying hex colour code (RRGGBB) to use for filling.
         summary_result -- A string with the summary result, either 'Fail', 'Check', or 'Pass'
-        sheetname --      A string specifying the target sheet for the formatting, i.e. 'Summary'
+        ws --             The target sheet for the formatting, i.e. the Summary sheet
 
         ## Example ##
         add_conditional_formatting(colour='87CEFA',
         summary_result='Check',
-        sheetname='Summary)
+        ws=summary)
         '''
         
         fill_col = PatternFill(bgColor=colour) # specify colour
         style_to_apply = DifferentialStyle(fill=fill_col) # specifyl style (fill)
         r = Rule(type="expression", dxf=style_to_apply, stopIfTrue=True) # specify rule
         r.formula = [f'$B2="{summary_result}"'] # only search in Column B, starting on second row
-        wb[sheetname].conditional_formatting.add(f'A2:C{wb[sheetname].max_row}', r) # apply formatting
+        ws.conditional_formatting.add(f'A2:C{summary_rows}', r) # apply formatting
 
-    add_conditional_formatting(ORANGE, 'Check', 'Summary') # orange
-    add_conditional_formatting(RED, 'Fail', 'Summary') # red
-    add_conditional_formatting(GREEN, 'Pass', 'Summary') # green
-    
-    # Extra formatting
-    wb['Summary'].sheet_properties.tabColor = '000000' # black tab 
-    wb['Summary'].column_dimensions['A'].width = 31 # adjust column A's width
-    wb['Summary'].freeze_panes = 'A2' # freeze header
+    add_conditional_formatting(ORANGE, 'Check', summary) # orange
+    add_conditional_formatting(RED, 'Fail', summary) # red
+    add_conditional_formatting(GREEN, 'Pass', summary) # green
 
     # Save the workbook
     wb.save(output)
-    return
+    return files
+
+############################################
+#### Function: output errors to columns ####
+############################################
+
+def parquet_engine():
+    '''
+    Return the name of the library that pandas writes Parquet files with,
+    'pyarrow' or 'fastparquet', or None if neither is installed
+    '''
+
+    for engine in ['pyarrow', 'fastparquet']:
+        try:
+            __import__(engine)
+        except ImportError:
+            continue
+        return engine
+
+    return None
+
+def output_errors_to_files(result, outpath, checks, datatype, extension, write, tables=None):
+    '''
+    Write the DataFrame of each check that failed, and of each table, to its 
+    own file next to the Excel output (see check_file), with write(df, path). 
+    Return a dictionary of the path written for each check and table.
+    '''
+
+    dfs = {each['name']: result[each['name']] for each in checks if each['name'] in result}
+    dfs.update(tables or dict())
+
+    files = dict()
+    for name, df in dfs.items():
+        files[name] = check_file(outpath, datatype, name, extension)
+        write(df, files[name])
+
+    return files
+
+def output_errors_to_parquet(result, outpath, checks, datatype, run_log=None, tables=None):
+    '''
+    Write the rows of each check that failed to a Parquet file, which keeps
+    the types of the fields. Requires pyarrow or fastparquet.
+    Arguments and returned value are those of output_errors_to_excel.
+    '''
+
+    engine = parquet_engine()
+    if engine is None:
+        raise ImportError('ERROR: the Parquet export requires pyarrow or fastparquet')
+
+    return output_errors_to_files(result, outpath, checks, datatype, 'parquet',
+                                  lambda df, path: df.to_parquet(path, engine=engine, index=False), tables)
+
+def output_errors_to_csv(result, outpath, checks, datatype, run_log=None, tables=None):
+    '''
+    Write the rows of each check that failed to a gzip compressed CSV file.
+    Arguments and returned value are those of output_errors_to_excel.
+    '''
+
+    return output_errors_to_files(result, outpath, checks, datatype, 'csv.gz',
+                                  lambda df, path: df.to_csv(path, index=False, compression='gzip'), tables)
+
+def output_errors_to_jsonl(result, outpath, checks, datatype, run_log=None, tables=None):
+    '''
+    Write the rows of each check that failed to a JSON Lines file: one JSON
+    object per row, with null for missing values.
+    Arguments and returned value are those of output_errors_to_excel.
+    '''
+
+    return output_errors_to_files(result, outpath, checks, datatype, 'jsonl',
+                                  lambda df, path: df.to_json(path, orient='records', lines=True), tables)
+
+# Exporters of the QA results, by name: functions taking the arguments of 
+# output_errors_to_excel, and returning the file written for each check that failed and table
+EXPORTERS = {'excel': output_errors_to_excel,
+             'parquet': output_errors_to_parquet,
+             'csv': output_errors_to_csv,
+             'jsonl': output_errors_to_jsonl}
+
+###################################################
+#### Function: error matrix and list of errors ####
+###################################################
+
+def error_matrix(result, checks):
+    '''
+    Return the error matrix: each row with errors once, with all its fields, 
+    followed by a column for each check that failed, True if the check 
+    flagged the row and else empty (None), so that the matrix stays sparse 
+    in each format. Rows are identified by the index of the DataFrames of 
+    result (see runner.positions_to_result), and kept in their order.
+
+    ## Arguments ##
+    result -- dictionary of the DataFrames of the checks that failed, by check name
+    checks -- list of registered checks, e.g. poly_checks
+    '''
+
+    names = [each['name'] for each in checks if each['name'] in result]
+    if not names:
+        return pd.DataFrame()
+
+    rows = pd.concat([result[name] for name in names])
+    rows = rows[~rows.index.duplicated()].sort_index()
+    flags = pd.DataFrame({name: np.where(rows.index.isin(result[name].index), True, None) for name in names},
+                         index=rows.index, columns=names)
+
+    return pd.concat([rows, flags], axis=1)
+
+def error_list(result, checks):
+    '''
+    Return the list of errors: a row for each row and check that flagged it,
+    with the fields identifying the row (ID_FIELDS) and the check's name (CHECK),
+    in the order of checks
+
+    ## Arguments ##
+    result -- dictionary of the DataFrames of the checks that failed, by check name
+    checks -- list of registered checks, e.g. poly_checks
+    '''
+
+    names = [each['name'] for each in checks if each['name'] in result]
+    ids = [field for field in ID_FIELDS if all(field in result[name].columns for name in names)]
+
+    errors = {field: np.concatenate([result[name][field].values for name in names]) if names else []
+              for field in ids}
+    errors['CHECK'] = pd.Categorical(np.repeat(names, [len(result[name]) for name in names]), categories=names)
+
+    return pd.DataFrame(errors, columns=ids + ['CHECK'])
+
+def check_fields_result(result, checks):
+    '''
+    Return result with only the fields identifying the rows (ID_FIELDS) and
+    the fields read by each check (its 'fields' in the registry); checks that
+    do not declare their fields keep all of them
+    '''
+
+    fields_result = dict()
+    for each in checks:
+        if each['name'] in result:
+            df = result[each['name']]
+            if each.get('fields'):
+                df = df[[field for field in df.columns if field in ID_FIELDS or field in each['fields']]]
+            fields_result[each['name']] = df
+
+    return fields_result
+
+def default_layout():
+    '''
+    Return the layout set in the WDPA_QA_LAYOUT environment variable, 
+    or 'rows' if it is not set
+    '''
+
+    return os.environ.get(LAYOUT_ENV_VARIABLE) or 'rows'
+
+#######################################################
+#### Function: export the results and the manifest ####
+#######################################################
+
+def manifest_file(outpath, datatype):
+    '''
+    Return the path of the manifest of the exported results, next to the
+    Excel output, e.g. 01Jun2019_WDPA_QA_manifest_poly.json
+    '''
+
+    filename = f'{datetime.datetime.now().strftime("%d%b%Y")}_WDPA_QA_manifest_{datatype}.json'
+
+    return outpath + os.sep + filename
+
+def check_formats(formats):
+    '''
+    Raise an error if a format is not the name of an exporter (see EXPORTERS),
+    or if its library is not installed, e.g. to fail before running the checks
+    '''
+
+    unknown = [name for name in formats if name not in EXPORTERS]
+    if unknown:
+        raise ValueError(f'ERROR: no exporters found for {unknown}, expected some of {list(EXPORTERS)}')
+    if 'parquet' in formats and parquet_engine() is None:
+        raise ImportError('ERROR: the Parquet export requires pyarrow or fastparquet')
+
+def export_results(result, outpath, checks, datatype, formats=('excel',), run_log=None, layout=None):
+    '''
+    Export the results of the checks with each exporter in formats (see 
+    EXPORTERS), and write a manifest (see manifest_file) with the outcome
+    ('Pass', 'Fail' or 'Check') and number of rows of each check, and the 
+    files, relative to outpath, that hold its rows in each format.
+    Return the path of the manifest.
+
+    With the 'rows' layout, all the fields of the rows of each check are 
+    exported. The thresholds of each group of the area checks, if they ran 
+    by group, are exported as an 'area_thresholds' table. As a row failing several checks is then repeated for each of 
+    them, the 'matrix' and 'list' layouts only export the fields identifying 
+    the rows and the fields read by each check (see check_fields_result), 
+    and each row with errors once, with all its fields, in an error matrix 
+    (see error_matrix), or a list of the checks failed by each row 
+    (see error_list).
+
+    ## Arguments ##
+    result --   dictionary of the DataFrames of the checks that failed, by check name
+    outpath --  the output directory where the files are to be saved
+    checks --   list of registered checks, e.g. poly_checks
+    datatype -- a string specifying the input type: e.g. point or poly
+    formats --  names of the exporters to use, e.g. ['excel', 'parquet']
+    run_log --  optional run log, added to the Excel Summary sheet
+    layout --   'rows', 'matrix' or 'list'; defaults to the WDPA_QA_LAYOUT
+                environment variable, or 'rows'
+
+    ## Example ##
+    export_results(result, output_path, poly_checks, 'poly', ['parquet', 'jsonl'], layout='matrix')
+    '''
+
+    layout = layout or default_layout()
+    if layout not in LAYOUTS:
+        raise ValueError(f'ERROR: unknown layout {layout}, expected one of {LAYOUTS}')
+    # Fail before writing anything, rather than after the Excel export
+    check_formats(formats)
+
+    tables = dict()
+    check_result = result
+    if layout == 'matrix':
+        tables['error_matrix'] = error_matrix(result, checks)
+    if layout == 'list':
+        tables['error_list'] = error_list(result, checks)
+    if tables:
+        check_result = check_fields_result(result, checks)
+    thresholds = group_thresholds(run_log)
+    if thresholds is not None:
+        tables['area_thresholds'] = thresholds
+
+    files = {name: EXPORTERS[name](check_result, outpath, checks, datatype, run_log=run_log, tables=tables) for name in formats}
+
+    outcomes = check_outcomes(result, checks)
+    manifest = {'format': MANIFEST_FORMAT,
+                'datatype': datatype,
+                'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                'exports': list(formats),
+                'layout': layout,
+                'checks': [{'name': name,
+                            'result': outcome,
+                            'count': len(result[name]) if name in result else 0,
+                            'files': {format_: os.path.basename(files[format_][name])
+                                      for format_ in formats if name in files[format_]}}
+                           for name, outcome in outcomes.items()],
+                'tables': [{'name': name,
+                            'count': len(df),
+                            'files': {format_: os.path.basename(files[format_][name]) for format_ in formats}}
+                           for name, df in tables.items()]}
+
+    path = manifest_file(outpath, datatype)
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    return path
 
 #######################
 #### END OF SCRIPT ####
@@ -0,0 +1,417 @@
+###################################################################################
+#### RAMBO: a Quality Assurance Tool for the World Database on Protected Areas ####
+#### Python script to read File Geodatabase tables without arcpy              ####
+###################################################################################
+
+'''
+This Python script reads the attribute tables of an Esri File Geodatabase (.gdb)
+directly from its .gdbtable and .gdbtablx files, so that the WDPA QA can run
+on machines without ArcGIS (e.g. Linux batch nodes and CI).
+
+Only the fields that are requested are decoded; geometries are skipped.
+The layout of the files follows the open specification of the format:
+https://github.com/rouault/dump_gdbtable/wiki/FGDB-Spec
+
+## Definitions ##
+
+- a **table file** is the a<id>.gdbtable file holding the field descriptions and the rows
+- a **table index** is the a<id>.gdbtablx file holding the offset of each row in the table file
+- the **catalog** is table a00000001, listing the name and id of every table in the geodatabase
+'''
+
+#######################
+#### Load packages ####
+#######################
+
+import datetime
+import mmap
+import os
+import re
+import struct
+import uuid
+import numpy as np
+
+###################################
+#### 0. File Geodatabase types ####
+###################################
+
+# Field type codes used in the table file, and the matching ArcGIS field type names
+FIELD_TYPES = {0: 'SmallInteger',
+               1: 'Integer',
+               2: 'Single',
+               3: 'Double',
+               4: 'String',
+               5: 'Date',
+               6: 'OID',
+               7: 'Geometry',
+               8: 'Blob',
+               9: 'Raster',
+               10: 'Guid',
+               11: 'GlobalID',
+               12: 'XML',
+               13: 'BigInteger',
+               14: 'DateOnly',
+               15: 'TimeOnly',
+               16: 'TimestampOffset'}
+
+# Fixed-size values: struct format of each field type; timestamps with an offset
+# hold the number of days and the offset from UTC in minutes
+FIXED_FORMATS = {0: '<h', 1: '<i', 2: '<f', 3: '<d', 5: '<d', 13: '<q', 14: '<d', 15: '<d', 16: '<dh'}
+FIXED_SIZES = {type_code: struct.calcsize(fixed_format) for type_code, fixed_format in FIXED_FORMATS.items()}
+
+# Variable-size values, stored after their length: strings, geometries, binary and XML
+VARIABLE_TYPES = (4, 7, 8, 12)
+
+# Values of 16 bytes: GUID and GlobalID
+GUID_TYPES = (10, 11)
+
+# Dates are stored as the number of days since 30 December 1899
+DATE_ORIGIN = datetime.datetime(1899, 12, 30)
+
+CATALOG_ID = 1
+
+#############################################
+#### 1. Locate a table in the geodatabase ####
+#############################################
+
+def split_table_path(in_fc):
+    '''
+    Split the path of a table into the path of its geodatabase and the table name.
+    Both '/' and '\\' are accepted as separators, and feature datasets are skipped.
+
+    ## Arguments ##
+    in_fc -- path to the table, i.e. <nameOfGeodatabase>/<nameOfFeatureClassAttributeTable>
+
+    ## Example ##
+    split_table_path(in_fc='WDPA_Jun2019_Public.gdb/WDPA_poly_Jun2019')
+    '''
+
+    parts = re.split(r'[\\/]', in_fc)
+    gdb_parts = [i for i, part in enumerate(parts) if part.lower().endswith('.gdb')]
+
+    if not gdb_parts or gdb_parts[-1] == len(parts) - 1:
+        raise ValueError(f'ERROR: {in_fc} is not a table inside a File Geodatabase (.gdb)')
+
+    gdb_path = os.sep.join(parts[:gdb_parts[-1] + 1]) or os.sep
+
+    return gdb_path, parts[-1]
+
+def table_file(gdb_path, table_id):
+    '''
+    Return the path of the table file with the given id
+    '''
+
+    return os.path.join(gdb_path, f'a{table_id:08x}.gdbtable')
+
+def find_table_id(gdb_path, table_name):
+    '''
+    Return the id of the table named table_name, looked up in the catalog
+    of the geodatabase. Table names are not case sensitive.
+
+    ## Arguments ##
+    gdb_path --   path to the File Geodatabase (.gdb) directory
+    table_name -- name of the table, e.g. 'WDPA_poly_Jun2019'
+    '''
+
+    catalog = GdbTable(table_file(gdb_path, CATALOG_ID))
+    for table_id, name in catalog.iter_rows([catalog.oid_field_name, 'Name']):
+        if name.lower() == table_name.lower():
+            return table_id
+
+    raise ValueError(f'ERROR: table {table_name} not found in {gdb_path}')
+
+def open_table(in_fc):
+    '''
+    Open a table of a File Geodatabase by its path.
+
+    ## Arguments ##
+    in_fc -- path to the table, i.e. <nameOfGeodatabase>/<nameOfFeatureClassAttributeTable>
+
+    ## Example ##
+    open_table(in_fc='tests/data.gdb/test')
+    '''
+
+    gdb_path, table_name = split_table_path(in_fc)
+
+    return GdbTable(table_file(gdb_path, find_table_id(gdb_path, table_name)))
+
+##########################################
+#### 2. Read a File Geodatabase table ####
+##########################################
+
+def read_varuint(buffer, pos):
+    '''
+    Read an unsigned integer stored in 7-bit groups, least significant first.
+    Return the value and the position after it.
+    '''
+
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def fixed_value(type_code, value):
+    '''
+    Return the value of a fixed-size field, from the tuple unpacked with its
+    struct format: numbers as they are, and dates and times as Python objects
+    '''
+
+    if type_code == 5:
+        return DATE_ORIGIN + datetime.timedelta(days=value[0])
+    if type_code == 14:
+        return (DATE_ORIGIN + datetime.timedelta(days=value[0])).date()
+    if type_code == 15:
+        return (DATE_ORIGIN + datetime.timedelta(days=value[0])).time()
+    if type_code == 16:
+        offset = datetime.timezone(datetime.timedelta(minutes=value[1]))
+        return (DATE_ORIGIN + datetime.timedelta(days=value[0])).replace(tzinfo=offset)
+
+    return value[0]
+
+class GdbField:
+    '''
+    Description of a field of a File Geodatabase table
+    '''
+
+    def __init__(self, name, alias, type_code, nullable):
+        self.name = name
+        self.alias = alias
+        self.type_code = type_code
+        self.type = FIELD_TYPES.get(type_code, 'Unknown')
+        self.nullable = nullable
+
+    def __repr__(self):
+        return f'GdbField({self.name!r}, {self.type!r})'
+
+class GdbTable:
+    '''
+    Reader for one table of a File Geodatabase: the a<id>.gdbtable file
+    and its a<id>.gdbtablx index.
+
+    ## Arguments ##
+    path -- path to the .gdbtable file
+
+    ## Example ##
+    table = GdbTable('tests/data.gdb/a00000009.gdbtable')
+    for row in table.iter_rows(['WDPAID', 'NAME']):
+        print(row)
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(40)
+            self.valid_rows = struct.unpack_from('<i', header, 4)[0]
+            fields_offset = struct.unpack_from('<q', header, 32)[0]
+            f.seek(fields_offset)
+            fields_size = struct.unpack('<i', f.read(4))[0]
+            self.fields = self._read_fields(f.read(fields_size))
+
+        oid_fields = [field.name for field in self.fields if field.type_code == 6]
+        self.oid_field_name = oid_fields[0] if oid_fields else None
+
+    def _read_fields(self, buffer):
+        '''
+        Parse the field description section of the table file
+        '''
+
+        version = struct.unpack_from('<i', buffer, 0)[0]
+        if version not in (3, 4):
+            raise ValueError(f'ERROR: unsupported File Geodatabase table version in {self.path}')
+
+        n_fields = struct.unpack_from('<h', buffer, 8)[0]
+        pos = 10
+        fields = []
+
+        for i in range(n_fields):
+            n_chars = buffer[pos]
+            name = buffer[pos + 1:pos + 1 + 2 * n_chars].decode('utf-16-le')
+            pos += 1 + 2 * n_chars
+            n_chars = buffer[pos]
+            alias = buffer[pos + 1:pos + 1 + 2 * n_chars].decode('utf-16-le')
+            pos += 1 + 2 * n_chars
+            type_code = buffer[pos]
+            pos += 1
+
+            if type_code == 4: # string: width, flags, default value
+                flags = buffer[pos + 4]
+                length, pos = read_varuint(buffer, pos + 5)
+                pos += length
+            elif type_code == 7: # geometry: spatial reference, extent and grid sizes
+                flags = buffer[pos + 1]
+                pos = self._skip_geometry_description(buffer, pos + 2)
+            elif type_code == 9:
+                raise ValueError(f'ERROR: raster fields are not supported, found {name} in {self.path}')
+            elif type_code in FIXED_FORMATS: # numbers and dates: width, flags, default value
+                flags = buffer[pos + 1]
+                pos += 3 + buffer[pos + 2]
+            elif type_code in (6, 8, 10, 11, 12): # OBJECTID, binary, GUID, GlobalID and XML: width, flags
+                flags = buffer[pos + 1]
+                pos += 2
+            else: # the size of its values is unknown, so that no field after it can be read
+                raise ValueError(f'ERROR: unsupported field type {type_code} of {name} in {self.path}')
+
+            fields.append(GdbField(name, alias, type_code, bool(flags & 1)))
+
+        return fields
+
+    @staticmethod
+    def _skip_geometry_description(buffer, pos):
+        '''
+        Return the position after the description of a geometry field
+        '''
+
+        wkt_size = struct.unpack_from('<H', buffer, pos)[0]
+        pos += 2 + wkt_size
+        flags = buffer[pos]
+        pos += 1
+
+        # origins and scales: x and y, then m and z if present, then the tolerances
+        n_doubles = 3 + 2 * bool(flags & 2) + 2 * bool(flags & 4)
+        n_doubles += 1 + bool(flags & 2) + bool(flags & 4)
+        pos += 8 * (n_doubles + 4) # including the xy extent
+
+        # optional z and m extents precede a zero byte and the number of grid sizes
+        for extent in range(3):
+            n_grids = struct.unpack_from('<I', buffer, pos + 1)[0]
+            if buffer[pos] == 0 and 1 <= n_grids <= 3:
+                return pos + 5 + 8 * n_grids
+            pos += 16
+
+        raise ValueError('ERROR: could not read the description of the geometry field')
+
+    def _row_offsets(self):
+        '''
+        Return two arrays: the OBJECTID and the offset in the table file of every row
+        that has not been deleted, read from the table index
+        '''
+
+        with open(self.path[:-len('.gdbtable')] + '.gdbtablx', 'rb') as f:
+            buffer = f.read()
+
+        n_blocks, n_rows, offset_size = struct.unpack_from('<iii', buffer, 4)
+        section_end = 16 + n_blocks * 1024 * offset_size
+
+        # offsets are stored as little-endian integers of offset_size bytes
+        raw = np.frombuffer(buffer, dtype=np.uint8, count=section_end - 16, offset=16)
+        padded = np.zeros((n_blocks * 1024, 8), dtype=np.uint8)
+        padded[:, :offset_size] = raw.reshape(-1, offset_size)
+        offsets = padded.view('<u8').ravel()
+
+        # sparse indexes only hold the blocks of 1024 rows flagged in a bitmap
+        if len(buffer) >= section_end + 16:
+            n_bitmap_words, n_bitmap_bits = struct.unpack_from('<ii', buffer, section_end)
+        else:
+            n_bitmap_words, n_bitmap_bits = 0, 0
+
+        if n_bitmap_words:
+            bitmap = buffer[section_end + 16:section_end + 16 + (n_bitmap_bits + 7) // 8]
+            present = [block for block in range(n_bitmap_bits) if bitmap[block >> 3] & (1 << (block & 7))]
+            positions = np.full(n_rows, -1, dtype=np.int64)
+            for section, block in enumerate(present[:n_blocks]):
+                start = block * 1024
+                stop = min(start + 1024, n_rows)
+                if start < n_rows:
+                    positions[start:stop] = np.arange(section * 1024, section * 1024 + stop - start)
+            offsets = np.where(positions >= 0, offsets[np.maximum(positions, 0)], 0)
+        else:
+            offsets = offsets[:n_rows]
+
+        oids = np.flatnonzero(offsets) + 1 # offset 0 marks a deleted row
+
+        return oids, offsets[oids - 1]
+
+    def iter_rows(self, field_names):
+        '''
+        Yield a tuple of values for every row of the table, holding the
+        requested fields in the requested order, like arcpy.da.SearchCursor.
+        Nulls are returned as None.
+
+        ## Arguments ##
+        field_names -- list of the names of the fields to read
+        '''
+
+        by_name = {field.name.lower(): i for i, field in enumerate(self.fields)}
+        missing = [name for name in field_names if name.lower() not in by_name]
+        if missing:
+            raise ValueError(f'ERROR: field(s) {missing} not found in {self.path}')
+
+        positions = [by_name[name.lower()] for name in field_names]
+        n_read = max(positions) + 1 if positions else 0 # stop reading after the last requested field
+        n_null_bytes = (sum(field.nullable for field in self.fields) + 7) // 8
+        fields = self.fields[:n_read]
+        requested = set(positions)
+        wanted = [i in requested for i in range(n_read)] # the other fields are skipped, not decoded
+
+        oids, offsets = self._row_offsets()
+
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for oid, offset in zip(oids.tolist(), offsets.tolist()):
+                values = self._read_row(buffer, offset + 4, oid, fields, n_null_bytes, wanted)
+                yield tuple(values[i] for i in positions)
+
+    @staticmethod
+    def _read_row(buffer, pos, oid, fields, n_null_bytes, wanted):
+        '''
+        Decode the values of the given fields from the row starting at pos.
+        Fields that are not wanted are skipped over, without copying or decoding
+        their values, and returned as None.
+        '''
+
+        null_flags = buffer[pos:pos + n_null_bytes]
+        pos += n_null_bytes
+        i_nullable = 0
+        values = []
+
+        for field in fields:
+            type_code = field.type_code
+
+            if type_code == 6:
+                values.append(oid)
+                continue
+
+            if field.nullable:
+                is_null = null_flags[i_nullable >> 3] & (1 << (i_nullable & 7))
+                i_nullable += 1
+                if is_null:
+                    values.append(None)
+                    continue
+
+            if not wanted[len(values)]:
+                if type_code in FIXED_SIZES:
+                    pos += FIXED_SIZES[type_code]
+                elif type_code in GUID_TYPES:
+                    pos += 16
+                else:
+                    length, pos = read_varuint(buffer, pos)
+                    pos += length
+                values.append(None)
+                continue
+
+            if type_code == 4:
+                length, pos = read_varuint(buffer, pos)
+                values.append(buffer[pos:pos + length].decode('utf-8'))
+                pos += length
+            elif type_code in FIXED_FORMATS:
+                value = struct.unpack_from(FIXED_FORMATS[type_code], buffer, pos)
+                pos += FIXED_SIZES[type_code]
+                values.append(fixed_value(type_code, value))
+            elif type_code in GUID_TYPES:
+                values.append('{' + str(uuid.UUID(bytes_le=bytes(buffer[pos:pos + 16]))).upper() + '}')
+                pos += 16
+            else: # geometry, binary and XML
+                length, pos = read_varuint(buffer, pos)
+                value = buffer[pos:pos + length]
+                values.append(value.decode('utf-8') if type_code == 12 else value)
+                pos += length
+
+        return values
+
+#######################
+#### END OF SCRIPT ####
+#######################
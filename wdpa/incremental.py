@@ -0,0 +1,353 @@
+###################################################################################
+#### RAMBO: a Quality Assurance Tool for the World Database on Protected Areas ####
+#### Python script to run the QA checks incrementally against a previous run  ####
+###################################################################################
+
+'''
+This Python script re-runs the QA checks only where the WDPA changed since a
+previous run, and returns the same result as a full run.
+
+After each run, a QA state can be saved: the WDPA_PID and a hash of each row,
+the values of the fields used to group rows (e.g. WDPAID), and the WDPA_PIDs
+that failed each check. On the next release, the rows are hashed again, and
+compared by WDPA_PID with the state to find added, changed and removed rows:
+- 'row' checks are run on the added and changed rows only;
+- 'group' checks are run on the rows of the groups (e.g. WDPAIDs) holding
+  an added, changed or removed row, in either release;
+- 'table' checks, and checks missing from the state or defined differently
+  (see check_fingerprints), are run on all rows.
+The result of the unchanged rows is taken from the state.
+
+Everything is re-checked if WDPA_PID is not unique in either release, or if
+the reference data (ISO3 values, current year) differ from those of the state.
+'''
+
+#######################
+#### Load packages ####
+#######################
+
+import datetime
+import hashlib
+import inspect
+import json
+import os
+import numpy as np
+import pandas as pd
+from wdpa import qa, reference
+from wdpa.qa import add_message, select_checks
+from wdpa.profiling import log_diagnostics, log_phase, log_rows, log_task, measure_step
+from wdpa.runner import check_positions, check_tasks, execute_checks, load_for_checks, positions_to_result, run_checks
+
+STATE_FORMAT = 2
+
+##################################
+#### 1. QA state of a release ####
+##################################
+
+def row_hashes(wdpa_df, fields):
+    '''
+    Return a uint64 hash of the values of fields in each row of wdpa_df
+    '''
+
+    return pd.util.hash_pandas_object(wdpa_df[fields], index=False).values
+
+def reference_versions():
+    '''
+    Return the versions of the reference data the checks depend on
+    '''
+
+    return {'iso3': reference.iso3_version(), 'year': datetime.date.today().year}
+
+def definition_name(value):
+    '''
+    Return the name of a function of a check definition, or the repr of a value
+    '''
+
+    return f'{value.__module__}.{value.__qualname__}' if callable(value) else repr(value)
+
+def check_fingerprints(checks):
+    '''
+    Return a dictionary of the name of each check and a hash of its definition -
+    its fields, scope, functions and batch argument - and of the source of 
+    wdpa.qa, which holds the rules of the checks (e.g. the valid values of each
+    field): the result of a check saved in a state by another definition of it,
+    or of wdpa.qa, is not reused
+    '''
+
+    source = inspect.getsource(qa)
+    fingerprints = dict()
+    for check in checks:
+        definition = [check['name'], check['fields'], check['scope'], check.get('group_by'),
+                      [definition_name(value) for value in [check['func'], check.get('mask')] + list(check.get('batch') or [])]]
+        content = json.dumps(definition) + source
+        fingerprints[check['name']] = hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    return fingerprints
+
+def qa_state(wdpa_df, checks, result):
+    '''
+    Return the QA state of a run: a dictionary holding the WDPA_PID and row hash of
+    each row, the group fields of the checks, and the WDPA_PIDs that failed each check
+    and its fingerprint (see check_fingerprints).
+
+    ## Arguments ##
+    wdpa_df -- WDPA in pandas DataFrame the checks were run on
+    checks --  list of registered checks that were run
+    result --  result dictionary of the run, e.g. of run_checks(wdpa_df, checks)
+    '''
+
+    fields = [field for field in wdpa_df.columns if field != 'WDPA_PID']
+    group_fields = sorted({check['group_by'] for check in checks if check.get('group_by')})
+    fingerprints = check_fingerprints(checks)
+
+    return {'format': STATE_FORMAT,
+            'references': reference_versions(),
+            'fields': fields,
+            'wdpa_pid': wdpa_df['WDPA_PID'].values,
+            'hash': row_hashes(wdpa_df, fields),
+            'groups': {field: np.asarray(wdpa_df[field].values) for field in group_fields},
+            'checks': {check['name']: {'fields': check['fields'],
+                                       'fingerprint': fingerprints[check['name']],
+                                       'wdpa_pid': (result[check['name']]['WDPA_PID'].values if check['name'] in result
+                                                    else np.array([], dtype=wdpa_df['WDPA_PID'].dtype))}
+                       for check in checks}}
+
+def add_values(arrays, key, values):
+    '''
+    Add values to the arrays saved under key. Text (object) values are saved as
+    strings, with a mask of their nulls under key_null, so that they are loaded
+    without pickle.
+    '''
+
+    values = np.asarray(values)
+    if values.dtype != object:
+        arrays[key] = values
+        return
+
+    nulls = pd.isnull(values)
+    arrays[key] = np.where(nulls, '', values).astype(str)
+    arrays[f'{key}_null'] = nulls
+
+def read_values(arrays, key):
+    '''
+    Return the values saved under key by add_values, with text as objects and nulls as NaN
+    '''
+
+    values = arrays[key]
+    if f'{key}_null' not in arrays.files:
+        return values
+
+    values = values.astype(object)
+    values[arrays[f'{key}_null']] = np.nan
+    return values
+
+def save_state(state, path):
+    '''
+    Save a QA state to a compressed NumPy (.npz) file
+    '''
+
+    meta = {key: state[key] for key in ['format', 'references', 'fields']}
+    meta['groups'] = list(state['groups'])
+    meta['checks'] = [{'name': name, 'fields': check['fields'], 'fingerprint': check['fingerprint']}
+                      for name, check in state['checks'].items()]
+
+    arrays = {'hash': state['hash'], 'meta': np.array(json.dumps(meta))}
+    add_values(arrays, 'wdpa_pid', state['wdpa_pid'])
+    for i, field in enumerate(meta['groups']):
+        add_values(arrays, f'group_{i}', state['groups'][field])
+    for i, check in enumerate(state['checks'].values()):
+        add_values(arrays, f'check_{i}', check['wdpa_pid'])
+
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+def load_state(path):
+    '''
+    Load a QA state saved by save_state. Its arrays hold no objects, so that 
+    they are loaded without pickle, which could run code from the file.
+    '''
+
+    with np.load(path, allow_pickle=False) as arrays:
+        meta = json.loads(str(arrays['meta']))
+        if meta['format'] != STATE_FORMAT:
+            raise ValueError(f'ERROR: {path} is a QA state of format {meta["format"]}, expected {STATE_FORMAT}')
+
+        return {'format': meta['format'],
+                'references': meta['references'],
+                'fields': meta['fields'],
+                'wdpa_pid': read_values(arrays, 'wdpa_pid'),
+                'hash': arrays['hash'],
+                'groups': {field: read_values(arrays, f'group_{i}') for i, field in enumerate(meta['groups'])},
+                'checks': {check['name']: {'fields': check['fields'], 'fingerprint': check['fingerprint'],
+                                           'wdpa_pid': read_values(arrays, f'check_{i}')}
+                           for i, check in enumerate(meta['checks'])}}
+
+###############################################
+#### 2. Run the checks on what has changed ####
+###############################################
+
+def changed_rows(wdpa_df, state):
+    '''
+    Compare wdpa_df with the state of a previous run, by WDPA_PID and row hash.
+    Return a boolean mask of the added or changed rows of wdpa_df,
+    and a boolean mask of the changed or removed rows of the state.
+    '''
+
+    current_hash = row_hashes(wdpa_df, state['fields'])
+    previous = pd.Index(state['wdpa_pid'])
+    matches = previous.get_indexer(wdpa_df['WDPA_PID'].values) # -1 for added rows
+
+    current_changed = matches < 0
+    found = ~current_changed
+    current_changed[found] = current_hash[found] != state['hash'][matches[found]]
+    previous_changed = np.ones(len(previous), dtype=bool) # removed, unless found unchanged below
+    previous_changed[matches[~current_changed]] = False
+
+    return current_changed, previous_changed
+
+def can_run_incremental(wdpa_df, state):
+    '''
+    Return True if the state can be used to run the checks on wdpa_df incrementally
+    '''
+
+    return (state['references'] == reference_versions()
+            and set(state['fields']).issubset(wdpa_df.columns)
+            and not wdpa_df['WDPA_PID'].duplicated().any()
+            and not pd.Index(state['wdpa_pid']).has_duplicates)
+
+def timed_check_positions(wdpa_df, checks, run_log=None, diagnostics=None):
+    '''
+    Return check_positions(wdpa_df, checks, diagnostics=diagnostics), running the
+    checks task by task (see runner.check_tasks) to record the statistics of each
+    task in run_log
+    '''
+
+    positions = dict()
+    for task in check_tasks(checks):
+        task_positions, stats = measure_step(check_positions, wdpa_df, task, True, diagnostics)
+        log_task(run_log, task, stats)
+        positions.update(task_positions)
+
+    return positions
+
+def run_incremental(wdpa_df, checks, state, run_log=None):
+    '''
+    Run the checks on the rows of wdpa_df that changed since the run of state,
+    and return the same result dictionary as run_checks(wdpa_df, checks).
+
+    ## Arguments ##
+    wdpa_df -- WDPA in pandas DataFrame, holding at least the fields of the checks
+    checks --  list of registered checks to be run
+    state --   QA state of a previous run, see qa_state and load_state
+    run_log -- optional run log (see profiling.new_run_log) to record each check in
+
+    ## Example ##
+    run_incremental(wdpa_df, poly_checks, load_state('May2019/WDPA_QA_state_poly.npz'))
+    '''
+
+    if not can_run_incremental(wdpa_df, state):
+        add_message('The previous QA state cannot be used: running all checks on all rows')
+        return run_checks(wdpa_df, checks, run_log)
+
+    current_changed, previous_changed = changed_rows(wdpa_df, state)
+    add_message(f'{np.count_nonzero(current_changed)} rows added or changed, '
+                f'{np.count_nonzero(previous_changed)} rows changed or removed since the previous QA state')
+
+    # Checks are run together on the same rows: 'row' checks on the changed rows, 
+    # 'group' checks on the affected groups, and other checks (None) on all rows,
+    # as are the checks declaring diagnostics, which describe the whole table,
+    # and the checks defined differently in the state
+    fingerprints = check_fingerprints(checks)
+    partitions = dict()
+    for check in checks:
+        if (check['name'] not in state['checks'] or check['scope'] == 'table' or check.get('diagnostics')
+                or state['checks'][check['name']]['fingerprint'] != fingerprints[check['name']]
+                or not set(check['fields']).issubset(state['fields'] + ['WDPA_PID'])):
+            partitions.setdefault(None, []).append(check)
+        else:
+            partitions.setdefault(check.get('group_by') or 'row', []).append(check)
+
+    positions = dict()
+    diagnostics = dict()
+    for partition, partition_checks in partitions.items():
+        add_message('Running:' + ', '.join(check['name'] for check in partition_checks))
+        if partition is None:
+            positions.update(timed_check_positions(wdpa_df, partition_checks, run_log, diagnostics))
+            continue
+
+        if partition == 'row':
+            recheck = current_changed
+        else:
+            # groups holding a changed row, in this release or the previous one
+            affected = wdpa_df[partition].values[current_changed]
+            if partition in state['groups']:
+                affected = np.concatenate([affected, state['groups'][partition][previous_changed]])
+            recheck = wdpa_df[partition].isin(affected).values
+
+        rechecked = np.flatnonzero(recheck)
+        rechecked_positions = timed_check_positions(wdpa_df.iloc[rechecked], partition_checks, run_log)
+
+        # the other rows, and their groups, are unchanged: keep their previous result
+        kept = np.flatnonzero(~recheck)
+        kept_pid = pd.Index(wdpa_df['WDPA_PID'].values[kept])
+        for check in partition_checks:
+            matches = kept_pid.get_indexer(state['checks'][check['name']]['wdpa_pid'])
+            positions[check['name']] = np.sort(np.concatenate([rechecked[rechecked_positions[check['name']]],
+                                                               kept[matches[matches >= 0]]]))
+
+    log_rows(run_log, positions)
+    log_diagnostics(run_log, diagnostics)
+    return positions_to_result(wdpa_df, checks, positions)
+
+def state_file(output_path, datatype):
+    '''
+    Return the path of the QA state saved next to the Excel output of a run
+    '''
+
+    return os.path.join(output_path, f'{datetime.datetime.now().strftime("%d%b%Y")}_WDPA_QA_state_{datatype}.npz')
+
+def load_and_run_incremental(in_fc, checks, input_fields, previous_state=None, state_path=None, selection=None, run_log=None):
+    '''
+    Select the checks, load the fields they need from in_fc, and run them incrementally
+    against the state of a previous run if given, or on all rows otherwise
+    (in parallel if set in the WDPA_QA_WORKERS environment variable).
+    The state of this run is saved to state_path, if given.
+    Return the selected checks and the result dictionary.
+
+    ## Arguments ##
+    in_fc --          feature class attribute table - inside geodatabase - to check
+    checks --         list of registered checks, e.g. poly_checks
+    input_fields --   list of all fields of the table, e.g. INPUT_FIELDS_POLY
+    previous_state -- optional path of the QA state of the previous release
+    state_path --     optional path to save the QA state of this run to
+    selection --      optional list of check names, tags and/or fields to run
+    run_log --        optional run log to record the load and checks phases, and each check
+                      and its diagnostics, in
+
+    ## Example ##
+    checks, result = load_and_run_incremental(in_fc='WDPA_Jun2019_Public.gdb/WDPA_poly_Jun2019',
+                                              checks=poly_checks,
+                                              input_fields=INPUT_FIELDS_POLY,
+                                              previous_state='May2019/WDPA_QA_state_poly.npz',
+                                              state_path='Jun2019/WDPA_QA_state_poly.npz')
+    '''
+
+    checks = select_checks(checks, selection)
+    wdpa_df, stats = measure_step(load_for_checks, in_fc, checks, input_fields, trace_memory=False)
+    log_phase(run_log, 'load', stats, rows=len(wdpa_df), fields=len(wdpa_df.columns))
+
+    incremental = bool(previous_state and os.path.isfile(previous_state))
+    if incremental:
+        result, stats = measure_step(run_incremental, wdpa_df, checks, load_state(previous_state), run_log)
+    else:
+        result, stats = measure_step(execute_checks, wdpa_df, checks, run_log=run_log)
+    log_phase(run_log, 'checks', stats, checks=len(checks), incremental=incremental)
+
+    if state_path:
+        save_state(qa_state(wdpa_df, checks, result), state_path)
+
+    return checks, result
+
+#######################
+#### END OF SCRIPT ####
+#######################
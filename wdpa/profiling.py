@@ -0,0 +1,330 @@
+###################################################################################
+#### RAMBO: a Quality Assurance Tool for the World Database on Protected Areas ####
+#### Python script to measure the time and memory used by the QA steps        ####
+###################################################################################
+
+'''
+This Python script measures wall time and peak memory of the steps of the WDPA QA,
+e.g. loading a feature class attribute table, so that alternative implementations
+can be compared on the same input.
+
+Peak memory is measured with tracemalloc, which traces allocations made through
+Python and NumPy, but not memory allocated internally by arcpy.
+
+Each QA run also keeps a run log (see new_run_log): the wall time, CPU time, peak
+memory and number of rows of each check, and of the load, checks and export phases.
+It is shown in the Summary sheet of the Excel output and saved as JSON next to it.
+The peak memory is the peak resident memory of the process at the end of each step.
+Set the WDPA_QA_TRACE_MEMORY environment variable to 1 to trace the peak memory of
+each check with tracemalloc instead, which slows the checks down by about a fifth;
+the load phase, the export and chunked runs, which tracing slows down the most,
+are never traced.
+'''
+
+#######################
+#### Load packages ####
+#######################
+
+import datetime
+import json
+import os
+import platform
+import math
+import sys
+import threading
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+RUN_LOG_FORMAT = 3
+
+TRACE_ENV_VARIABLE = 'WDPA_QA_TRACE_MEMORY'
+
+################################################
+#### Function: measure time and peak memory ####
+################################################
+
+def measure(func, *args, **kwargs):
+    '''
+    Call func with the given arguments and return its result,
+    together with a dictionary of the wall time (seconds) and
+    the peak memory allocated during the call (MB).
+
+    ## Arguments ##
+    func --     the function to call
+    *args --    positional arguments passed on to func
+    **kwargs -- keyword arguments passed on to func
+
+    ## Example ##
+    wdpa_df, stats = measure(arcgis_table_to_df,
+                             'WDPA_Jun2019_Public.gdb/WDPA_poly_Jun2019',
+                             INPUT_FIELDS_POLY)
+    '''
+
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, 'reset_peak'): # Python 3.9 and later
+        tracemalloc.reset_peak()
+    start_memory = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        seconds = time.perf_counter() - start
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        if not already_tracing:
+            tracemalloc.stop()
+
+    stats = {'seconds': seconds,
+             'peak_mb': max(peak_memory - start_memory, 0) / 1024**2}
+
+    return result, stats
+
+###############################################
+#### Function: compare table loading paths ####
+###############################################
+
+def compare_loaders(in_fc, input_fields, loaders):
+    '''
+    Load the same table with each loader and return a dictionary with,
+    for each loader's name, its load time (seconds) and peak memory (MB).
+
+    ## Arguments ##
+    in_fc --        feature class attribute table to load
+    input_fields -- list of all fields that must be imported from the dataset
+    loaders --      dictionary of loader names and functions taking (in_fc, input_fields)
+
+    ## Example ##
+    compare_loaders(in_fc='WDPA_Jun2019_Public.gdb/WDPA_poly_Jun2019',
+                    input_fields=INPUT_FIELDS_POLY,
+                    loaders={'columnar': qa.arcgis_table_to_df,
+                             'rows': qa.arcgis_table_to_df_rows})
+    '''
+
+    report = dict()
+    for name, loader in loaders.items():
+        wdpa_df, stats = measure(loader, in_fc, input_fields)
+        stats['rows'] = len(wdpa_df)
+        report[name] = stats
+        del wdpa_df # release the table before the next loader runs
+
+    return report
+
+#################################
+#### Run log of the QA steps ####
+#################################
+
+def peak_memory_mb():
+    '''
+    Return the peak resident memory of the process so far (MB): the peak
+    working set on Windows, the maximum resident set size elsewhere.
+    Return None if it cannot be read.
+    '''
+
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD),
+                        ('PageFaultCount', wintypes.DWORD)] + [
+                       (name, ctypes.c_size_t) for name in ['PeakWorkingSetSize', 'WorkingSetSize',
+                                                            'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                                                            'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                                                            'PagefileUsage', 'PeakPagefileUsage']]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+        get_current_process.restype = wintypes.HANDLE
+        get_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_memory_info.argtypes = [wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD]
+        if not get_memory_info(get_current_process(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize / 1024**2
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024 # bytes on macOS, kilobytes on Linux
+
+def trace_memory_default():
+    '''
+    Return True if the WDPA_QA_TRACE_MEMORY environment variable asks for
+    the peak memory of the steps to be traced with tracemalloc
+    '''
+
+    return os.environ.get(TRACE_ENV_VARIABLE, '').strip().lower() in ('1', 'true', 'yes')
+
+# Peak traced memory of the steps being measured, innermost last, by thread:
+# tracemalloc keeps a single peak, which each step resets
+_step_peaks = threading.local()
+
+def measure_step(func, *args, trace_memory=None, **kwargs):
+    '''
+    Call func with the given arguments and return its result, together with
+    a dictionary of the wall time (seconds), the CPU time of the process
+    (cpu_seconds) and the peak memory (peak_mb).
+    Untraced, peak_mb is the peak resident memory of the process at the end
+    of the call (see peak_memory_mb). Traced, it is the peak memory allocated
+    during the call, as measure gives it: steps can be nested, and the peak of
+    a step includes that of the steps it runs. Steps traced in several threads
+    at once reset the peak of each other, and should not be traced.
+
+    ## Arguments ##
+    func --         the function to call
+    *args --        positional arguments passed on to func
+    trace_memory -- True to trace allocations with tracemalloc; defaults to
+                    the WDPA_QA_TRACE_MEMORY environment variable
+    **kwargs --     keyword arguments passed on to func
+
+    ## Example ##
+    positions, stats = measure_step(check_positions, wdpa_df, [check])
+    '''
+
+    if trace_memory is None:
+        trace_memory = trace_memory_default()
+
+    if not trace_memory:
+        start = time.perf_counter()
+        start_cpu = time.process_time()
+        result = func(*args, **kwargs)
+        return result, {'seconds': time.perf_counter() - start,
+                        'cpu_seconds': time.process_time() - start_cpu,
+                        'peak_mb': peak_memory_mb()}
+
+    peaks = _step_peaks.__dict__.setdefault('stack', [])
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    start_memory, peak = tracemalloc.get_traced_memory()
+    if hasattr(tracemalloc, 'reset_peak'): # Python 3.9 and later; the peak since tracing started otherwise
+        if peaks:
+            peaks[-1] = max(peaks[-1], peak)
+        tracemalloc.reset_peak()
+    peaks.append(start_memory)
+
+    start = time.perf_counter()
+    start_cpu = time.process_time()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        seconds = time.perf_counter() - start
+        cpu_seconds = time.process_time() - start_cpu
+        peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if peaks:
+            peaks[-1] = max(peaks[-1], peak)
+        if not already_tracing:
+            tracemalloc.stop()
+
+    stats = {'seconds': seconds,
+             'cpu_seconds': cpu_seconds,
+             'peak_mb': max(peak - start_memory, 0) / 1024**2}
+
+    return result, stats
+
+def new_run_log(datatype, in_fc):
+    '''
+    Return an empty run log for the QA of in_fc: a dictionary with the statistics
+    of each phase ('load', 'checks', 'export') and of each check, filled in by
+    load_and_run_incremental and output_errors_to_excel
+
+    ## Arguments ##
+    datatype -- a string specifying the input type: e.g. point or poly
+    in_fc --    feature class attribute table - inside geodatabase - that is checked
+    '''
+
+    return {'format': RUN_LOG_FORMAT,
+            'datatype': datatype,
+            'input': in_fc,
+            'memory_traced': trace_memory_default(),
+            'started': datetime.datetime.now().isoformat(timespec='seconds'),
+            'environment': {'python': platform.python_version(),
+                            'pandas': pd.__version__,
+                            'numpy': np.__version__,
+                            'platform': platform.platform(),
+                            'cpus': os.cpu_count()},
+            'phases': dict(),
+            'checks': dict()}
+
+def log_phase(run_log, phase, stats, **extra):
+    '''
+    Record the statistics of a phase of the run, e.g. 'load', with extra
+    values such as the number of rows loaded. Nothing is done if run_log is None.
+    '''
+
+    if run_log is not None:
+        run_log['phases'][phase] = dict(stats, **extra)
+
+def log_task(run_log, task, stats):
+    '''
+    Record the statistics of a task - checks run together, e.g. sharing a batch
+    function - for each of its checks. They cannot be told apart within a task:
+    checks_timed_together gives the number of checks sharing the statistics.
+    '''
+
+    if run_log is None:
+        return
+    for check in task:
+        run_log['checks'][check['name']] = dict(stats, checks_timed_together=len(task))
+
+def log_diagnostics(run_log, diagnostics):
+    '''
+    Record the diagnostics of each check that declares them, e.g. the statistics 
+    of the area ratios (see runner.check_diagnostics), after the checks are run
+    '''
+
+    if run_log is None:
+        return
+    for name, values in diagnostics.items():
+        run_log['checks'].setdefault(name, dict())['diagnostics'] = values
+
+def log_rows(run_log, positions):
+    '''
+    Record the number of rows with errors of each check, given the positions of these rows
+    '''
+
+    if run_log is None:
+        return
+    for name, check_positions in positions.items():
+        run_log['checks'].setdefault(name, dict())['rows'] = int(len(check_positions))
+
+def run_log_file(output_path, datatype):
+    '''
+    Return the path of the run log saved next to the Excel output of a run
+    '''
+
+    return os.path.join(output_path, f'{datetime.datetime.now().strftime("%d%b%Y")}_WDPA_QA_run_log_{datatype}.json')
+
+def json_values(value):
+    '''
+    Return value with the NaN and infinite floats it holds, e.g. the mean of
+    the area ratios of an empty table, replaced by None (null in JSON)
+    '''
+
+    if isinstance(value, dict):
+        return {key: json_values(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_values(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+
+    return value
+
+def write_run_log(run_log, path):
+    '''
+    Write the run log to a JSON file, valid JSON without NaN
+    '''
+
+    with open(path, 'w') as f:
+        json.dump(json_values(run_log), f, indent=2, allow_nan=False)
+
+#######################
+#### END OF SCRIPT ####
+#######################
@@ -43,10 +43,31 @@ In this document, we use:
 
 import numpy as np
 import pandas as pd
-import arcpy
 import datetime
+import itertools
 import os
 import re
+import sys
+from wdpa import gdb, reference
+
+# arcpy is only available with ArcGIS; without it, tables are read by the File Geodatabase reader in wdpa.gdb.
+# Importing arcpy takes several seconds, so it is only imported by load_arcpy, when an ArcGIS table is opened.
+_arcpy = None
+
+def load_arcpy():
+    '''
+    Import arcpy on first use and return it, or return None if arcpy is not available
+    '''
+
+    global _arcpy
+    if _arcpy is None:
+        try:
+            import arcpy
+        except ImportError:
+            arcpy = False
+        _arcpy = arcpy
+
+    return _arcpy or None
 
 #### Load fields present in the WDPA tables ####
 
@@ -80,11 +101,18 @@ INPUT_FIELDS_META = ['METADATAID','DATA_TITLE','RESP_PARTY','VERIFIER','YEAR',
 
 # Use this for the Polygons, Points, and the Source Table
 
-# Source: https://gist.github.com/d-wasserman/e9c98be1d0caebc2935afecf0ba239a0
-def arcgis_table_to_df(in_fc, input_fields, query=''):
+# ArcGIS field types and the NumPy dtype each column is built with.
+# Integer fields holding nulls are widened to float64, as pandas would do.
+FLOAT_FIELD_TYPES = ['Double', 'Single']
+INTEGER_FIELD_TYPES = ['OID', 'Integer', 'SmallInteger', 'BigInteger']
+
+def arcgis_table_to_df(in_fc, input_fields, query='', batch_size=50000):
     '''
     Function will convert an arcgis table into a pandas DataFrame with an OBJECTID index, and the selected
-    input fields using an arcpy.da.SearchCursor.
+    input fields. Rows are read with an arcpy.da.SearchCursor in batches of batch_size and each batch
+    is transposed straight into typed NumPy columns, so the full table of row tuples is never held in memory.
+    Empty strings are set to np.nan while each column is built.
+    If arcpy is not available, the table is read with gdb_table_to_df instead.
     For in_fc, specify the name of the geodatabase (.gdb) and feature class attribute table
     
     ## Arguments ##
@@ -92,6 +120,7 @@ def arcgis_table_to_df(in_fc, input_fields, query=''):
              Specify: <nameOfGeodatabase>/<nameOfFeatureClassAttributeTable>
     input_fields -- list of all fields that must be imported from the dataset
     query -- optional where_clause of arcpy.da.SearchCursor. Leave default for normal usage.
+    batch_size -- number of rows transposed into columns at a time
 
     ## Example ##
     arcgis_table_to_df(in_fc='WDPA_Jun2019_Public.gdb/WDPA_Jun2019_errortest',
@@ -99,6 +128,182 @@ def arcgis_table_to_df(in_fc, input_fields, query=''):
     query='')
     '''
 
+    arcpy = load_arcpy()
+    if arcpy is None:
+        return gdb_table_to_df(in_fc, input_fields, query, batch_size)
+
+    OIDFieldName = arcpy.Describe(in_fc).OIDFieldName # obtain OBJECTID field.
+    final_fields = [OIDFieldName] + input_fields # Make a list of all fields that need to be extracted
+    field_types = {field.name: field.type for field in arcpy.ListFields(in_fc)} # obtain the type of each field
+
+    with arcpy.da.SearchCursor(in_fc, final_fields, where_clause=query) as cursor:
+        columns = rows_to_columns(cursor, final_fields, [field_types.get(field) for field in final_fields], batch_size)
+
+    index = pd.Index(columns.pop(OIDFieldName), name=OIDFieldName) # set OBJECTID as index, but no longer use it as column
+    
+    return pd.DataFrame(columns, index=index, columns=input_fields)
+
+def gdb_table_to_df(in_fc, input_fields, query='', batch_size=50000):
+    '''
+    Function will convert a File Geodatabase table into a pandas DataFrame with an OBJECTID index, 
+    and the selected input fields, without arcpy. Only the requested fields are decoded from the 
+    .gdbtable file, and the result is the same DataFrame as returned by arcgis_table_to_df.
+
+    ## Arguments ##
+    in_fc -- table inside a File Geodatabase to import.
+             Specify: <nameOfGeodatabase>/<nameOfFeatureClassAttributeTable>
+    input_fields -- list of all fields that must be imported from the dataset
+    query -- where_clauses are not supported without arcpy; leave default
+    batch_size -- number of rows transposed into columns at a time
+
+    ## Example ##
+    gdb_table_to_df(in_fc='tests/data.gdb/test',
+    input_fields=INPUT_FIELDS_POLY)
+    '''
+
+    if query:
+        raise ValueError('ERROR: a query can only be applied to a table read with arcpy')
+
+    table = gdb.open_table(in_fc)
+    field_types = {field.name: field.type for field in table.fields} # obtain the type of each field
+    final_fields = [table.oid_field_name] + input_fields # Make a list of all fields that need to be extracted
+
+    columns = rows_to_columns(table.iter_rows(final_fields), final_fields, 
+                              [field_types.get(field) for field in final_fields], batch_size)
+    index = pd.Index(columns.pop(table.oid_field_name), name=table.oid_field_name)
+
+    return pd.DataFrame(columns, index=index, columns=input_fields)
+
+def arcgis_table_chunks(in_fc, input_fields, chunk_rows=50000):
+    '''
+    Yield the table in chunks of chunk_rows rows, in OBJECTID order, each as the DataFrame 
+    arcgis_table_to_df would return for these rows, so that the whole table is never held 
+    in memory (see wdpa/chunked.py). If arcpy is not available, the rows are read from the 
+    .gdbtable file instead. Integer fields are float64 in the chunks holding nulls, and 
+    int64 in the others.
+
+    ## Arguments ##
+    in_fc -- feature class attribute table - inside geodatabase - to import. 
+             Specify: <nameOfGeodatabase>/<nameOfFeatureClassAttributeTable>
+    input_fields -- list of all fields that must be imported from the dataset
+    chunk_rows -- number of rows of each chunk
+
+    ## Example ##
+    for chunk_df in arcgis_table_chunks(in_fc='tests/data.gdb/test', input_fields=INPUT_FIELDS_POLY, chunk_rows=10):
+        print(len(chunk_df))
+    '''
+
+    arcpy = load_arcpy()
+    if arcpy is None:
+        table = gdb.open_table(in_fc)
+        field_types = {field.name: field.type for field in table.fields} # obtain the type of each field
+        final_fields = [table.oid_field_name] + input_fields
+        for chunk_df in rows_to_chunks(table.iter_rows(final_fields), final_fields, 
+                                       [field_types.get(field) for field in final_fields], chunk_rows):
+            yield chunk_df
+        return
+
+    OIDFieldName = arcpy.Describe(in_fc).OIDFieldName # obtain OBJECTID field.
+    final_fields = [OIDFieldName] + input_fields
+    field_types = {field.name: field.type for field in arcpy.ListFields(in_fc)}
+
+    with arcpy.da.SearchCursor(in_fc, final_fields, sql_clause=(None, f'ORDER BY {OIDFieldName}')) as cursor:
+        for chunk_df in rows_to_chunks(cursor, final_fields, [field_types.get(field) for field in final_fields], chunk_rows):
+            yield chunk_df
+
+def rows_to_chunks(rows, fields, field_types, chunk_rows=50000):
+    '''
+    Yield DataFrames of chunk_rows rows of an iterable of row tuples, indexed by 
+    their first field (OBJECTID), with typed NumPy columns (see rows_to_columns)
+
+    ## Arguments ##
+    rows --        iterable of row tuples, e.g. an arcpy.da.SearchCursor
+    fields --      list of field names, in the order of the values in each row, OBJECTID first
+    field_types -- list of ArcGIS field types (e.g. 'Double', 'String'), one per field
+    chunk_rows --  number of rows of each chunk
+    '''
+
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, chunk_rows))
+        if not batch:
+            break
+        columns = rows_to_columns(batch, fields, field_types, chunk_rows)
+        index = pd.Index(columns.pop(fields[0]), name=fields[0])
+        yield pd.DataFrame(columns, index=index, columns=fields[1:])
+
+def rows_to_columns(rows, fields, field_types, batch_size=50000):
+    '''
+    Transpose an iterable of row tuples into a dictionary of typed NumPy columns, 
+    one batch of rows at a time.
+
+    ## Arguments ##
+    rows --        iterable of row tuples, e.g. an arcpy.da.SearchCursor
+    fields --      list of field names, in the order of the values in each row
+    field_types -- list of ArcGIS field types (e.g. 'Double', 'String'), one per field
+    batch_size --  number of rows held as tuples at any one time
+
+    ## Example ##
+    rows_to_columns(rows=[(1, 'A'), (2, '')],
+                    fields=['OBJECTID', 'NAME'],
+                    field_types=['OID', 'String'])
+    '''
+
+    chunks = [[] for field in fields]
+    rows = iter(rows)
+
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        for chunk, values, field_type in zip(chunks, zip(*batch), field_types):
+            chunk.append(values_to_column(values, field_type))
+
+    columns = dict()
+    for field, chunk, field_type in zip(fields, chunks, field_types):
+        # np.concatenate widens integer chunks to float64 if any chunk held nulls
+        columns[field] = np.concatenate(chunk) if chunk else values_to_column((), field_type)
+
+    return columns
+
+def values_to_column(values, field_type):
+    '''
+    Convert a sequence of values of a single field to a typed NumPy array.
+    Nulls become np.nan in numeric columns; empty strings become np.nan in text columns.
+
+    ## Arguments ##
+    values --     sequence of values read from one field
+    field_type -- ArcGIS field type of the values, e.g. 'Double', 'Integer' or 'String'
+    '''
+
+    if field_type in FLOAT_FIELD_TYPES:
+        return np.array(values, dtype='float64') # None is converted to np.nan
+
+    if field_type in INTEGER_FIELD_TYPES:
+        try:
+            return np.array(values, dtype='int64') # directly, as BigInteger values do not all fit in a float64
+        except (TypeError, ValueError):
+            return np.array(values, dtype='float64') # float64 to hold the nulls
+
+    column = np.array(values, dtype=object)
+    column[column == ''] = np.nan # set '' to np.nan
+
+    return column
+
+# Source: https://gist.github.com/d-wasserman/e9c98be1d0caebc2935afecf0ba239a0
+def arcgis_table_to_df_rows(in_fc, input_fields, query=''):
+    '''
+    Previous row-tuple loader, kept to compare load time and memory with arcgis_table_to_df.
+    Function will convert an arcgis table into a pandas DataFrame with an OBJECTID index, and the selected
+    input fields using an arcpy.da.SearchCursor.
+
+    ## Arguments ##
+    in_fc -- feature class attribute table - inside geodatabase - to import. 
+    input_fields -- list of all fields that must be imported from the dataset
+    query -- optional where_clause of arcpy.da.SearchCursor. Leave default for normal usage.
+    '''
+
+    arcpy = load_arcpy()
     OIDFieldName = arcpy.Describe(in_fc).OIDFieldName # obtain OBJECTID field.
     final_fields = [OIDFieldName] + input_fields # Make a list of all fields that need to be extracted
     data = [row for row in arcpy.da.SearchCursor(in_fc,final_fields,where_clause=query)] # for all fields, obtain all rows
@@ -113,11 +318,26 @@ def arcgis_table_to_df(in_fc, input_fields, query=''):
 ##### 1.1 Obtain allowed ISO3 values ####
 #########################################
 
-# Download from GitHub and store in a pandas DataFrame
-column_with_iso3 = ['alpha-3']
-url = 'https://raw.githubusercontent.com/lukes/ISO-3166-Countries-with-Regional-Codes/master/all/all.csv'
-iso3_df = pd.read_csv(url, usecols = column_with_iso3)
-iso3 = np.append(iso3_df['alpha-3'].values, 'ABNJ')
+# The allowed ISO3 values (ISO 3166-1 alpha-3 codes and 'ABNJ') are bundled with the tool,
+# in wdpa/data/iso3.csv, and read by reference.iso3_codes() when first needed.
+# See wdpa/reference.py to update them.
+
+###################################################
+#### 1.2. Report progress to ArcGIS or console ####
+###################################################
+
+def add_message(message):
+    '''
+    Show message in the ArcGIS geoprocessing messages if arcpy has been imported,
+    e.g. when run as an ArcGIS script tool, or print it to the console otherwise.
+    arcpy is not imported just to show a message.
+    '''
+
+    arcpy = sys.modules.get('arcpy')
+    if arcpy is None:
+        print(message)
+    else:
+        arcpy.AddMessage(message)
 
 #######################################
 #### 2. Utility & hardcoded checks ####
@@ -145,6 +365,18 @@ def find_wdpa_rows(wdpa_df, wdpa_pid):
     
     return wdpa_df[wdpa_df['WDPA_PID'].isin(wdpa_pid)]
 
+def mask_to_pid(wdpa_df, invalid):
+    '''
+    Return the WDPA_PIDs of the rows selected by invalid:
+    a boolean row mask, or an array of row positions
+
+    ## Arguments ##
+    wdpa_df -- wdpa DataFrame
+    invalid -- boolean array of len(wdpa_df), or array of row positions
+    '''
+
+    return wdpa_df['WDPA_PID'].values[invalid]
+
 #######################################
 #### 2.1. Find duplicate WDPA_PIDs ####
 #######################################
@@ -166,75 +398,532 @@ def duplicate_wdpa_pid(wdpa_df, return_pid=False):
 #### 2.2. Invalid: MARINE designation based on GIS_AREA and GIS_M_AREA ####
 ###########################################################################
 
-def area_invalid_marine(wdpa_df, return_pid=False):
+def area_invalid_marine_mask(wdpa_df):
     '''
     Assign a new 'MARINE' value based on GIS calculations, called marine_GIS_value
-    Return True if marine_GIS_value is unequal to MARINE
-    Return list of WDPA_PIDs where MARINE is invalid, if return_pid is set True
+    Return a boolean row mask, True where marine_GIS_value is unequal to MARINE
     '''
     
     # set min and max for 'coastal' designation (MARINE = 1)
     coast_min = 0.1
     coast_max = 0.9
     
-    # create new column with proportion marine vs total GIS area 
-    wdpa_df['marine_GIS_proportion'] = wdpa_df['GIS_M_AREA'] / wdpa_df['GIS_AREA']
-    
-    def assign_marine_gis_value(wdpa_df):
-        if wdpa_df['marine_GIS_proportion'] <= coast_min:
-            return '0'
-        elif coast_min < wdpa_df['marine_GIS_proportion'] < coast_max:
-            return '1'
-        elif wdpa_df['marine_GIS_proportion'] >= coast_max:
-            return '2'
+    # proportion marine vs total GIS area; NaN if either area is missing or both are 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        marine_gis_proportion = wdpa_df['GIS_M_AREA'].values / wdpa_df['GIS_AREA'].values
     
-    # calculate the marine_value
-    wdpa_df['marine_GIS_value'] = wdpa_df.apply(assign_marine_gis_value, axis=1)
-    
-    # find invalid WDPA_PIDs
-    invalid_wdpa_pid = wdpa_df[wdpa_df['marine_GIS_value'] != wdpa_df['MARINE']]['WDPA_PID'].values
+    # bin the proportion into the marine_GIS_value: 0, 1 or 2; -1 if the proportion is NaN
+    marine_gis_value = np.select([marine_gis_proportion <= coast_min,
+                                  marine_gis_proportion < coast_max,
+                                  marine_gis_proportion >= coast_max],
+                                 [0, 1, 2], default=-1)
+    marine_gis_value = np.array(['0', '1', '2', None], dtype=object)[marine_gis_value] # -1 takes None
+
+    # find invalid WDPA_PIDs: MARINE differs from marine_GIS_value, or either is missing
+    marine = np.asarray(wdpa_df['MARINE'], dtype=object)
+    return pd.isna(marine) | pd.isna(marine_gis_value) | (marine_gis_value != marine)
+
+def area_invalid_marine(wdpa_df, return_pid=False):
+    '''
+    Return True if the MARINE value based on GIS calculations is unequal to MARINE
+    Return list of WDPA_PIDs where MARINE is invalid, if return_pid is set True
+    '''
+
+    invalid_wdpa_pid = mask_to_pid(wdpa_df, area_invalid_marine_mask(wdpa_df))
     
     if return_pid:
         return invalid_wdpa_pid
     
     return len(invalid_wdpa_pid) > 0
 
-############################################
-#### 2.3. Invalid: GIS_AREA >> REP_AREA ####
-############################################
+################################################################
+#### Area ratios: statistics of the 'too large' area checks ####
+################################################################
 
-def area_invalid_too_large_gis(wdpa_df, return_pid=False):
+# Maximum allowed absolute difference between a GIS and a reported area (in km²)
+MAX_ALLOWED_SIZE_DIFF_KM2 = 50
+
+# Relative sizes above this (or below 0) are outliers, left out of the mean and stdev
+MAX_RELATIVE_SIZE = 100
+
+# Area fields of the 'too large' checks, and the field each is compared to
+AREA_RATIO_FIELDS = {'GIS_AREA': 'REP_AREA',
+                     'REP_AREA': 'GIS_AREA',
+                     'GIS_M_AREA': 'REP_M_AREA',
+                     'REP_M_AREA': 'GIS_M_AREA'}
+
+# Robust thresholds of the relative sizes by group: median + AREA_ROBUST_K * MAD_SCALE * MAD,
+# the scaled MAD (median absolute deviation) estimating the stdev of normally distributed values
+AREA_ROBUST_K = 3
+MAD_SCALE = 1.4826
+
+# Groups with fewer relative sizes than this, or a MAD of 0, use the robust threshold of the whole table
+AREA_MIN_GROUP_ROWS = 30
+
+# Set to the fields to group the relative sizes by, e.g. 'ISO3' or 'ISO3,DESIG_ENG', for robust
+# thresholds by group rather than the mean + 2 * stdev of the whole table
+AREA_GROUPS_ENV_VARIABLE = 'WDPA_QA_AREA_GROUPS'
+
+# Fields the relative sizes can be grouped by
+AREA_GROUP_FIELDS = ['ISO3', 'DESIG_ENG']
+
+def area_group_fields():
     '''
-    Return True if GIS_AREA is too large compared to REP_AREA - based on thresholds specified below.
-    Return list of WDPA_PIDs where GIS_AREA is too large compared to REP_AREA, if return_pid=True
+    Return the fields set in the WDPA_QA_AREA_GROUPS environment variable as a
+    tuple, or an empty tuple (thresholds of the whole table) if it is not set.
+    It is read when the area checks are selected (see select_checks) and run,
+    so that an invalid value fails the run rather than the import of this module.
+    '''
+
+    value = os.environ.get(AREA_GROUPS_ENV_VARIABLE) or ''
+    group_by = tuple(field.strip().upper() for field in value.split(',') if field.strip())
+    unknown = [field for field in group_by if field not in AREA_GROUP_FIELDS]
+    if unknown:
+        raise ValueError(f'ERROR: {AREA_GROUPS_ENV_VARIABLE} holds unknown field(s) {unknown}, '
+                         f'expected any of {AREA_GROUP_FIELDS}')
+
+    return group_by
+
+def robust_thresholds(relative_size, in_stats, group_codes, group_index):
+    '''
+    Return the robust threshold of the relative size of each row: 
+    median + AREA_ROBUST_K * MAD_SCALE * MAD of the relative sizes of its group,
+    outliers excluded (in_stats). Groups with fewer than AREA_MIN_GROUP_ROWS 
+    relative sizes, or a MAD of 0, use the threshold of the whole table.
+
+    The medians and MADs of all groups are computed together, by a groupby on 
+    the group codes, and taken to the rows by indexing with their group code.
+    Also return a DataFrame of the statistics of each group, for audit: the
+    fields of group_index, ROWS, MEDIAN, MAD, THRESHOLD and FALLBACK (True if 
+    the group uses the threshold of the whole table), and a dictionary of the 
+    median, MAD and threshold of the whole table.
+
+    ## Arguments ##
+    relative_size -- float array of the relative size of each row
+    in_stats --      boolean row mask of the relative sizes that are not outliers
+    group_codes --   integer array of the group of each row, 0 to len(group_index) - 1
+    group_index --   pandas Index of the values of the grouping fields of each group
+    '''
+
+    values = relative_size[in_stats]
+    codes = group_codes[in_stats]
+    n_groups = len(group_index)
+
+    # Threshold of the whole table
+    median = np.median(values) if values.size > 0 else np.nan
+    mad = np.median(np.abs(values - median)) if values.size > 0 else np.nan
+    table_threshold = median + AREA_ROBUST_K * MAD_SCALE * mad
+
+    # Median and MAD of each group
+    group_rows = np.bincount(codes, minlength=n_groups)
+    group_median = np.full(n_groups, np.nan)
+    group_mad = np.full(n_groups, np.nan)
+    if values.size > 0:
+        medians = pd.Series(values).groupby(codes).median()
+        group_median[medians.index.values] = medians.values
+        deviations = pd.Series(np.abs(values - group_median[codes])).groupby(codes).median()
+        group_mad[deviations.index.values] = deviations.values
+
+    with np.errstate(invalid='ignore'):
+        fallback = (group_rows < AREA_MIN_GROUP_ROWS) | ~(group_mad > 0)
+    group_threshold = np.where(fallback, table_threshold, group_median + AREA_ROBUST_K * MAD_SCALE * group_mad)
+
+    thresholds = pd.DataFrame({'ROWS': group_rows, 'MEDIAN': group_median, 'MAD': group_mad,
+                               'THRESHOLD': group_threshold, 'FALLBACK': fallback},
+                              index=group_index, columns=['ROWS', 'MEDIAN', 'MAD', 'THRESHOLD', 'FALLBACK']).reset_index()
+
+    return group_threshold[group_codes], thresholds, {'median': float(median), 'mad': float(mad), 'max_relative_size': float(table_threshold)}
+
+def area_ratios(wdpa_df, large_fields):
+    '''
+    Return a dictionary with, for each area field, a dictionary of the float 
+    arrays 'relative_size', (REP + GIS area) / compared area, and 'abs_diff', 
+    the absolute difference of the areas, and of the boolean arrays 
+    'zero_compared_area' and 'in_stats', of rows whose relative size is not 
+    an outlier (see area_ratio_stats). The sum and the absolute difference of 
+    two areas are computed once for both fields of a pair, e.g. GIS_AREA and 
+    REP_AREA.
+
+    ## Arguments ##
+    large_fields -- list of the area fields to check for being too large
+    '''
+
+    pairs = dict()
+    ratios = dict()
+    for large_field in large_fields:
+        small_field = AREA_RATIO_FIELDS[large_field]
+        large = np.asarray(wdpa_df[large_field].values, dtype=np.float64)
+        small = np.asarray(wdpa_df[small_field].values, dtype=np.float64)
+
+        # Sum and absolute difference of the areas, shared by both fields of a pair
+        pair = tuple(sorted([large_field, small_field]))
+        if pair not in pairs:
+            area_sum = np.add(large, small)
+            abs_diff = np.subtract(large, small)
+            np.abs(abs_diff, out=abs_diff)
+            pairs[pair] = (area_sum, abs_diff)
+        area_sum, abs_diff = pairs[pair]
+
+        with np.errstate(invalid='ignore'):
+            # Relative size: divide only where the compared area is not 0
+            has_sum = ~np.isnan(area_sum)
+            divisible = has_sum & (small != 0)
+            relative_size = np.full(len(area_sum), np.nan)
+            np.divide(area_sum, small, out=relative_size, where=divisible)
+            zero_compared_area = has_sum & (small == 0) & (area_sum != 0)
+            relative_size[zero_compared_area] = np.copysign(np.inf, area_sum[zero_compared_area])
+
+            # Relative sizes without outliers
+            in_stats = (relative_size >= 0) & (relative_size <= MAX_RELATIVE_SIZE)
+
+        ratios[large_field] = {'relative_size': relative_size,
+                               'abs_diff': abs_diff,
+                               'zero_compared_area': zero_compared_area,
+                               'in_stats': in_stats}
+
+    return ratios
+
+def area_ratio_stats(wdpa_df, large_fields, group_by=()):
+    '''
+    Compute the statistics of the 'too large' area checks once for several 
+    area fields (see AREA_RATIO_FIELDS), in float arrays: 
+    - the relative size of each row, (REP + GIS area) / compared area 
+      (see area_ratios)
+    - the mean and stdev of the relative sizes, outliers excluded, and the 
+      maximum allowed relative size: mean + 2 * stdev
+    - the boolean row mask of rows whose relative size is above the maximum,
+      and whose areas differ by more than MAX_ALLOWED_SIZE_DIFF_KM2
+
+    If group_by fields are given, e.g. ('ISO3',), the maximum of each row is 
+    instead the robust threshold of its group (see robust_thresholds), so that
+    countries or designations whose areas are reported differently are not
+    all flagged. Null values of these fields form their own group.
+
+    Division by zero is handled explicitly: if the compared area is 0, the 
+    relative size is infinite (and so flagged if the areas differ enough), 
+    unless both areas are 0, when it is undefined (NaN) like for null areas. 
+    Infinite and undefined relative sizes are left out of the mean and stdev.
+    If fewer than two relative sizes remain, the maximum is undefined and no
+    rows are flagged.
+
+    Return a dictionary with, for each field, a dictionary of the arrays 
+    'relative_size', 'abs_diff' and 'invalid', and of the statistics 'mean', 
+    'std', 'max_relative_size', 'rows_in_stats', 'outliers', 'zero_compared_area'
+    and 'undefined' (see area_ratio_diagnostics). With group_by, 'mean' and
+    'std' are replaced by the 'median' and 'mad' of the whole table, and the
+    array 'threshold' of each row and the DataFrame 'group_thresholds' are added.
+
+    ## Arguments ##
+    large_fields -- list of the area fields to check for being too large
+    group_by --     optional fields to compute robust thresholds by, e.g. ('ISO3', 'DESIG_ENG')
+
+    ## Example ##
+    area_ratio_stats(
+        wdpa_df=wdpa_df,
+        large_fields=['GIS_AREA', 'REP_AREA'])
+    '''
+
+    # Group of each row, shared by all fields
+    if group_by:
+        grouped = wdpa_df[list(group_by)].fillna('').groupby(list(group_by), sort=True)
+        group_codes = grouped.ngroup().values
+        group_index = grouped.size().index
+
+    stats = dict()
+    for large_field, ratios in area_ratios(wdpa_df, large_fields).items():
+        relative_size, abs_diff, in_stats = ratios['relative_size'], ratios['abs_diff'], ratios['in_stats']
+        rows_in_stats = int(in_stats.sum())
+
+        with np.errstate(invalid='ignore'):
+            if group_by:
+                # Robust threshold of the group of each row
+                threshold, group_thresholds, field_stats = robust_thresholds(relative_size, in_stats, group_codes, group_index)
+                field_stats.update(group_by=','.join(group_by), groups=len(group_index),
+                                   fallback_groups=int(group_thresholds['FALLBACK'].sum()))
+            else:
+                # Mean and stdev of the whole table
+                values = relative_size[in_stats]
+                mean = values.mean() if values.size > 0 else np.nan
+                std = values.std(ddof=1) if values.size > 1 else np.nan
+                threshold = mean + 2 * std
+                field_stats = {'mean': float(mean), 'std': float(std), 'max_relative_size': float(threshold)}
+
+            invalid = (relative_size > threshold) & (abs_diff > MAX_ALLOWED_SIZE_DIFF_KM2)
+
+        undefined = int(np.isnan(relative_size).sum())
+        field_stats.update(relative_size=relative_size,
+                           abs_diff=abs_diff,
+                           invalid=invalid,
+                           rows_in_stats=rows_in_stats,
+                           outliers=int(len(relative_size) - undefined - rows_in_stats),
+                           zero_compared_area=int(ratios['zero_compared_area'].sum()),
+                           undefined=undefined)
+        if group_by:
+            field_stats.update(threshold=threshold, group_thresholds=group_thresholds)
+        stats[large_field] = field_stats
+
+    return stats
+
+def area_ratio_stats_by_argument(wdpa_df, arguments):
+    '''
+    Return a dictionary with, for each argument of the batch and diagnostics 
+    functions of the area checks, the statistics of area_ratio_stats. An argument is a 
+    large_field, grouped by the fields set in WDPA_QA_AREA_GROUPS (see 
+    area_group_fields), or a tuple (large_field, group_by).
+    The fields sharing a group_by are computed together.
+    It is the batch function of the 'too large' area checks: the runner takes
+    their row masks ('invalid') and their diagnostics from these statistics.
+    '''
+
+    default_group_by = area_group_fields() if any(isinstance(argument, str) for argument in arguments) else ()
+    resolved = {argument: (argument, default_group_by) if isinstance(argument, str) else (argument[0], tuple(argument[1]))
+                for argument in arguments}
+
+    groupings = dict()
+    for large_field, group_by in resolved.values():
+        groupings.setdefault(group_by, []).append(large_field)
+
+    stats = dict()
+    for group_by, large_fields in groupings.items():
+        for large_field, field_stats in area_ratio_stats(wdpa_df, large_fields, group_by).items():
+            stats[(large_field, group_by)] = field_stats
+
+    return {argument: stats[resolved[argument]] for argument in arguments}
+
+def area_too_large_masks(wdpa_df, arguments):
+    '''
+    Return a dictionary with, for each argument (large_field, or a tuple 
+    (large_field, group_by), see area_ratio_stats_by_argument), the boolean 
+    row mask of rows where the area field is too large compared to the field 
+    it is compared to (see area_ratio_stats)
+
+    ## Example ##
+    area_too_large_masks(wdpa_df, ['GIS_AREA', ('REP_AREA', ('ISO3',))])
+    '''
+
+    return {argument: field_stats['invalid'] for argument, field_stats in area_ratio_stats_by_argument(wdpa_df, arguments).items()}
+
+def area_ratio_diagnostics(wdpa_df, arguments, stats=None):
+    '''
+    Return a dictionary with, for each argument (large_field, or a tuple 
+    (large_field, group_by), see area_ratio_stats_by_argument), the 
+    statistics of area_ratio_stats, shown in the Summary sheet:
+    mean, std --          mean and stdev of the relative sizes, outliers excluded
+    max_relative_size --  mean + 2 * stdev: rows above it are flagged, if the areas differ enough
+    rows_in_stats --      rows in the mean and stdev
+    outliers --           rows with a relative size below 0 or above MAX_RELATIVE_SIZE (incl. infinite)
+    zero_compared_area -- rows whose compared area is 0, with an infinite relative size
+    undefined --          rows with a null area, or both areas 0
+    With group_by, the median, MAD and robust threshold of the whole table are 
+    given instead of the mean, stdev and maximum, with the number of groups and
+    of groups using the threshold of the whole table, and the statistics of 
+    each group (group_thresholds, a list of records, see robust_thresholds).
+    The statistics are computed, unless given as stats: e.g. those returned by 
+    area_ratio_stats_by_argument, as the batch function of the checks.
+    '''
+
+    if stats is None:
+        stats = area_ratio_stats_by_argument(wdpa_df, arguments)
+
+    diagnostics = dict()
+    for argument in arguments:
+        field_stats = stats[argument]
+        diagnostics[argument] = {key: value for key, value in field_stats.items() 
+                                 if not isinstance(value, (np.ndarray, pd.DataFrame))}
+        if 'group_thresholds' in field_stats:
+            # Records of Python values, for the JSON run log; faster than DataFrame.to_dict for many groups
+            thresholds = field_stats['group_thresholds']
+            names = list(thresholds.columns)
+            columns = [thresholds[name].to_numpy().tolist() for name in names]
+            diagnostics[argument]['group_thresholds'] = [dict(zip(names, values)) for values in zip(*columns)]
+
+    return diagnostics
+
+##################################################################
+#### Area ratios: statistics accumulated over chunks or shards ####
+##################################################################
+
+# Bins of the histogram sketching the relative sizes in the statistics, from 0 to MAX_RELATIVE_SIZE:
+# the approximate median and MAD are within one bin (MAX_RELATIVE_SIZE / AREA_SKETCH_BINS) of the exact ones
+AREA_SKETCH_BINS = 2 ** 14
+
+def area_ratio_accumulator(large_fields=tuple(AREA_RATIO_FIELDS)):
+    '''
+    Return an empty accumulator of the statistics of the 'too large' area 
+    checks, to compute them over a table read in chunks, or split in shards, 
+    rather than loaded at once (see accumulate_area_ratios). For each area 
+    field, it holds the count, mean and sum of squared deviations (M2) of the 
+    relative sizes in the statistics, the counts of outliers, zero compared 
+    areas and undefined relative sizes, and a histogram of the relative sizes 
+    (sketch) for approximate quantiles.
+
+    ## Arguments ##
+    large_fields -- list of the area fields to check for being too large
+
+    ## Example ##
+    accumulator = area_ratio_accumulator(['GIS_AREA', 'REP_AREA'])
+    for chunk_df in chunks:
+        accumulate_area_ratios(accumulator, chunk_df)
+    thresholds = area_ratio_thresholds(accumulator)
+    '''
+
+    return {large_field: {'count': 0,
+                          'mean': 0.,
+                          'm2': 0.,
+                          'outliers': 0,
+                          'zero_compared_area': 0,
+                          'undefined': 0,
+                          'sketch': np.zeros(AREA_SKETCH_BINS, dtype=np.int64)}
+            for large_field in large_fields}
+
+def merge_moments(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    '''
+    Return the count, mean and sum of squared deviations (M2) of two sets of 
+    values, from those of each set (Chan et al.'s parallel algorithm), without
+    the cancellation of summing squares
+    '''
+
+    count = count_a + count_b
+    if count == 0:
+        return 0, 0., 0.
+    delta = mean_b - mean_a
+    mean = mean_a + delta * count_b / count
+    m2 = m2_a + m2_b + delta * delta * count_a * count_b / count
+
+    return count, mean, m2
+
+def accumulate_area_ratios(accumulator, wdpa_df):
+    '''
+    Add the relative sizes of the rows of wdpa_df, a chunk or shard of the 
+    table, to the accumulator (see area_ratio_accumulator). Return the 
+    accumulator, updated in place.
+    '''
+
+    for large_field, ratios in area_ratios(wdpa_df, list(accumulator)).items():
+        field_acc = accumulator[large_field]
+        values = ratios['relative_size'][ratios['in_stats']]
+        undefined = int(np.isnan(ratios['relative_size']).sum())
+
+        if values.size > 0:
+            mean = values.mean()
+            deviations = values - mean
+            m2 = np.dot(deviations, deviations)
+            field_acc['count'], field_acc['mean'], field_acc['m2'] = merge_moments(
+                field_acc['count'], field_acc['mean'], field_acc['m2'], values.size, mean, m2)
+
+            bins = (values * (AREA_SKETCH_BINS / MAX_RELATIVE_SIZE)).astype(np.int64)
+            np.minimum(bins, AREA_SKETCH_BINS - 1, out=bins)
+            field_acc['sketch'] += np.bincount(bins, minlength=AREA_SKETCH_BINS)
+
+        field_acc['outliers'] += len(ratios['relative_size']) - undefined - values.size
+        field_acc['zero_compared_area'] += int(ratios['zero_compared_area'].sum())
+        field_acc['undefined'] += undefined
+
+    return accumulator
+
+def merge_area_ratio_accumulators(accumulators):
+    '''
+    Return the accumulator of the statistics of several chunks or shards, 
+    from their accumulators (see area_ratio_accumulator), e.g. computed by
+    different processes
+
+    ## Arguments ##
+    accumulators -- list of accumulators of the same area fields
+    '''
+
+    merged = area_ratio_accumulator(list(accumulators[0]))
+    for accumulator in accumulators:
+        for large_field, field_acc in accumulator.items():
+            merged_acc = merged[large_field]
+            merged_acc['count'], merged_acc['mean'], merged_acc['m2'] = merge_moments(
+                merged_acc['count'], merged_acc['mean'], merged_acc['m2'],
+                field_acc['count'], field_acc['mean'], field_acc['m2'])
+            for key in ['outliers', 'zero_compared_area', 'undefined', 'sketch']:
+                merged_acc[key] = merged_acc[key] + field_acc[key]
+
+    return merged
+
+def sketch_quantile(sketch, q):
+    '''
+    Return the approximate q-quantile (0 to 1) of the relative sizes of a 
+    histogram sketch (see area_ratio_accumulator): the centre of its bin
+    '''
+
+    cumulative = np.cumsum(sketch)
+    if cumulative[-1] == 0:
+        return np.nan
+    width = MAX_RELATIVE_SIZE / AREA_SKETCH_BINS
+    position = min(np.searchsorted(cumulative, q * cumulative[-1]), len(sketch) - 1)
+
+    return (position + 0.5) * width
+
+def area_ratio_thresholds(accumulator):
+    '''
+    Return a dictionary with, for each area field of the accumulator (see 
+    area_ratio_accumulator), the statistics of area_ratio_stats: 'mean', 
+    'std', 'max_relative_size', 'rows_in_stats', 'outliers', 'zero_compared_area'
+    and 'undefined', which match those of the whole table to floating-point
+    precision, and the approximate 'median' and 'mad' of the relative sizes,
+    within one bin of the sketch (see AREA_SKETCH_BINS).
     '''
-    
-    # Set maximum allowed absolute difference between GIS_AREA and REP_AREA (in km²)
-    MAX_ALLOWED_SIZE_DIFF_KM2 = 50
 
-    # Create two Series:
-    # One to calculate the mean and stdev without outliers
-    # One to use as index, to find WDPA_PIDs with a too large GIS_AREA
+    thresholds = dict()
+    for large_field, field_acc in accumulator.items():
+        count = field_acc['count']
+        mean = field_acc['mean'] if count > 0 else np.nan
+        std = np.sqrt(field_acc['m2'] / (count - 1)) if count > 1 else np.nan
 
-    # Compare GIS_AREA to REP_AREA, replace outliers with NaN, then obtain mean and stdev
-    # Settings
-    calc =      (wdpa_df['REP_AREA'] + wdpa_df['GIS_AREA']) / wdpa_df['REP_AREA']
-    condition = [calc > 100,
-                calc < 0]
-    choice =    [np.nan,np.nan]
+        # Median of the sketch, and median of the deviations of the centres of its bins from it
+        sketch = field_acc['sketch']
+        median = sketch_quantile(sketch, 0.5)
+        centres = (np.arange(AREA_SKETCH_BINS) + 0.5) * (MAX_RELATIVE_SIZE / AREA_SKETCH_BINS)
+        deviations = np.abs(centres - median)
+        order = np.argsort(deviations, kind='mergesort')
+        cumulative = np.cumsum(sketch[order])
+        mad = deviations[order][np.searchsorted(cumulative, 0.5 * cumulative[-1])] if count > 0 else np.nan
 
-    # Produce column without outliers
-    relative_size_stats = pd.Series( 
-        np.select(condition, choice, default = calc))
+        thresholds[large_field] = {'mean': float(mean),
+                                   'std': float(std),
+                                   'max_relative_size': float(mean + 2 * std),
+                                   'median': float(median),
+                                   'mad': float(mad),
+                                   'rows_in_stats': int(count),
+                                   'outliers': int(field_acc['outliers']),
+                                   'zero_compared_area': int(field_acc['zero_compared_area']),
+                                   'undefined': int(field_acc['undefined'])}
 
-    # Calculate the maximum allowed values for relative_size using mean and stdev
-    max_gis = relative_size_stats.mean() + (2*relative_size_stats.std())
+    return thresholds
 
-    # Series: compare REP_AREA to GIS_AREA
-    relative_size = pd.Series((wdpa_df['REP_AREA'] + wdpa_df['GIS_AREA']) / wdpa_df['REP_AREA'])
+def area_too_large_chunk_masks(wdpa_df, thresholds):
+    '''
+    Return a dictionary with, for each area field of thresholds (see 
+    area_ratio_thresholds), the boolean row mask of the rows of wdpa_df, 
+    a chunk of the table, where it is too large compared to the field it is 
+    compared to: the second pass of the 'too large' area checks over a table 
+    read in chunks. The masks of all chunks match those of area_too_large_masks
+    on the whole table.
+    '''
+
+    masks = dict()
+    for large_field, ratios in area_ratios(wdpa_df, list(thresholds)).items():
+        with np.errstate(invalid='ignore'):
+            masks[large_field] = ((ratios['relative_size'] > thresholds[large_field]['max_relative_size']) 
+                                  & (ratios['abs_diff'] > MAX_ALLOWED_SIZE_DIFF_KM2))
 
-    # Find the rows with an incorrect GIS_AREA
-    invalid_wdpa_pid= wdpa_df[(relative_size > max_gis) & (abs(wdpa_df['GIS_AREA']-wdpa_df['REP_AREA']) > MAX_ALLOWED_SIZE_DIFF_KM2)]['WDPA_PID'].values
+    return masks
+
+############################################
+#### 2.3. Invalid: GIS_AREA >> REP_AREA ####
+############################################
+
+def area_invalid_too_large_gis(wdpa_df, return_pid=False):
+    '''
+    Return True if GIS_AREA is too large compared to REP_AREA - based on thresholds specified in area_ratio_stats (by group if WDPA_QA_AREA_GROUPS is set).
+    Return list of WDPA_PIDs where GIS_AREA is too large compared to REP_AREA, if return_pid=True
+    '''
+
+    argument = 'GIS_AREA'
+    invalid_wdpa_pid = mask_to_pid(wdpa_df, area_too_large_masks(wdpa_df, [argument])[argument])
     
     if return_pid:
         return invalid_wdpa_pid
@@ -247,36 +936,12 @@ def area_invalid_too_large_gis(wdpa_df, return_pid=False):
 
 def area_invalid_too_large_rep(wdpa_df, return_pid=False):
     '''
-    Return True if REP_AREA is too large compared to GIS_AREA - based on thresholds specified below.
+    Return True if REP_AREA is too large compared to GIS_AREA - based on thresholds specified in area_ratio_stats (by group if WDPA_QA_AREA_GROUPS is set).
     Return list of WDPA_PIDs where REP_AREA is too large compared to GIS_AREA, if return_pid=True
     '''
-    
-    # Set maximum allowed absolute difference between GIS_AREA and REP_AREA (in km²)
-    MAX_ALLOWED_SIZE_DIFF_KM2 = 50
-
-    # Create two Series:
-    # One to calculate the mean and stdev without outliers
-    # One to use as index, to find WDPA_PIDs with a too large REP_AREA
-
-    # Compare GIS_AREA to REP_AREA, replace outliers with NaN, then obtain mean and stdev
-    # Settings
-    calc =      (wdpa_df['REP_AREA'] + wdpa_df['GIS_AREA']) / wdpa_df['GIS_AREA']
-    condition = [calc > 100,
-                calc < 0]
-    choice =    [np.nan,np.nan]
 
-    # Produce Series without outliers
-    relative_size_stats = pd.Series( 
-        np.select(condition, choice, default = calc))
-
-    # Calculate the maximum and minimum allowed values for relative_size using mean and stdev
-    max_rep = relative_size_stats.mean() + (2*relative_size_stats.std())
-
-    # Series: compare REP_AREA to GIS_AREA
-    relative_size = pd.Series((wdpa_df['REP_AREA'] + wdpa_df['GIS_AREA']) / wdpa_df['GIS_AREA'])
-
-    # Find the rows with an incorrect REP_AREA
-    invalid_wdpa_pid= wdpa_df[(relative_size > max_rep) & (abs(wdpa_df['REP_AREA']-wdpa_df['GIS_AREA']) > MAX_ALLOWED_SIZE_DIFF_KM2)]['WDPA_PID'].values
+    argument = 'REP_AREA'
+    invalid_wdpa_pid = mask_to_pid(wdpa_df, area_too_large_masks(wdpa_df, [argument])[argument])
     
     if return_pid:
         return invalid_wdpa_pid
@@ -289,36 +954,12 @@ def area_invalid_too_large_rep(wdpa_df, return_pid=False):
 
 def area_invalid_too_large_gis_m(wdpa_df, return_pid=False):
     '''
-    Return True if GIS_M_AREA is too large compared to REP_M_AREA - based on thresholds specified below.
+    Return True if GIS_M_AREA is too large compared to REP_M_AREA - based on thresholds specified in area_ratio_stats (by group if WDPA_QA_AREA_GROUPS is set).
     Return list of WDPA_PIDs where GIS_M_AREA is too large compared to REP_M_AREA, if return_pid=True
     '''
-    
-    # Set maximum allowed absolute difference between GIS_M_AREA and REP_M_AREA (in km²)
-    MAX_ALLOWED_SIZE_DIFF_KM2 = 50
-
-    # Create two Series:
-    # One to calculate the mean and stdev without outliers
-    # One to use as index, to find WDPA_PIDs with a too large GIS_M_AREA
 
-    # Compare GIS_M_AREA to REP_M_AREA, replace outliers with NaN, then obtain mean and stdev
-    # Settings
-    calc =      (wdpa_df['REP_M_AREA'] + wdpa_df['GIS_M_AREA']) / wdpa_df['REP_M_AREA']
-    condition = [calc > 100,
-                calc < 0]
-    choice =    [np.nan,np.nan]
-
-    # Produce column without outliers
-    relative_size_stats = pd.Series( 
-        np.select(condition, choice, default = calc))
-
-    # Calculate the maximum and minimum allowed values for relative_size using mean and stdev
-    max_gis = relative_size_stats.mean() + (2*relative_size_stats.std())
-
-    # Series: compare REP_M_AREA to GIS_M_AREA
-    relative_size = pd.Series((wdpa_df['REP_M_AREA'] + wdpa_df['GIS_M_AREA']) / wdpa_df['REP_M_AREA'])
-
-    # Find the rows with an incorrect GIS_M_AREA
-    invalid_wdpa_pid= wdpa_df[(relative_size > max_gis) & (abs(wdpa_df['GIS_M_AREA']-wdpa_df['REP_M_AREA']) > MAX_ALLOWED_SIZE_DIFF_KM2)]['WDPA_PID'].values
+    argument = 'GIS_M_AREA'
+    invalid_wdpa_pid = mask_to_pid(wdpa_df, area_too_large_masks(wdpa_df, [argument])[argument])
     
     if return_pid:
         return invalid_wdpa_pid
@@ -331,37 +972,13 @@ def area_invalid_too_large_gis_m(wdpa_df, return_pid=False):
 
 def area_invalid_too_large_rep_m(wdpa_df, return_pid=False):
     '''
-    Return True if REP_M_AREA is too large compared to GIS_M_AREA - based on thresholds specified below.
+    Return True if REP_M_AREA is too large compared to GIS_M_AREA - based on thresholds specified in area_ratio_stats (by group if WDPA_QA_AREA_GROUPS is set).
     Return list of WDPA_PIDs where REP_M_AREA is too large compared to GIS_M_AREA, if return_pid=True
     '''
-    
-    # Set maximum allowed absolute difference between GIS_M_AREA and REP_M_AREA (in km²)
-    MAX_ALLOWED_SIZE_DIFF_KM2 = 50
-    
-    # Create two Series:
-    # One to calculate the mean and stdev without outliers
-    # One to use as index, to find WDPA_PIDs with a too large REP_M_AREA
-
-    # Compare GIS_M_AREA to REP_M_AREA, replace outliers with NaN, then obtain mean and stdev
-    # Settings
-    calc =      (wdpa_df['REP_M_AREA'] + wdpa_df['GIS_M_AREA']) / wdpa_df['GIS_M_AREA']
-    condition = [calc > 100,
-                calc < 0]
-    choice =    [np.nan,np.nan]
-
-    # Produce column without outliers
-    relative_size_stats = pd.Series( 
-        np.select(condition, choice, default = calc))
-
-    # Calculate the maximum and minimum allowed values for relative_size using mean and stdev
-    max_rep = relative_size_stats.mean() + (2*relative_size_stats.std())
-
-    # Series: compare REP_M_AREA to GIS_M_AREA
-    relative_size = pd.Series((wdpa_df['REP_M_AREA'] + wdpa_df['GIS_M_AREA']) / wdpa_df['GIS_M_AREA'])
-
-    # Find the rows with an incorrect REP_M_AREA
-    invalid_wdpa_pid= wdpa_df[(relative_size > max_rep) & (abs(wdpa_df['REP_M_AREA']-wdpa_df['GIS_M_AREA']) > MAX_ALLOWED_SIZE_DIFF_KM2)]['WDPA_PID'].values
 
+    argument = 'REP_M_AREA'
+    invalid_wdpa_pid = mask_to_pid(wdpa_df, area_too_large_masks(wdpa_df, [argument])[argument])
+    
     if return_pid:
         return invalid_wdpa_pid
 
@@ -575,18 +1192,67 @@ def inconsistent_fields_same_wdpaid(wdpa_df,
         return_pid=True):    
     '''
 
+    invalid_wdpa_pid = mask_to_pid(wdpa_df, inconsistent_fields_same_wdpaid_masks(wdpa_df, [check_field])[check_field])
+
     if return_pid:
-        # Group by WDPAID to find duplicate WDPAIDs and count the 
-        # number of unique values for the field in question
-        wdpaid_groups = wdpa_df.groupby(['WDPAID'])[check_field].nunique()
-
-        # Select all WDPAID duplicates groups with >1 unique value for 
-        # specified field ('check_attributtes') and use their index to
-        # return the WDPA_PIDs
-        return wdpa_df[wdpa_df['WDPAID'].isin(wdpaid_groups[wdpaid_groups > 1].index)]['WDPA_PID'].values
+        return invalid_wdpa_pid
                 
-    # Sum the number of times a WDPAID has more than 1 value for a field
-    return (wdpa_df.groupby('WDPAID')[check_field].nunique() > 1).sum() > 0
+    return len(invalid_wdpa_pid) > 0
+
+#### Batched evaluation ####
+
+def inconsistent_fields_same_wdpaid_masks(wdpa_df, check_fields):
+    '''
+    Evaluate the 'inconsistent' check for several fields in one pass.
+    WDPAID is factorized once, and only rows whose WDPAID occurs more than once
+    are evaluated: a WDPAID with a single row can never be inconsistent.
+    For each field, the number of distinct (non-null) values per WDPAID is counted
+    from the distinct (WDPAID, value) pairs, as groupby('WDPAID')[field].nunique() would.
+
+    Return a dictionary with, for each field, the boolean row mask of
+    rows whose WDPAID has more than one value in that field.
+
+    ## Arguments ##
+    check_fields -- list of the fields to check for inconsistency
+
+    ## Example ##
+    inconsistent_fields_same_wdpaid_masks(
+        wdpa_df=wdpa_df,
+        check_fields=["NAME", "DESIG_ENG", "ISO3"])
+    '''
+
+    # Factorize WDPAID once; rows with a null WDPAID belong to no group (code -1)
+    group_codes, groups = pd.factorize(wdpa_df['WDPAID'])
+    group_sizes = np.bincount(group_codes[group_codes >= 0], minlength=len(groups))
+
+    # Only rows of WDPAIDs with more than one row can be inconsistent
+    in_multi_group = np.zeros(len(group_codes), dtype=bool)
+    in_multi_group[group_codes >= 0] = group_sizes[group_codes[group_codes >= 0]] > 1
+    multi_rows = np.flatnonzero(in_multi_group)
+    multi_codes = group_codes[multi_rows]
+
+    invalid = dict()
+    for check_field in check_fields:
+        value_codes, values = pd.factorize(wdpa_df[check_field].values[multi_rows])
+        not_null = value_codes >= 0
+
+        # Count the distinct (WDPAID, value) pairs of each WDPAID
+        pairs = pd.unique(multi_codes[not_null].astype(np.int64) * max(len(values), 1) + value_codes[not_null])
+        distinct_values = np.bincount(pairs // max(len(values), 1), minlength=len(groups))
+
+        invalid[check_field] = np.zeros(len(group_codes), dtype=bool)
+        invalid[check_field][multi_rows[distinct_values[multi_codes] > 1]] = True
+
+    return invalid
+
+def inconsistent_fields_same_wdpaid_batch(wdpa_df, check_fields):
+    '''
+    Return a dictionary with, for each field, the array of WDPA_PIDs of rows whose
+    WDPAID has more than one value in that field (see inconsistent_fields_same_wdpaid_masks)
+    '''
+
+    return {check_field: mask_to_pid(wdpa_df, invalid) 
+            for check_field, invalid in inconsistent_fields_same_wdpaid_masks(wdpa_df, check_fields).items()}
 	
 #### Input functions ####
 
@@ -910,6 +1576,10 @@ def invalid_value_in_field(wdpa_df, field, field_allowed_values, condition_field
     
     Return list of WDPA_PIDs with invalid fields, if return_pid is set True.
 
+    If wdpa_df is None, return the rule as a tuple (field, field_allowed_values,
+    condition_field, condition_crit) instead, so that the rules of several input
+    functions can be evaluated together by invalid_values_batch.
+
     ## Arguments ##
     
     field                -- a string specifying the field to be checked
@@ -931,6 +1601,9 @@ def invalid_value_in_field(wdpa_df, field, field_allowed_values, condition_field
         return_pid=True):
     '''
 
+    if wdpa_df is None:
+        return field, field_allowed_values, condition_field, condition_crit
+
     # if condition_field and condition_crit are specified
     if condition_field != '' and condition_crit != []:
         invalid_wdpa_pid = wdpa_df[(~wdpa_df[field].isin(field_allowed_values)) & (wdpa_df[condition_field].isin(condition_crit))]['WDPA_PID'].values
@@ -945,6 +1618,76 @@ def invalid_value_in_field(wdpa_df, field, field_allowed_values, condition_field
     
     return len(invalid_wdpa_pid) > 0
 
+#### Batched evaluation ####
+
+def value_rule_matrix(wdpa_df, rules):
+    '''
+    Evaluate several invalid_value_in_field rules together and return a boolean
+    matrix of rows x rules, True where the row violates the rule.
+
+    Each field used by the rules is factorized once (categorical columns are
+    used as they are). Each list of allowed values
+    (or condition criteria) then becomes a boolean lookup over the distinct values
+    of its field, evaluated with isin as invalid_value_in_field does, and is
+    broadcast back to the rows with a single take.
+
+    ## Arguments ##
+    rules -- list of (field, field_allowed_values, condition_field, condition_crit) tuples,
+             as returned by invalid_value_in_field(None, ...)
+
+    ## Example ##
+    value_rule_matrix(
+        wdpa_df,
+        rules=[("PA_DEF", ["1"], "", []),
+               ("NO_TAKE", ["Not Applicable"], "MARINE", ["0"])])
+    '''
+
+    encoded = dict()
+    def _lookup(field, values):
+        # boolean array of rows whose value in field is one of values
+        if field not in encoded:
+            # codes is -1 for missing values, which take the last position of the lookup
+            column = wdpa_df[field]
+            if column.dtype.name == 'category': # already encoded
+                encoded[field] = column.cat.codes.values, column.cat.categories
+            else:
+                encoded[field] = pd.factorize(column)
+        codes, uniques = encoded[field]
+        lookup = np.append(pd.Series(uniques, dtype=object).isin(values).values, pd.isnull(values).any())
+        return lookup[codes]
+
+    matrix = np.zeros((len(wdpa_df), len(rules)), dtype=bool, order='F') # each rule is a contiguous column
+    for i, (field, field_allowed_values, condition_field, condition_crit) in enumerate(rules):
+        matrix[:, i] = ~_lookup(field, field_allowed_values)
+        if condition_field != '' and condition_crit != []:
+            matrix[:, i] &= _lookup(condition_field, condition_crit)
+
+    return matrix
+
+def invalid_values_masks(wdpa_df, check_funcs):
+    '''
+    Evaluate the input functions of invalid_value_in_field in one pass over a shared
+    encoding of their fields (see value_rule_matrix).
+    Return a dictionary with, for each input function, the boolean row mask of
+    the rows with invalid values.
+
+    ## Arguments ##
+    check_funcs -- list of input functions, e.g. [invalid_pa_def, invalid_status]
+    '''
+
+    matrix = value_rule_matrix(wdpa_df, [check_func(None) for check_func in check_funcs])
+
+    return {check_func: matrix[:, i] for i, check_func in enumerate(check_funcs)}
+
+def invalid_values_batch(wdpa_df, check_funcs):
+    '''
+    Return a dictionary with, for each input function of invalid_value_in_field, the array
+    of WDPA_PIDs with invalid values, as returned by the function itself with return_pid=True
+    '''
+
+    return {check_func: mask_to_pid(wdpa_df, invalid) 
+            for check_func, invalid in invalid_values_masks(wdpa_df, check_funcs).items()}
+
 #### Input functions ####
 
 #############################
@@ -1342,18 +2085,46 @@ def invalid_verif(wdpa_df, return_pid=False):
 ###################################
 #### 4.20. Invalid PARENT_ISO3 ####
 ###################################
+def invalid_country_codes_mask(wdpa_df, field):
+    '''
+    Return a boolean row mask, True where field is not a valid ISO3 code, or a list of 
+    valid ISO3 codes separated by ';'. Missing values (NaN / None) are invalid.
+
+    Each distinct value of field is validated once against a set of the allowed codes,
+    and the verdict is broadcast back to the rows holding that value.
+
+    ## Arguments ##
+    field -- string of the field to check: 'ISO3' or 'PARENT_ISO3'
+    '''
+
+    allowed_iso3 = reference.iso3_codes()
+
+    def _correct_iso3(value):
+        return isinstance(value, str) and all(each in allowed_iso3 for each in value.split(';'))
+
+    # codes is -1 for missing values, which take the last (invalid) verdict
+    codes, values = pd.factorize(wdpa_df[field])
+    verdicts = np.array([_correct_iso3(value) for value in values] + [False], dtype=bool)
+
+    return ~verdicts[codes]
+
 def invalid_country_codes(wdpa_df, field, return_pid=False):
+    '''
+    Return True if field contains a value that is not a valid ISO3 code, or a list of 
+    valid ISO3 codes separated by ';'. Missing values (NaN / None) are invalid.
+    Return list of WDPA_PIDs where field is invalid, if return_pid is set True
 
-    def _correct_iso3(field):
-        for each in field.split(';'):
-            if each in iso3:
-                pass
-            else:
-                return False
+    ## Arguments ##
+    field -- string of the field to check: 'ISO3' or 'PARENT_ISO3'
 
-        return True
+    ## Example ##
+    invalid_country_codes(
+        wdpa_df,
+        field="PARENT_ISO3",
+        return_pid=True):
+    '''
 
-    invalid_wdpa_pid = wdpa_df[~wdpa_df[field].apply(_correct_iso3)]['WDPA_PID'].values
+    invalid_wdpa_pid = mask_to_pid(wdpa_df, invalid_country_codes_mask(wdpa_df, field))
 
     if return_pid:
         return invalid_wdpa_pid
@@ -1362,17 +2133,39 @@ def invalid_country_codes(wdpa_df, field, return_pid=False):
         return len(invalid_wdpa_pid) > 0
 
 def invalid_parent_iso3(wdpa_df, return_pid=False):
+    '''
+    Return True if PARENT_ISO3 is not a (';'-separated list of) valid ISO3 code(s)
+    Return list of WDPA_PIDs where PARENT_ISO3 is invalid, if return_pid is set True
+    '''
 
     return invalid_country_codes(wdpa_df, 'PARENT_ISO3', return_pid)
 
+def invalid_parent_iso3_mask(wdpa_df):
+    '''
+    Return a boolean row mask, True where PARENT_ISO3 is invalid
+    '''
+
+    return invalid_country_codes_mask(wdpa_df, 'PARENT_ISO3')
+
 ############################
 #### 4.21. Invalid ISO3 ####
 ############################
 
 def invalid_iso3(wdpa_df, return_pid=False):
+    '''
+    Return True if ISO3 is not a (';'-separated list of) valid ISO3 code(s)
+    Return list of WDPA_PIDs where ISO3 is invalid, if return_pid is set True
+    '''
 
     return invalid_country_codes(wdpa_df, 'ISO3', return_pid)
 
+def invalid_iso3_mask(wdpa_df):
+    '''
+    Return a boolean row mask, True where ISO3 is invalid
+    '''
+
+    return invalid_country_codes_mask(wdpa_df, 'ISO3')
+
 ###########################################
 #### 4.22. Invalid STATUS & DESIG_TYPE ####
 ###########################################
@@ -1503,6 +2296,12 @@ def area_invalid_rep_m_area_rep_area(wdpa_df, return_pid=False):
 #### 6. Forbidden characters ####
 #################################
 
+# Characters that are not allowed in the text fields of the WDPA
+FORBIDDEN_CHARACTERS = ['<','>','?','*','\r','\n']
+
+# Precompiled character class matching any of the forbidden characters
+FORBIDDEN_CHARACTER_PATTERN = re.compile('[' + ''.join(re.escape(s) for s in FORBIDDEN_CHARACTERS) + ']')
+
 #### Factory Function ####
 
 def forbidden_character(wdpa_df, check_field, return_pid=False):
@@ -1530,22 +2329,55 @@ def forbidden_character(wdpa_df, check_field, return_pid=False):
         return_pid=True):    
     '''
 
-    # Import regular expression package and the forbidden characters
-    forbidden_characters = ['<','>','?','*','\r','\n']
-    forbidden_characters_esc = [re.escape(s) for s in forbidden_characters]
-
-    pattern = '|'.join(forbidden_characters_esc)
-
-    # Obtain the WDPA_PIDs with forbidden characters
-    # remove those with nas
-    wdpa_df = wdpa_df.dropna()
-    invalid_wdpa_pid = wdpa_df[wdpa_df[check_field].str.contains(pattern, case=False)]['WDPA_PID'].values
+    invalid_wdpa_pid = mask_to_pid(wdpa_df, forbidden_character_masks(wdpa_df, [check_field])[check_field])
 
     if return_pid:
         return invalid_wdpa_pid
         
     return len(invalid_wdpa_pid) > 0
 
+#### Batched evaluation ####
+
+def forbidden_character_masks(wdpa_df, check_fields):
+    '''
+    Evaluate the 'forbidden character' check for several fields in one pass.
+    Each field is factorized, and only its distinct values are searched with
+    the precompiled FORBIDDEN_CHARACTER_PATTERN, rather than each row with a 
+    regular expression. Nulls have no forbidden characters, and the DataFrame
+    is not copied.
+
+    Return a dictionary with, for each field, the boolean row mask of
+    rows with forbidden characters in that field.
+
+    ## Arguments ##
+    check_fields -- list of the fields to check for forbidden characters
+
+    ## Example ##
+    forbidden_character_masks(
+        wdpa_df=wdpa_df,
+        check_fields=["NAME", "DESIG_ENG", "SUB_LOC"])
+    '''
+
+    search = FORBIDDEN_CHARACTER_PATTERN.search
+
+    invalid = dict()
+    for check_field in check_fields:
+        value_codes, values = pd.factorize(wdpa_df[check_field].values)
+        # the last entry, False, is looked up by the nulls (code -1)
+        lookup = np.array([isinstance(value, str) and search(value) is not None for value in values] + [False], dtype=bool)
+        invalid[check_field] = lookup[value_codes]
+
+    return invalid
+
+def forbidden_character_batch(wdpa_df, check_fields):
+    '''
+    Return a dictionary with, for each field, the array of WDPA_PIDs of rows
+    with forbidden characters in that field (see forbidden_character_masks)
+    '''
+
+    return {check_field: mask_to_pid(wdpa_df, invalid) 
+            for check_field, invalid in forbidden_character_masks(wdpa_df, check_fields).items()}
+
 #### Input functions ####
 
 #########################################
@@ -1878,8 +2710,136 @@ def nan_present_sub_loc(wdpa_df, return_pid=False):
     
 #     return len(invalid_metadataid) > 0
 
+##########################
+#### 9. Check registry ####
+##########################
+
+'''
+Every check is registered as a dictionary with:
+- name:     descriptive name of the check, as displayed in Excel
+- func:     the check function, as defined in this script (qa.py)
+- fields:   the fields the check reads; WDPA_PID is always included
+- scope:    'row' if each row is evaluated on its own values,
+            'group' if rows are compared with other rows (e.g. the same WDPAID),
+            'table' if the check uses statistics over the whole table
+- group_by: for 'group' checks, the field whose values define the groups of rows compared
+- severity: 'Fail' or 'Check'; by default 'Fail' for names starting with 'ivd', else 'Check'
+- tags:     the family of the check, e.g. 'invalid', 'inconsistent' or 'area'
+- mask:     optionally, a function returning the rows that fail the check as a boolean row mask
+            (or an array of row positions); the runner then selects these rows directly,
+            instead of searching the WDPA_PIDs returned by func
+- batch:    optionally, a function evaluating this check together with others of its family,
+            returning row masks
+
+Checks can be selected by name, tag or field with select_checks. The fields to load
+for a selection of checks are given by required_fields.
+'''
+
+def make_check(name, func, fields, scope='row', tags=(), severity=None, mask=None, batch=None, group_by='WDPAID', diagnostics=None,
+               extra_fields=None):
+    '''
+    Return the registry entry of a check.
+
+    ## Arguments ##
+    name --     descriptive name of the check, as displayed in Excel
+    func --     the check function, called as func(wdpa_df, return_pid)
+    fields --   list of the fields read by the check
+    scope --    'row', 'group' or 'table', see above
+    tags --     list of tags used to select the check
+    severity -- 'Fail' or 'Check'; derived from the name if not specified
+    mask --     optional function called as mask(wdpa_df), returning a boolean row mask
+                or an array of row positions of the rows that fail the check
+    batch --    optional tuple (batch_func, argument): checks sharing a batch_func are 
+                evaluated together by the runner as batch_func(wdpa_df, [arguments]),
+                which returns a dictionary of each argument and its row mask, or its
+                statistics holding the row mask under 'invalid'
+    group_by -- for 'group' checks, the field defining the groups; 'WDPAID' by default
+    diagnostics -- optional tuple (diagnostics_func, argument): called by the runner as 
+                diagnostics_func(wdpa_df, [arguments]) for the checks sharing it, returning 
+                a dictionary of each argument and the statistics shown in the Summary sheet;
+                called with the statistics returned by the batch_func of the checks, by
+                argument, as third argument if it returns statistics
+    extra_fields -- optional function returning further fields read by the check, which
+                depend on the run's settings: added to fields by select_checks
+
+    ## Example ##
+    make_check('ivd_pa_def', invalid_pa_def, ['PA_DEF'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_pa_def))
+    '''
+
+    if severity is None:
+        severity = 'Fail' if name.startswith('ivd') else 'Check'
+
+    return {'name': name,
+            'func': func,
+            'fields': ['WDPA_PID'] + [field for field in fields if field != 'WDPA_PID'],
+            'scope': scope,
+            'severity': severity,
+            'tags': list(tags),
+            'mask': mask,
+            'batch': batch,
+            'group_by': group_by if scope == 'group' else None,
+            'diagnostics': diagnostics,
+            'extra_fields': extra_fields}
+
+def with_extra_fields(check):
+    '''
+    Return the check with the fields returned by its extra_fields function, if
+    any, added to its fields, e.g. the fields the area ratios are grouped by
+    '''
+
+    if not check.get('extra_fields'):
+        return check
+
+    extra_fields = [field for field in check['extra_fields']() if field not in check['fields']]
+    return dict(check, fields=check['fields'] + extra_fields, extra_fields=None)
+
+def select_checks(checks, selection=None):
+    '''
+    Return the checks matching any item of selection, in their original order.
+    An item matches a check's name, one of its tags, or one of the fields it reads
+    (not case sensitive). All checks are returned if selection is empty.
+    The extra fields of the selected checks are resolved (see with_extra_fields).
+
+    ## Arguments ##
+    checks --    list of registered checks, e.g. poly_checks
+    selection -- list of check names, tags and/or field names
+
+    ## Example ##
+    select_checks(poly_checks, ['ISO3', 'duplicate_wdpa_pid'])
+    '''
+
+    if not selection:
+        return [with_extra_fields(check) for check in checks]
+
+    selection = {item.lower() for item in selection}
+    selected = [check for check in checks 
+                if selection.intersection([check['name'].lower()] 
+                                          + [tag.lower() for tag in check['tags']] 
+                                          + [field.lower() for field in check['fields'] if field != 'WDPA_PID'])]
+
+    unknown = selection.difference([check['name'].lower() for check in checks] 
+                                   + [tag.lower() for check in checks for tag in check['tags']] 
+                                   + [field.lower() for check in checks for field in check['fields']])
+    if unknown:
+        raise ValueError(f'ERROR: no checks found for {sorted(unknown)}')
+
+    return [with_extra_fields(check) for check in selected]
+
+def required_fields(checks, input_fields):
+    '''
+    Return the fields read by the checks, in the order of input_fields
+
+    ## Arguments ##
+    checks --       list of registered checks
+    input_fields -- list of all fields of the table, e.g. INPUT_FIELDS_POLY
+    '''
+
+    needed = {field for check in checks for field in check['fields']}
+
+    return [field for field in input_fields if field in needed]
+
 ############################################################################################
-#### Below is a dictionary that holds all checks' descriptive (as displayed in Excel)   ####
+#### Below is a list that holds all checks' descriptive (as displayed in Excel)         ####
 #### and script function names (as displayed in this script, qa.py).                    ####
 #### These checks are subsequently called by the main functions, poly.py and point.py,  ####
 #### to run all checks on the WDPA input feature class attribute table.                 ####
@@ -1887,80 +2847,80 @@ def nan_present_sub_loc(wdpa_df, return_pid=False):
 
 # Checks to be run for both point and polygon data
 core_checks = [
-{'name': 'duplicate_wdpa_pid', 'func': duplicate_wdpa_pid},
-{'name': 'tiny_rep_area', 'func': area_invalid_rep_area},
-{'name': 'zero_rep_m_area_marine12', 'func': area_invalid_rep_m_area_marine12},
-{'name': 'ivd_rep_m_area_gt_rep_area', 'func': area_invalid_rep_m_area_rep_area},
-{'name': 'ivd_no_tk_area_gt_rep_m_area', 'func': area_invalid_no_tk_area_rep_m_area},
-{'name': 'ivd_no_tk_area_rep_m_area', 'func': invalid_no_take_no_tk_area_rep_m_area},
-{'name': 'ivd_int_crit_desig_eng_other', 'func': invalid_int_crit_desig_eng_other},
-{'name': 'ivd_desig_eng_iucn_cat_other', 'func': invalid_desig_eng_iucn_cat_other},
-{'name': 'dif_name_same_id', 'func': inconsistent_name_same_wdpaid},
-{'name': 'dif_orig_name_same_id', 'func': inconsistent_orig_name_same_wdpaid},
-{'name': 'ivd_dif_desig_same_id', 'func': inconsistent_desig_same_wdpaid},
-{'name': 'ivd_dif_desig_eng_same_id', 'func': inconsistent_desig_eng_same_wdpaid},
-{'name': 'dif_desig_type_same_id', 'func': inconsistent_desig_type_same_wdpaid},
-{'name': 'dif_int_crit_same_id', 'func': inconsistent_int_crit_same_wdpaid},
-{'name': 'dif_no_take_same_id', 'func': inconsistent_no_take_same_wdpaid},
-{'name': 'dif_status_same_id', 'func': inconsistent_status_same_wdpaid},
-{'name': 'dif_status_yr_same_id', 'func': inconsistent_status_yr_same_wdpaid},
-{'name': 'dif_gov_type_same_id', 'func': inconsistent_gov_type_same_wdpaid},
-{'name': 'dif_own_type_same_id', 'func': inconsistent_own_type_same_wdpaid},
-{'name': 'dif_mang_auth_same_id', 'func': inconsistent_mang_auth_same_wdpaid},
-{'name': 'dif_mang_plan_same_id', 'func': inconsistent_mang_plan_same_wdpaid},
-{'name': 'ivd_dif_verif_same_id', 'func': inconsistent_verif_same_wdpaid},
-{'name': 'ivd_dif_metadataid_same_id', 'func': inconsistent_metadataid_same_wdpaid},
-{'name': 'ivd_dif_sub_loc_same_id', 'func': inconsistent_sub_loc_same_wdpaid},
-{'name': 'ivd_dif_parent_iso3_same_id', 'func': inconsistent_parent_iso3_same_wdpaid},
-{'name': 'ivd_dif_iso3_same_id', 'func': inconsistent_iso3_same_wdpaid},
-{'name': 'ivd_pa_def', 'func': invalid_pa_def},
-{'name': 'ivd_desig_eng_international', 'func': invalid_desig_eng_international},
-{'name': 'ivd_desig_type_international', 'func': invalid_desig_type_international},
-{'name': 'ivd_desig_eng_regional', 'func': invalid_desig_eng_regional},
-{'name': 'ivd_desig_type_regional', 'func': invalid_desig_type_regional},
-{'name': 'ivd_int_crit', 'func': invalid_int_crit_desig_eng_ramsar_whs},
-{'name': 'ivd_desig_type', 'func': invalid_desig_type},
-{'name': 'ivd_iucn_cat', 'func': invalid_iucn_cat},
-{'name': 'ivd_iucn_cat_unesco_whs', 'func': invalid_iucn_cat_unesco_whs},
-{'name': 'ivd_marine', 'func': invalid_marine},
-{'name': 'check_no_take_marine0', 'func': invalid_no_take_marine0},
-{'name': 'ivd_no_take_marine12', 'func': invalid_no_take_marine12},
-{'name': 'check_no_tk_area_marine0', 'func': invalid_no_tk_area_marine0},
-{'name': 'ivd_no_tk_area_no_take', 'func': invalid_no_tk_area_no_take},
-{'name': 'ivd_status', 'func': invalid_status},
-{'name': 'ivd_status_yr', 'func': invalid_status_yr},
-{'name': 'ivd_gov_type', 'func': invalid_gov_type},
-{'name': 'ivd_own_type', 'func': invalid_own_type},
-{'name': 'ivd_verif', 'func': invalid_verif},
-{'name': 'check_parent_iso3', 'func': invalid_parent_iso3},
-{'name': 'check_iso3', 'func': invalid_iso3},
-{'name': 'ivd_status_desig_type', 'func': invalid_status_desig_type},
-{'name': 'ivd_character_name', 'func': forbidden_character_name},
-{'name': 'ivd_character_orig_name', 'func': forbidden_character_orig_name},
-{'name': 'ivd_character_desig', 'func': forbidden_character_desig},
-{'name': 'ivd_character_desig_eng', 'func': forbidden_character_desig_eng},
-{'name': 'ivd_character_mang_auth', 'func': forbidden_character_mang_auth},
-{'name': 'ivd_character_mang_plan', 'func': forbidden_character_mang_plan},
-{'name': 'ivd_character_sub_loc', 'func': forbidden_character_sub_loc},
-{'name': 'nan_present_name', 'func': nan_present_name},
-{'name': 'nan_present_orig_name', 'func': nan_present_orig_name},
-{'name': 'nan_present_desig', 'func': nan_present_desig},
-{'name': 'nan_present_desig_eng', 'func': nan_present_desig_eng},
-{'name': 'nan_present_mang_auth', 'func': nan_present_mang_auth},
-{'name': 'nan_present_mang_plan', 'func': nan_present_mang_plan},
-{'name': 'nan_present_sub_loc', 'func': nan_present_sub_loc},]
+make_check('duplicate_wdpa_pid', duplicate_wdpa_pid, ['WDPA_PID'], 'group', ['duplicate'], group_by='WDPA_PID'),
+make_check('tiny_rep_area', area_invalid_rep_area, ['REP_AREA'], 'row', ['area']),
+make_check('zero_rep_m_area_marine12', area_invalid_rep_m_area_marine12, ['REP_M_AREA', 'MARINE'], 'row', ['area']),
+make_check('ivd_rep_m_area_gt_rep_area', area_invalid_rep_m_area_rep_area, ['REP_M_AREA', 'REP_AREA'], 'row', ['area']),
+make_check('ivd_no_tk_area_gt_rep_m_area', area_invalid_no_tk_area_rep_m_area, ['NO_TK_AREA', 'REP_M_AREA'], 'row', ['area']),
+make_check('ivd_no_tk_area_rep_m_area', invalid_no_take_no_tk_area_rep_m_area, ['NO_TAKE', 'REP_M_AREA', 'NO_TK_AREA'], 'row', ['invalid']),
+make_check('ivd_int_crit_desig_eng_other', invalid_int_crit_desig_eng_other, ['DESIG_ENG', 'INT_CRIT'], 'row', ['invalid']),
+make_check('ivd_desig_eng_iucn_cat_other', invalid_desig_eng_iucn_cat_other, ['IUCN_CAT', 'DESIG_ENG'], 'row', ['invalid']),
+make_check('dif_name_same_id', inconsistent_name_same_wdpaid, ['WDPAID', 'NAME'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'NAME')),
+make_check('dif_orig_name_same_id', inconsistent_orig_name_same_wdpaid, ['WDPAID', 'ORIG_NAME'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'ORIG_NAME')),
+make_check('ivd_dif_desig_same_id', inconsistent_desig_same_wdpaid, ['WDPAID', 'DESIG'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'DESIG')),
+make_check('ivd_dif_desig_eng_same_id', inconsistent_desig_eng_same_wdpaid, ['WDPAID', 'DESIG_ENG'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'DESIG_ENG')),
+make_check('dif_desig_type_same_id', inconsistent_desig_type_same_wdpaid, ['WDPAID', 'DESIG_TYPE'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'DESIG_TYPE')),
+make_check('dif_int_crit_same_id', inconsistent_int_crit_same_wdpaid, ['WDPAID', 'INT_CRIT'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'INT_CRIT')),
+make_check('dif_no_take_same_id', inconsistent_no_take_same_wdpaid, ['WDPAID', 'NO_TAKE'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'NO_TAKE')),
+make_check('dif_status_same_id', inconsistent_status_same_wdpaid, ['WDPAID', 'STATUS'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'STATUS')),
+make_check('dif_status_yr_same_id', inconsistent_status_yr_same_wdpaid, ['WDPAID', 'STATUS_YR'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'STATUS_YR')),
+make_check('dif_gov_type_same_id', inconsistent_gov_type_same_wdpaid, ['WDPAID', 'GOV_TYPE'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'GOV_TYPE')),
+make_check('dif_own_type_same_id', inconsistent_own_type_same_wdpaid, ['WDPAID', 'OWN_TYPE'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'OWN_TYPE')),
+make_check('dif_mang_auth_same_id', inconsistent_mang_auth_same_wdpaid, ['WDPAID', 'MANG_AUTH'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'MANG_AUTH')),
+make_check('dif_mang_plan_same_id', inconsistent_mang_plan_same_wdpaid, ['WDPAID', 'MANG_PLAN'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'MANG_PLAN')),
+make_check('ivd_dif_verif_same_id', inconsistent_verif_same_wdpaid, ['WDPAID', 'VERIF'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'VERIF')),
+make_check('ivd_dif_metadataid_same_id', inconsistent_metadataid_same_wdpaid, ['WDPAID', 'METADATAID'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'METADATAID')),
+make_check('ivd_dif_sub_loc_same_id', inconsistent_sub_loc_same_wdpaid, ['WDPAID', 'SUB_LOC'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'SUB_LOC')),
+make_check('ivd_dif_parent_iso3_same_id', inconsistent_parent_iso3_same_wdpaid, ['WDPAID', 'PARENT_ISO3'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'PARENT_ISO3')),
+make_check('ivd_dif_iso3_same_id', inconsistent_iso3_same_wdpaid, ['WDPAID', 'ISO3'], 'group', ['inconsistent'], batch=(inconsistent_fields_same_wdpaid_masks, 'ISO3')),
+make_check('ivd_pa_def', invalid_pa_def, ['PA_DEF'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_pa_def)),
+make_check('ivd_desig_eng_international', invalid_desig_eng_international, ['DESIG_ENG', 'DESIG_TYPE'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_desig_eng_international)),
+make_check('ivd_desig_type_international', invalid_desig_type_international, ['DESIG_TYPE', 'DESIG_ENG'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_desig_type_international)),
+make_check('ivd_desig_eng_regional', invalid_desig_eng_regional, ['DESIG_ENG', 'DESIG_TYPE'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_desig_eng_regional)),
+make_check('ivd_desig_type_regional', invalid_desig_type_regional, ['DESIG_TYPE', 'DESIG_ENG'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_desig_type_regional)),
+make_check('ivd_int_crit', invalid_int_crit_desig_eng_ramsar_whs, ['INT_CRIT', 'DESIG_ENG'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_int_crit_desig_eng_ramsar_whs)),
+make_check('ivd_desig_type', invalid_desig_type, ['DESIG_TYPE'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_desig_type)),
+make_check('ivd_iucn_cat', invalid_iucn_cat, ['IUCN_CAT'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_iucn_cat)),
+make_check('ivd_iucn_cat_unesco_whs', invalid_iucn_cat_unesco_whs, ['IUCN_CAT', 'DESIG_ENG'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_iucn_cat_unesco_whs)),
+make_check('ivd_marine', invalid_marine, ['MARINE'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_marine)),
+make_check('check_no_take_marine0', invalid_no_take_marine0, ['NO_TAKE', 'MARINE'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_no_take_marine0)),
+make_check('ivd_no_take_marine12', invalid_no_take_marine12, ['NO_TAKE', 'MARINE'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_no_take_marine12)),
+make_check('check_no_tk_area_marine0', invalid_no_tk_area_marine0, ['NO_TK_AREA', 'MARINE'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_no_tk_area_marine0)),
+make_check('ivd_no_tk_area_no_take', invalid_no_tk_area_no_take, ['NO_TK_AREA', 'NO_TAKE'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_no_tk_area_no_take)),
+make_check('ivd_status', invalid_status, ['STATUS'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_status)),
+make_check('ivd_status_yr', invalid_status_yr, ['STATUS_YR'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_status_yr)),
+make_check('ivd_gov_type', invalid_gov_type, ['GOV_TYPE'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_gov_type)),
+make_check('ivd_own_type', invalid_own_type, ['OWN_TYPE'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_own_type)),
+make_check('ivd_verif', invalid_verif, ['VERIF'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_verif)),
+make_check('check_parent_iso3', invalid_parent_iso3, ['PARENT_ISO3'], 'row', ['invalid'], mask=invalid_parent_iso3_mask),
+make_check('check_iso3', invalid_iso3, ['ISO3'], 'row', ['invalid'], mask=invalid_iso3_mask),
+make_check('ivd_status_desig_type', invalid_status_desig_type, ['STATUS', 'DESIG_TYPE'], 'row', ['invalid'], batch=(invalid_values_masks, invalid_status_desig_type)),
+make_check('ivd_character_name', forbidden_character_name, ['NAME'], 'row', ['forbidden_character'], batch=(forbidden_character_masks, 'NAME')),
+make_check('ivd_character_orig_name', forbidden_character_orig_name, ['ORIG_NAME'], 'row', ['forbidden_character'], batch=(forbidden_character_masks, 'ORIG_NAME')),
+make_check('ivd_character_desig', forbidden_character_desig, ['DESIG'], 'row', ['forbidden_character'], batch=(forbidden_character_masks, 'DESIG')),
+make_check('ivd_character_desig_eng', forbidden_character_desig_eng, ['DESIG_ENG'], 'row', ['forbidden_character'], batch=(forbidden_character_masks, 'DESIG_ENG')),
+make_check('ivd_character_mang_auth', forbidden_character_mang_auth, ['MANG_AUTH'], 'row', ['forbidden_character'], batch=(forbidden_character_masks, 'MANG_AUTH')),
+make_check('ivd_character_mang_plan', forbidden_character_mang_plan, ['MANG_PLAN'], 'row', ['forbidden_character'], batch=(forbidden_character_masks, 'MANG_PLAN')),
+make_check('ivd_character_sub_loc', forbidden_character_sub_loc, ['SUB_LOC'], 'row', ['forbidden_character'], batch=(forbidden_character_masks, 'SUB_LOC')),
+make_check('nan_present_name', nan_present_name, ['NAME'], 'row', ['nan_present']),
+make_check('nan_present_orig_name', nan_present_orig_name, ['ORIG_NAME'], 'row', ['nan_present']),
+make_check('nan_present_desig', nan_present_desig, ['DESIG'], 'row', ['nan_present']),
+make_check('nan_present_desig_eng', nan_present_desig_eng, ['DESIG_ENG'], 'row', ['nan_present']),
+make_check('nan_present_mang_auth', nan_present_mang_auth, ['MANG_AUTH'], 'row', ['nan_present']),
+make_check('nan_present_mang_plan', nan_present_mang_plan, ['MANG_PLAN'], 'row', ['nan_present']),
+make_check('nan_present_sub_loc', nan_present_sub_loc, ['SUB_LOC'], 'row', ['nan_present']),]
 
 # Checks to be run for polygon data only (includes GIS_AREA and/or GIS_M_AREA)
 area_checks = [
-{'name': 'gis_area_gt_rep_area', 'func': area_invalid_too_large_gis},
-{'name': 'rep_area_gt_gis_area', 'func': area_invalid_too_large_rep},
-{'name': 'gis_m_area_gt_rep_m_area', 'func': area_invalid_too_large_gis_m},
-{'name': 'rep_m_area_gt_gis_m_area', 'func': area_invalid_too_large_rep_m},
-{'name': 'tiny_gis_area', 'func': area_invalid_gis_area},
-{'name': 'no_tk_area_gt_gis_m_area', 'func': area_invalid_no_tk_area_gis_m_area},
-{'name': 'ivd_gis_m_area_gt_gis_area', 'func': area_invalid_gis_m_area_gis_area},
-{'name': 'zero_gis_m_area_marine12', 'func': area_invalid_gis_m_area_marine12},
-{'name': 'ivd_marine_designation', 'func': area_invalid_marine},]
+make_check('gis_area_gt_rep_area', area_invalid_too_large_gis, ['REP_AREA', 'GIS_AREA'] , 'table', ['area'], batch=(area_ratio_stats_by_argument, 'GIS_AREA'), diagnostics=(area_ratio_diagnostics, 'GIS_AREA'), extra_fields=area_group_fields),
+make_check('rep_area_gt_gis_area', area_invalid_too_large_rep, ['REP_AREA', 'GIS_AREA'] , 'table', ['area'], batch=(area_ratio_stats_by_argument, 'REP_AREA'), diagnostics=(area_ratio_diagnostics, 'REP_AREA'), extra_fields=area_group_fields),
+make_check('gis_m_area_gt_rep_m_area', area_invalid_too_large_gis_m, ['REP_M_AREA', 'GIS_M_AREA'] , 'table', ['area'], batch=(area_ratio_stats_by_argument, 'GIS_M_AREA'), diagnostics=(area_ratio_diagnostics, 'GIS_M_AREA'), extra_fields=area_group_fields),
+make_check('rep_m_area_gt_gis_m_area', area_invalid_too_large_rep_m, ['REP_M_AREA', 'GIS_M_AREA'] , 'table', ['area'], batch=(area_ratio_stats_by_argument, 'REP_M_AREA'), diagnostics=(area_ratio_diagnostics, 'REP_M_AREA'), extra_fields=area_group_fields),
+make_check('tiny_gis_area', area_invalid_gis_area, ['GIS_AREA'], 'row', ['area']),
+make_check('no_tk_area_gt_gis_m_area', area_invalid_no_tk_area_gis_m_area, ['NO_TK_AREA', 'GIS_M_AREA'], 'row', ['area']),
+make_check('ivd_gis_m_area_gt_gis_area', area_invalid_gis_m_area_gis_area, ['GIS_M_AREA', 'GIS_AREA'], 'row', ['area']),
+make_check('zero_gis_m_area_marine12', area_invalid_gis_m_area_marine12, ['GIS_M_AREA', 'MARINE'], 'row', ['area']),
+make_check('ivd_marine_designation', area_invalid_marine, ['GIS_M_AREA', 'GIS_AREA', 'MARINE'], 'row', ['area'], mask=area_invalid_marine_mask),]
 
 # Checks for polygons
 poly_checks = core_checks + area_checks
@@ -0,0 +1,150 @@
+###################################################################################
+#### RAMBO: a Quality Assurance Tool for the World Database on Protected Areas ####
+#### Python script holding the reference data used by the QA checks           ####
+###################################################################################
+
+'''
+This Python script gives the QA checks access to reference data that is shipped
+with the tool, so that no network access is needed to run the checks.
+
+The allowed ISO3 values are the ISO 3166-1 alpha-3 codes, plus additions used
+in the WDPA (e.g. 'ABNJ': Areas Beyond National Jurisdiction). They are stored
+in wdpa/data/iso3.csv, with the version of the list in its header, and only
+read when a check first needs them.
+
+The bundled list can be updated from a local CSV file, e.g. the all.csv of
+https://github.com/lukes/ISO-3166-Countries-with-Regional-Codes, with:
+
+python -m wdpa.reference refresh path/to/all.csv
+'''
+
+#######################
+#### Load packages ####
+#######################
+
+import argparse
+import csv
+import io
+import os
+
+ISO3_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'iso3.csv')
+
+# Values allowed in ISO3 and PARENT_ISO3 that are not ISO 3166-1 alpha-3 codes
+WDPA_ISO3_ADDITIONS = {'ABNJ': 'Areas Beyond National Jurisdiction'}
+
+_iso3 = None
+
+#################################
+#### 1. Read the ISO3 values ####
+#################################
+
+def read_iso3_file(path=ISO3_FILE):
+    '''
+    Read the bundled ISO3 file. Return its version and a list of
+    dictionaries with the 'alpha-3', 'name' and 'source' of each code.
+    '''
+
+    with open(path, encoding='utf-8', newline='') as f:
+        version_line = f.readline()
+        if not version_line.startswith('# version:'):
+            raise ValueError(f'ERROR: {path} does not start with a "# version:" line')
+        rows = list(csv.DictReader(f))
+
+    return version_line.split(':', 1)[1].strip(), rows
+
+def iso3_codes():
+    '''
+    Return the allowed ISO3 values as a frozenset.
+    The bundled file is read on first use only.
+    '''
+
+    global _iso3
+    if _iso3 is None:
+        _iso3 = frozenset(row['alpha-3'] for row in read_iso3_file()[1])
+
+    return _iso3
+
+def iso3_version():
+    '''
+    Return the version of the bundled ISO3 values
+    '''
+
+    return read_iso3_file()[0]
+
+####################################
+#### 2. Refresh the ISO3 values ####
+####################################
+
+def refresh_iso3(csv_path, version=None, column='alpha-3', name_column='name', output=ISO3_FILE):
+    '''
+    Replace the bundled ISO3 values by the codes of a local CSV file,
+    adding the WDPA additions (e.g. 'ABNJ'). The version is incremented,
+    unless specified. Return the version written.
+
+    ## Arguments ##
+    csv_path --    path to a local CSV file with ISO 3166-1 alpha-3 codes
+    version --     version to write; by default the current version plus one
+    column --      name of the column holding the alpha-3 codes
+    name_column -- name of the column holding the country names, if any
+    output --      the file to write; defaults to the bundled file
+
+    ## Example ##
+    refresh_iso3(csv_path='C:/Users/paintern/Downloads/all.csv')
+    '''
+
+    with open(csv_path, encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    if not rows or column not in rows[0]:
+        raise ValueError(f'ERROR: column {column} not found in {csv_path}')
+
+    codes = {row[column].strip(): (row.get(name_column) or '').strip() for row in rows if row[column].strip()}
+    invalid = sorted(code for code in codes if len(code) != 3 or not code.isalpha() or not code.isupper())
+    if invalid:
+        raise ValueError(f'ERROR: invalid alpha-3 codes in {csv_path}: {invalid}')
+
+    if version is None:
+        current = read_iso3_file(output)[0] if os.path.isfile(output) else '0'
+        version = str(int(current) + 1) if current.isdigit() else '1'
+
+    buffer = io.StringIO()
+    buffer.write(f'# version: {version}\n')
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(['alpha-3', 'name', 'source'])
+    for code, name in sorted(codes.items()):
+        writer.writerow([code, name, 'ISO 3166-1'])
+    for code, name in sorted(WDPA_ISO3_ADDITIONS.items()):
+        writer.writerow([code, name, 'WDPA'])
+
+    with open(output, 'w', encoding='utf-8', newline='') as f:
+        f.write(buffer.getvalue())
+
+    global _iso3
+    _iso3 = None # read the new values on next use
+
+    return version
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the reference data bundled with the WDPA QA')
+    subparsers = parser.add_subparsers(dest='command')
+    refresh = subparsers.add_parser('refresh', help='update the bundled ISO3 values from a local CSV file')
+    refresh.add_argument('csv_path', help='local CSV file with ISO 3166-1 alpha-3 codes')
+    refresh.add_argument('--version', help='version to write; by default the current version plus one')
+    refresh.add_argument('--column', default='alpha-3', help='column holding the alpha-3 codes')
+    subparsers.add_parser('version', help='print the version of the bundled ISO3 values')
+    args = parser.parse_args(argv)
+
+    if args.command == 'refresh':
+        version = refresh_iso3(args.csv_path, args.version, args.column)
+        print(f'ISO3 values updated to version {version}: {len(iso3_codes())} codes')
+    elif args.command == 'version':
+        print(iso3_version())
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
+
+#######################
+#### END OF SCRIPT ####
+#######################
@@ -0,0 +1,433 @@
+###################################################################################
+#### RAMBO: a Quality Assurance Tool for the World Database on Protected Areas ####
+#### Python script to load a WDPA table and run a selection of QA checks      ####
+###################################################################################
+
+'''
+This Python script runs the registered QA checks (see section 9 of qa.py) on a
+WDPA feature class attribute table. Only the fields read by the selected checks
+are loaded, so that e.g. running only the ISO3 checks does not load MANG_AUTH or SUB_LOC.
+
+The result is a dictionary of check names and the DataFrame of rows that failed
+each check, as expected by output_errors_to_excel. Checks that return a row mask
+(registered with mask or batch) are selected directly from their mask; only checks
+returning WDPA_PIDs are searched in the table with find_wdpa_rows.
+
+The checks can be spread over a pool of processes or threads (see section 3).
+For processes, the loaded columns are written once to shared memory (/dev/shm
+where available) as memory-mapped NumPy files, so that the table is not pickled
+to each worker. Numeric columns are shared by the workers; text columns are
+stored as shared integer codes, and decoded by a worker only when one of its
+tasks reads them.
+'''
+
+#######################
+#### Load packages ####
+#######################
+
+import concurrent.futures
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from wdpa.qa import add_message, mask_to_pid, required_fields, select_checks
+from wdpa.cache import cached_table_to_df, read_cached_columns, write_cached_df
+from wdpa.profiling import log_diagnostics, log_phase, log_rows, log_task, measure_step
+
+WORKERS_ENV_VARIABLE = 'WDPA_QA_WORKERS'
+SHARED_MEMORY_DIR = '/dev/shm'
+
+############################################
+#### 1. Load the fields the checks need ####
+############################################
+
+def load_for_checks(in_fc, checks, input_fields, loader=cached_table_to_df):
+    '''
+    Load only the fields of in_fc that are read by the checks.
+
+    ## Arguments ##
+    in_fc --        feature class attribute table - inside geodatabase - to import
+    checks --       list of registered checks to be run
+    input_fields -- list of all fields of the table, e.g. INPUT_FIELDS_POLY
+    loader --       function converting the table, called as loader(in_fc, fields)
+
+    ## Example ##
+    load_for_checks(in_fc='WDPA_Jun2019_Public.gdb/WDPA_poly_Jun2019',
+                    checks=select_checks(poly_checks, ['ISO3']),
+                    input_fields=INPUT_FIELDS_POLY)
+    '''
+
+    return loader(in_fc, required_fields(checks, input_fields))
+
+###########################
+#### 2. Run the checks ####
+###########################
+
+def run_batches(wdpa_df, checks, diagnostics=None):
+    '''
+    Evaluate the checks that declare a batch function together: each batch function
+    is called once, for all selected checks that share it.
+    Return a dictionary of the names of these checks and their row masks.
+
+    A batch function can return, for an argument, a dictionary of statistics that
+    holds the row mask under 'invalid' (e.g. area_ratio_stats_by_argument) rather
+    than the mask itself: the diagnostics of the checks declaring them are then
+    built from these statistics, without computing them again.
+
+    ## Arguments ##
+    wdpa_df --     WDPA in pandas DataFrame
+    checks --      list of registered checks to be run
+    diagnostics -- optional dictionary to add the diagnostics of the checks to
+                   (see check_diagnostics), by name
+    '''
+
+    batches = dict()
+    for check in checks:
+        if check.get('batch'):
+            batch_func, argument = check['batch']
+            batches.setdefault(batch_func, []).append((check, argument))
+
+    invalid = dict()
+    batch_stats = dict()
+    for batch_func, members in batches.items():
+        batch_result = batch_func(wdpa_df, [argument for check, argument in members])
+        for check, argument in members:
+            result = batch_result[argument]
+            if isinstance(result, dict):
+                invalid[check['name']] = result['invalid']
+                batch_stats[check['name']] = result
+            else:
+                invalid[check['name']] = result
+
+    if diagnostics is not None:
+        diagnostics.update(check_diagnostics(wdpa_df, checks, batch_stats))
+
+    return invalid
+
+def check_diagnostics(wdpa_df, checks, batch_stats=None):
+    '''
+    Compute the diagnostics of the checks that declare them: each diagnostics 
+    function is called once, for all selected checks that share it.
+    Return a dictionary of the names of these checks and their diagnostics,
+    e.g. the mean and stdev of the area ratios.
+
+    ## Arguments ##
+    wdpa_df --     WDPA in pandas DataFrame
+    checks --      list of registered checks to be run
+    batch_stats -- optional dictionary of the statistics returned by the batch
+                   function of each check (see run_batches), by name: if all the
+                   checks sharing a diagnostics function have them, it is called
+                   as diagnostics_func(wdpa_df, [arguments], stats), with the
+                   statistics of each argument
+    '''
+
+    batch_stats = batch_stats or dict()
+    groups = dict()
+    for check in checks:
+        if check.get('diagnostics'):
+            diagnostics_func, argument = check['diagnostics']
+            groups.setdefault(diagnostics_func, []).append((check['name'], argument))
+
+    diagnostics = dict()
+    for diagnostics_func, members in groups.items():
+        arguments = [argument for name, argument in members]
+        if all(name in batch_stats for name, argument in members):
+            values = diagnostics_func(wdpa_df, arguments, {argument: batch_stats[name] for name, argument in members})
+        else:
+            values = diagnostics_func(wdpa_df, arguments)
+        for name, argument in members:
+            diagnostics[name] = values[argument]
+
+    return diagnostics
+
+def pid_positions(wdpa_df, wdpa_pid):
+    '''
+    Return the positions of the rows whose WDPA_PID is in wdpa_pid,
+    i.e. the rows find_wdpa_rows(wdpa_df, wdpa_pid) selects
+    '''
+
+    if len(wdpa_pid) == 0:
+        return np.array([], dtype=np.int64)
+
+    return np.flatnonzero(wdpa_df['WDPA_PID'].isin(wdpa_pid).values)
+
+def mask_positions(wdpa_df, invalid, unique_pid=True):
+    '''
+    Return the positions of the rows selected by invalid, a boolean row mask
+    or an array of row positions.
+    If WDPA_PID is not unique, all rows sharing a WDPA_PID with a selected row
+    are returned, as find_wdpa_rows does for checks returning WDPA_PIDs.
+
+    ## Arguments ##
+    wdpa_df --    WDPA in pandas DataFrame
+    invalid --    boolean row mask, or array of row positions
+    unique_pid -- False if WDPA_PID holds duplicates
+    '''
+
+    invalid = np.asarray(invalid)
+    positions = np.flatnonzero(invalid) if invalid.dtype == bool else np.unique(invalid)
+
+    if unique_pid or positions.size == 0:
+        return positions
+
+    return pid_positions(wdpa_df, mask_to_pid(wdpa_df, positions))
+
+def check_positions(wdpa_df, checks, unique_pid=True, diagnostics=None):
+    '''
+    Run the checks and return a dictionary of the name of each check
+    and the positions of the rows that failed it.
+    Checks declaring a batch function are evaluated together first; checks
+    declaring a mask function are run through it instead of their func.
+
+    ## Arguments ##
+    wdpa_df --     WDPA in pandas DataFrame, holding at least the fields of the checks
+    checks --      list of registered checks to be run
+    unique_pid --  False if WDPA_PID holds duplicates
+    diagnostics -- optional dictionary to add the diagnostics of the checks to, by name
+    '''
+
+    batched_invalid = run_batches(wdpa_df, checks, diagnostics)
+
+    positions = dict()
+    for check in checks:
+        if check['name'] in batched_invalid:
+            positions[check['name']] = mask_positions(wdpa_df, batched_invalid[check['name']], unique_pid)
+        elif check.get('mask'):
+            positions[check['name']] = mask_positions(wdpa_df, check['mask'](wdpa_df), unique_pid)
+        else:
+            # For each check returning WDPA_PIDs, obtain the rows that contain errors
+            positions[check['name']] = pid_positions(wdpa_df, check['func'](wdpa_df, True))
+
+    return positions
+
+def positions_to_result(wdpa_df, checks, positions):
+    '''
+    Return the result dictionary: the name of each check that found errors
+    and the DataFrame of its rows with errors, in the order of checks
+    '''
+
+    return {check['name']: wdpa_df.iloc[positions[check['name']]] 
+            for check in checks if positions[check['name']].size > 0}
+
+def run_checks(wdpa_df, checks, run_log=None):
+    '''
+    Run each check on wdpa_df and return a dictionary of the names of the
+    checks that found errors, and the DataFrame of the rows with errors.
+
+    ## Arguments ##
+    wdpa_df -- WDPA in pandas DataFrame, holding at least the fields of the checks
+    checks --  list of registered checks to be run
+    run_log -- optional run log (see profiling.new_run_log) to record the
+               time, memory and number of rows of each check, and the
+               diagnostics of the checks declaring them, in
+    '''
+
+    unique_pid = not wdpa_df['WDPA_PID'].duplicated().any()
+
+    positions = dict()
+    diagnostics = dict()
+    for task in check_tasks(checks):
+        add_message('Running:' + ', '.join(check['name'] for check in task))
+        task_positions, stats = measure_step(check_positions, wdpa_df, task, unique_pid, diagnostics)
+        log_task(run_log, task, stats)
+        positions.update(task_positions)
+
+    log_rows(run_log, positions)
+    log_diagnostics(run_log, diagnostics)
+    return positions_to_result(wdpa_df, checks, positions)
+
+#######################################
+#### 3. Run the checks in parallel ####
+#######################################
+
+def check_tasks(checks):
+    '''
+    Split the checks into tasks that can run independently: the checks sharing
+    a batch function form one task, each other check is a task of its own.
+    Tasks are returned in the order of their first check.
+    '''
+
+    tasks = []
+    batch_tasks = dict()
+    for check in checks:
+        if check.get('batch'):
+            batch_func = check['batch'][0]
+            if batch_func not in batch_tasks:
+                batch_tasks[batch_func] = []
+                tasks.append(batch_tasks[batch_func])
+            batch_tasks[batch_func].append(check)
+        else:
+            tasks.append([check])
+
+    return tasks
+
+def default_workers():
+    '''
+    Return the number of workers set in the WDPA_QA_WORKERS environment variable,
+    or 1 (no parallel execution) if it is not set
+    '''
+
+    return int(os.environ.get(WORKERS_ENV_VARIABLE) or 1)
+
+# Index and columns already read by a worker process, by shared directory
+_worker_columns = dict()
+
+def worker_frame(source, fields):
+    '''
+    Return the DataFrame of the given fields of the table written to the shared
+    directory source. Each column is read once per process, when a task first
+    reads it: text columns are then decoded in the process, and numeric columns
+    memory-mapped.
+    '''
+
+    if source not in _worker_columns:
+        _worker_columns.clear() # drop the table of a previous run
+        _worker_columns[source] = read_cached_columns(source, [])
+    index, columns = _worker_columns[source]
+
+    missing = [field for field in fields if field not in columns]
+    if missing:
+        columns.update(read_cached_columns(source, missing)[1])
+
+    return pd.DataFrame({field: columns[field] for field in fields}, index=index, columns=fields, copy=False)
+
+def _run_task(source, task, unique_pid):
+    '''
+    Run a task in a worker. source is the DataFrame itself (threads), or the shared
+    directory it was written to (processes), of which the fields of the task are 
+    read (see worker_frame).
+    Return the positions of the rows that failed each check, the diagnostics of
+    the checks declaring them, and the statistics of the task measured in the
+    worker (see profiling.measure_step). Threads share the peak memory of the
+    process, which is left to the checks phase: their peak_mb is None.
+    '''
+
+    if not isinstance(source, str):
+        diagnostics = dict()
+        positions, stats = measure_step(check_positions, source, task, unique_pid, diagnostics, trace_memory=False)
+        return positions, diagnostics, dict(stats, peak_mb=None)
+
+    fields = []
+    for check in task:
+        fields += [field for field in check['fields'] if field not in fields]
+    source = worker_frame(source, fields)
+
+    diagnostics = dict()
+    positions, stats = measure_step(check_positions, source, task, unique_pid, diagnostics)
+    return positions, diagnostics, stats
+
+def run_checks_parallel(wdpa_df, checks, workers=None, pool='process', run_log=None):
+    '''
+    Run the checks as run_checks does, spread over a pool of workers.
+    The result is the same as that of run_checks, whatever order the workers finish in.
+
+    ## Arguments ##
+    wdpa_df -- WDPA in pandas DataFrame, holding at least the fields of the checks
+    checks --  list of registered checks to be run
+    workers -- number of workers; defaults to the number of CPUs
+    pool --    'process' or 'thread'. Processes read the table from shared memory;
+               threads share the DataFrame, but only run in parallel where
+               NumPy and pandas release the GIL
+    run_log -- optional run log to record the statistics of each check in. With
+               threads, CPU time is that of the whole process, and the peak
+               memory of the checks is not recorded
+
+    ## Example ##
+    run_checks_parallel(wdpa_df, poly_checks, workers=16, pool='process')
+    '''
+
+    if pool not in ('process', 'thread'):
+        raise ValueError(f'ERROR: pool must be "process" or "thread", not {pool}')
+
+    workers = workers or os.cpu_count() or 1
+    unique_pid = not wdpa_df['WDPA_PID'].duplicated().any()
+    tasks = check_tasks(checks)
+
+    shared_dir = None
+    if pool == 'process':
+        # write the columns once, to be memory-mapped by each worker
+        shared_dir = tempfile.mkdtemp(prefix='wdpa_qa_', dir=SHARED_MEMORY_DIR if os.path.isdir(SHARED_MEMORY_DIR) else None)
+        source = os.path.join(shared_dir, 'table')
+        try:
+            write_cached_df(wdpa_df, source, {})
+        except ValueError as error:
+            add_message(f'{error}; running the checks in threads')
+            shutil.rmtree(shared_dir, ignore_errors=True)
+            shared_dir = None
+            pool = 'thread'
+
+    if pool == 'process':
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+    else:
+        source = wdpa_df
+        executor = concurrent.futures.ThreadPoolExecutor(workers)
+
+    try:
+        with executor:
+            futures = {executor.submit(_run_task, source, task, unique_pid): task for task in tasks}
+            positions = dict()
+            diagnostics = dict()
+            for future in concurrent.futures.as_completed(futures):
+                add_message('Finished:' + ', '.join(check['name'] for check in futures[future]))
+                task_positions, task_diagnostics, stats = future.result()
+                log_task(run_log, futures[future], stats)
+                positions.update(task_positions)
+                diagnostics.update(task_diagnostics)
+    finally:
+        if shared_dir is not None:
+            shutil.rmtree(shared_dir, ignore_errors=True)
+
+    # the result follows the order of checks, not the order the workers finished in
+    log_rows(run_log, positions)
+    log_diagnostics(run_log, diagnostics)
+    return positions_to_result(wdpa_df, checks, positions)
+
+def execute_checks(wdpa_df, checks, workers=None, pool='process', run_log=None):
+    '''
+    Run the checks with run_checks_parallel if more than one worker is given, or set in
+    the WDPA_QA_WORKERS environment variable, and with run_checks otherwise
+    '''
+
+    workers = workers or default_workers()
+    if workers > 1:
+        return run_checks_parallel(wdpa_df, checks, workers, pool, run_log)
+
+    return run_checks(wdpa_df, checks, run_log)
+
+def load_and_run(in_fc, checks, input_fields, selection=None, workers=None, pool='process', run_log=None):
+    '''
+    Select the checks, load the fields they need from in_fc, and run them.
+    Return the selected checks and the result dictionary.
+    The checks are run in parallel if more than one worker is given, or set
+    in the WDPA_QA_WORKERS environment variable.
+
+    ## Arguments ##
+    in_fc --        feature class attribute table - inside geodatabase - to check
+    checks --       list of registered checks, e.g. poly_checks
+    input_fields -- list of all fields of the table, e.g. INPUT_FIELDS_POLY
+    selection --    optional list of check names, tags and/or fields to run
+    workers --      number of workers; defaults to the WDPA_QA_WORKERS environment variable, or 1
+    pool --         'process' or 'thread', see run_checks_parallel
+    run_log --      optional run log to record the load and checks phases, and each check
+                    and its diagnostics (see check_diagnostics), in
+
+    ## Example ##
+    checks, result = load_and_run(in_fc='WDPA_Jun2019_Public.gdb/WDPA_poly_Jun2019',
+                                  checks=poly_checks,
+                                  input_fields=INPUT_FIELDS_POLY,
+                                  selection=['ISO3'])
+    '''
+
+    checks = select_checks(checks, selection)
+    wdpa_df, stats = measure_step(load_for_checks, in_fc, checks, input_fields, trace_memory=False)
+    log_phase(run_log, 'load', stats, rows=len(wdpa_df), fields=len(wdpa_df.columns))
+
+    result, stats = measure_step(execute_checks, wdpa_df, checks, workers, pool, run_log)
+    log_phase(run_log, 'checks', stats, checks=len(checks))
+
+    return checks, result
+
+#######################
+#### END OF SCRIPT ####
+#######################